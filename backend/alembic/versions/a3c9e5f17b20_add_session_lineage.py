@@ -0,0 +1,49 @@
+"""add session lineage
+
+Revision ID: a3c9e5f17b20
+Revises: d7f8a3c2e1b4
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e5f17b20'
+down_revision = 'd7f8a3c2e1b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Add lineage pointers for copy-on-write session cloning.
+
+    - parent_session_id: Session this one was cloned from
+    - fork_message_id: Last message of the parent's history at fork time
+    - ix_sessions_parent_session_id: Find clones when a parent is deleted
+    """
+    op.add_column('sessions', sa.Column('parent_session_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column('sessions', sa.Column('fork_message_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_foreign_key(
+        'fk_sessions_parent_session_id',
+        'sessions', 'sessions',
+        ['parent_session_id'], ['id'],
+        ondelete='SET NULL'
+    )
+    op.create_index(
+        'ix_sessions_parent_session_id',
+        'sessions',
+        ['parent_session_id'],
+        unique=False
+    )
+
+
+def downgrade():
+    """Remove lineage pointers."""
+    op.drop_index('ix_sessions_parent_session_id', table_name='sessions')
+    op.drop_constraint('fk_sessions_parent_session_id', 'sessions', type_='foreignkey')
+    op.drop_column('sessions', 'fork_message_id')
+    op.drop_column('sessions', 'parent_session_id')
@@ -0,0 +1,108 @@
+"""partition messages by session
+
+Revision ID: a7d4e9c2b5f8
+Revises: f2b6d4e8a1c3
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e9c2b5f8'
+down_revision = 'f2b6d4e8a1c3'
+branch_labels = None
+depends_on = None
+
+# Matches app.models.message.MESSAGE_PARTITIONS at the time of this migration
+PARTITIONS = 16
+
+
+def upgrade():
+    """
+    Create messages_partitioned, hash-partitioned by session_id, and mirror writes into it.
+
+    Rows are not copied here: scripts/migrate_partition_messages.py backfills them in
+    batches while the app keeps serving, then swaps the tables. Until the
+    swap, a trigger on messages applies every insert, update and delete to
+    messages_partitioned as well.
+
+    PostgreSQL only; other databases keep a single messages table.
+    """
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("""
+        CREATE TABLE messages_partitioned (
+            id uuid NOT NULL,
+            session_id uuid NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+            role varchar(20) NOT NULL,
+            content bytea NOT NULL,
+            created_at timestamp NOT NULL,
+            message_metadata jsonb,
+            PRIMARY KEY (session_id, id)
+        ) PARTITION BY HASH (session_id)
+    """)
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE messages_p{remainder:02d} PARTITION OF messages_partitioned "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+
+    # History windows within a session, and the occasional lookup by id alone
+    op.execute(
+        "CREATE INDEX idx_messages_partitioned_session_created "
+        "ON messages_partitioned (session_id, created_at, id)"
+    )
+    op.execute("CREATE INDEX idx_messages_partitioned_id ON messages_partitioned (id)")
+
+    op.execute("""
+        CREATE FUNCTION messages_mirror_to_partitioned() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM messages_partitioned
+                WHERE session_id = OLD.session_id AND id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO messages_partitioned (id, session_id, role, content, created_at, message_metadata)
+                VALUES (NEW.id, NEW.session_id, NEW.role, NEW.content, NEW.created_at, NEW.message_metadata)
+                ON CONFLICT (session_id, id) DO UPDATE SET
+                    role = EXCLUDED.role,
+                    content = EXCLUDED.content,
+                    created_at = EXCLUDED.created_at,
+                    message_metadata = EXCLUDED.message_metadata;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER messages_mirror_to_partitioned
+        AFTER INSERT OR UPDATE OR DELETE ON messages
+        FOR EACH ROW EXECUTE FUNCTION messages_mirror_to_partitioned()
+    """)
+
+
+def downgrade():
+    """
+    Drop messages_partitioned and the mirror trigger.
+
+    Only possible before the swap; afterwards run
+    `scripts/migrate_partition_messages.py --unswap` first.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    swapped = bind.exec_driver_sql(
+        "SELECT to_regclass('messages_unpartitioned') IS NOT NULL"
+    ).scalar()
+    if swapped:
+        raise RuntimeError(
+            "messages has already been swapped to the partitioned table; "
+            "run scripts/migrate_partition_messages.py --unswap before downgrading"
+        )
+
+    op.execute("DROP TRIGGER IF EXISTS messages_mirror_to_partitioned ON messages")
+    op.execute("DROP FUNCTION IF EXISTS messages_mirror_to_partitioned()")
+    op.execute("DROP TABLE IF EXISTS messages_partitioned")
@@ -0,0 +1,45 @@
+"""add id to sessions updated_at index
+
+Revision ID: b5e2d8a4c6f1
+Revises: a3c9e5f17b20
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2d8a4c6f1'
+down_revision = 'a3c9e5f17b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Rebuild idx_sessions_updated_at as (updated_at DESC, id DESC).
+
+    GET /api/sessions pages with the keyset (updated_at, id) < (cursor); the id
+    column makes the tiebreak part of the index so each page is one range scan.
+    """
+    op.drop_index('idx_sessions_updated_at', table_name='sessions')
+    op.create_index(
+        'idx_sessions_updated_at',
+        'sessions',
+        [sa.text('updated_at DESC'), sa.text('id DESC')],
+        unique=False,
+        postgresql_using='btree'
+    )
+
+
+def downgrade():
+    """Restore the single-column index."""
+    op.drop_index('idx_sessions_updated_at', table_name='sessions')
+    op.create_index(
+        'idx_sessions_updated_at',
+        'sessions',
+        [sa.text('updated_at DESC')],
+        unique=False,
+        postgresql_using='btree'
+    )
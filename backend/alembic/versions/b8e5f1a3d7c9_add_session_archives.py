@@ -0,0 +1,49 @@
+"""add session archives
+
+Revision ID: b8e5f1a3d7c9
+Revises: a7d4e9c2b5f8
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e5f1a3d7c9'
+down_revision = 'a7d4e9c2b5f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Add sessions.archived_at and the session_archives index of cold-storage blobs.
+
+    Archived sessions have their messages and file text moved to one
+    NDJSON+zstd blob each (app.utils.archive, scripts/archive_sessions.py).
+    """
+    op.add_column('sessions', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'session_archives',
+        sa.Column('session_id', sa.UUID(), nullable=False),
+        sa.Column('blob_path', sa.String(length=512), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('file_count', sa.Integer(), nullable=False),
+        sa.Column('raw_bytes', sa.Integer(), nullable=False),
+        sa.Column('stored_bytes', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['session_id'], ['sessions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('session_id')
+    )
+
+
+def downgrade():
+    """
+    Drop session_archives and sessions.archived_at.
+
+    Restore archived sessions first (e.g. by sending them a message);
+    their history only exists in the blobs.
+    """
+    op.drop_table('session_archives')
+    op.drop_column('sessions', 'archived_at')
@@ -0,0 +1,42 @@
+"""add id to messages session index
+
+Revision ID: c8f1a6b3d9e2
+Revises: b5e2d8a4c6f1
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1a6b3d9e2'
+down_revision = 'b5e2d8a4c6f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Rebuild idx_messages_session_created as (session_id, created_at, id).
+
+    Message history windows (before/after/since cursors) order by
+    (created_at, id); including id lets the tiebreak come from the index.
+    """
+    op.drop_index('idx_messages_session_created', table_name='messages')
+    op.create_index(
+        'idx_messages_session_created',
+        'messages',
+        ['session_id', 'created_at', 'id'],
+        unique=False
+    )
+
+
+def downgrade():
+    """Restore the two-column index."""
+    op.drop_index('idx_messages_session_created', table_name='messages')
+    op.create_index(
+        'idx_messages_session_created',
+        'messages',
+        ['session_id', 'created_at'],
+        unique=False
+    )
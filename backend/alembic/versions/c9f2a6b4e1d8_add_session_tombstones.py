@@ -0,0 +1,39 @@
+"""add session tombstones
+
+Revision ID: c9f2a6b4e1d8
+Revises: b8e5f1a3d7c9
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f2a6b4e1d8'
+down_revision = 'b8e5f1a3d7c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Add sessions.deleted_at, set by DELETE and cleared by the reaper removing the row.
+
+    The partial index only holds tombstones, so the reaper finds them
+    without scanning live sessions and the index stays near empty.
+    """
+    op.add_column('sessions', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'idx_sessions_deleted_at',
+        'sessions',
+        ['deleted_at'],
+        postgresql_where=sa.text('deleted_at IS NOT NULL'),
+        sqlite_where=sa.text('deleted_at IS NOT NULL')
+    )
+
+
+def downgrade():
+    """Remove sessions.deleted_at. Reap outstanding tombstones first, or they become visible again."""
+    op.drop_index('idx_sessions_deleted_at', table_name='sessions')
+    op.drop_column('sessions', 'deleted_at')
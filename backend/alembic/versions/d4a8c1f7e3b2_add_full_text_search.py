@@ -0,0 +1,132 @@
+"""add full-text search
+
+Revision ID: d4a8c1f7e3b2
+Revises: c9f2a6b4e1d8
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8c1f7e3b2'
+down_revision = 'c9f2a6b4e1d8'
+branch_labels = None
+depends_on = None
+
+# Matches app.database.SEARCH_CONFIG at the time of this migration
+SEARCH_CONFIG = 'english'
+
+# The other side of an in-progress partitioning migration and the trigger
+# mirroring writes into it (scripts/migrate_partition_messages.py):
+# table, mirror function, conflict target
+MIRRORS = [
+    ('messages_partitioned', 'messages_mirror_to_partitioned', 'session_id, id'),
+    ('messages_unpartitioned', 'messages_mirror_to_unpartitioned', 'id'),
+]
+
+BASE_COLUMNS = ['role', 'content', 'created_at', 'message_metadata']
+
+SQLITE_STATEMENTS = [
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(body)",
+    "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages WHEN new.search_vector IS NOT NULL BEGIN "
+    "INSERT INTO messages_fts (rowid, body) VALUES (new.rowid, new.search_vector); END",
+    "CREATE TRIGGER messages_fts_update AFTER UPDATE OF search_vector ON messages BEGIN "
+    "DELETE FROM messages_fts WHERE rowid = old.rowid; "
+    "INSERT INTO messages_fts (rowid, body) SELECT new.rowid, new.search_vector WHERE new.search_vector IS NOT NULL; END",
+    "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "DELETE FROM messages_fts WHERE rowid = old.rowid; END",
+    "CREATE VIRTUAL TABLE sessions_fts USING fts5(title)",
+    "INSERT INTO sessions_fts (rowid, title) SELECT rowid, title FROM sessions",
+    "CREATE TRIGGER sessions_fts_insert AFTER INSERT ON sessions BEGIN "
+    "INSERT INTO sessions_fts (rowid, title) VALUES (new.rowid, new.title); END",
+    "CREATE TRIGGER sessions_fts_update AFTER UPDATE OF title ON sessions BEGIN "
+    "UPDATE sessions_fts SET title = new.title WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER sessions_fts_delete AFTER DELETE ON sessions BEGIN "
+    "DELETE FROM sessions_fts WHERE rowid = old.rowid; END",
+]
+
+
+def table_exists(bind, name: str) -> bool:
+    return bind.exec_driver_sql(f"SELECT to_regclass('{name}') IS NOT NULL").scalar()
+
+
+def replace_mirror(bind, function: str, target: str, conflict: str, columns: list) -> None:
+    """Redefine a partitioning mirror trigger function, if it exists, to copy the given columns."""
+    if not bind.exec_driver_sql(f"SELECT to_regproc('{function}') IS NOT NULL").scalar():
+        return
+    names = ", ".join(['id', 'session_id'] + columns)
+    values = ", ".join(f"NEW.{column}" for column in ['id', 'session_id'] + columns)
+    updates = ",\n                    ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {target} WHERE session_id = OLD.session_id AND id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {target} ({names})
+                VALUES ({values})
+                ON CONFLICT ({conflict}) DO UPDATE SET
+                    {updates};
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def upgrade():
+    """
+    Index session titles and message content for GET /api/search.
+
+    PostgreSQL: messages.search_vector (a tsvector the app writes on insert,
+    since content is stored compressed) with a GIN index, and a GIN
+    expression index on to_tsvector(title). Existing messages are indexed
+    by scripts/backfill_search_vectors.py.
+
+    SQLite: FTS5 tables fed by triggers.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.add_column('messages', sa.Column('search_vector', sa.Text(), nullable=True))
+        for statement in SQLITE_STATEMENTS:
+            op.execute(statement)
+        return
+
+    op.add_column('messages', sa.Column('search_vector', sa.dialects.postgresql.TSVECTOR(), nullable=True))
+    op.execute("CREATE INDEX idx_messages_search_vector ON messages USING GIN (search_vector)")
+    op.execute(
+        f"CREATE INDEX idx_sessions_title_search ON sessions USING GIN (to_tsvector('{SEARCH_CONFIG}', title))"
+    )
+
+    # Keep a half-finished partitioning migration in step
+    for table, function, conflict in MIRRORS:
+        if not table_exists(bind, table):
+            continue
+        op.add_column(table, sa.Column('search_vector', sa.dialects.postgresql.TSVECTOR(), nullable=True))
+        op.execute(f"CREATE INDEX idx_{table}_search_vector ON {table} USING GIN (search_vector)")
+        replace_mirror(bind, function, table, conflict, BASE_COLUMNS + ['search_vector'])
+
+
+def downgrade():
+    """Drop the search indexes and messages.search_vector."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for trigger in ('messages_fts_insert', 'messages_fts_update', 'messages_fts_delete',
+                        'sessions_fts_insert', 'sessions_fts_update', 'sessions_fts_delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
+        op.execute("DROP TABLE IF EXISTS sessions_fts")
+        op.drop_column('messages', 'search_vector')
+        return
+
+    for table, function, conflict in MIRRORS:
+        if not table_exists(bind, table):
+            continue
+        replace_mirror(bind, function, table, conflict, BASE_COLUMNS)
+        op.drop_column(table, 'search_vector')  # drops its index too
+
+    op.execute("DROP INDEX IF EXISTS idx_sessions_title_search")
+    op.drop_column('messages', 'search_vector')
@@ -0,0 +1,66 @@
+"""compress large text columns
+
+Revision ID: e4a7c2f9b816
+Revises: c8f1a6b3d9e2
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2f9b816'
+down_revision = 'c8f1a6b3d9e2'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('messages', 'content'),
+    ('files', 'extracted_text'),
+]
+
+
+def upgrade():
+    """
+    Store messages.content and files.extracted_text as bytea.
+
+    Existing rows are converted to plain UTF-8 bytes, which CompressedText
+    reads as-is. New writes are zstd-compressed above the size threshold;
+    compress old rows online afterwards with scripts/migrate_compress_text.py.
+
+    Changing a column's type rewrites the whole table under an ACCESS
+    EXCLUSIVE lock: messages and files can be neither read nor written
+    until each ALTER finishes, which takes minutes on a large messages
+    table. Run it in a maintenance window, or instead add a bytea column,
+    backfill it in batches, and swap the columns in a short final step.
+    """
+    for table, column in COLUMNS:
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea "
+            f"USING convert_to({column}, 'UTF8')"
+        )
+
+
+def downgrade():
+    """Decompress rows and convert the columns back to text."""
+    from app.database import ZSTD_MAGIC, decompress_text
+
+    bind = op.get_bind()
+    for table, column in COLUMNS:
+        rows = sa.table(table, sa.column('id'), sa.column(column, sa.LargeBinary))
+        compressed = bind.execute(
+            sa.select(rows.c.id, rows.c[column]).where(
+                sa.func.substring(rows.c[column], 1, 4) == ZSTD_MAGIC
+            )
+        ).fetchall()
+        for row_id, value in compressed:
+            bind.execute(
+                rows.update().where(rows.c.id == row_id).values(
+                    {column: decompress_text(bytes(value)).encode('utf-8')}
+                )
+            )
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE text "
+            f"USING convert_from({column}, 'UTF8')"
+        )
@@ -0,0 +1,34 @@
+"""add session revision
+
+Revision ID: f2b6d4e8a1c3
+Revises: e4a7c2f9b816
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d4e8a1c3'
+down_revision = 'e4a7c2f9b816'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Add sessions.revision.
+
+    Bumped on every write to a session's messages or files; versions the
+    per-worker prompt context cache.
+    """
+    op.add_column(
+        'sessions',
+        sa.Column('revision', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade():
+    """Remove sessions.revision."""
+    op.drop_column('sessions', 'revision')
@@ -0,0 +1,50 @@
+"""add message usage
+
+Revision ID: f5c3a9d1e7b4
+Revises: d4a8c1f7e3b2
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c3a9d1e7b4'
+down_revision = 'd4a8c1f7e3b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Add message_usage: token usage and cost per LLM round of a chat turn.
+
+    Filled by chat turns from now on (app.utils.usage); aggregated by
+    GET /api/usage. No foreign keys, so usage outlives reaped sessions.
+    """
+    op.create_table(
+        'message_usage',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('message_id', sa.UUID(), nullable=False),
+        sa.Column('session_id', sa.UUID(), nullable=False),
+        sa.Column('llm_provider', sa.String(length=50), nullable=False),
+        sa.Column('llm_model', sa.String(length=100), nullable=False),
+        sa.Column('round', sa.Integer(), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False),
+        sa.Column('cached_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cost', sa.Float(), nullable=True),
+        sa.Column('estimated', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_message_usage_created_at', 'message_usage', ['created_at'])
+    op.create_index('idx_message_usage_session_id', 'message_usage', ['session_id'])
+
+
+def downgrade():
+    """Drop message_usage (recorded usage is lost)."""
+    op.drop_index('idx_message_usage_session_id', table_name='message_usage')
+    op.drop_index('idx_message_usage_created_at', table_name='message_usage')
+    op.drop_table('message_usage')
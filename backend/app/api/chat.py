@@ -4,26 +4,49 @@ Chat API endpoints.
 import json
 import logging
 import os
+import time
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, Optional, Tuple
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import desc
 from sqlalchemy.orm import Session as DBSession
 import litellm
 
-from app.database import get_db, SessionLocal
+from app.database import get_db, SessionLocal, uuid7
 from app.models.session import Session
 from app.models.message import Message
-from app.models.file import File
 from app.schemas.message import ChatRequest, ChatResponse, MessageResponse
 from app.config import settings
 from app.tools.search import search_internet
 from app.tools.definitions import AVAILABLE_TOOLS
+from app.utils.lineage import HistoryKey, get_lineage, segments_filter, before, after
+from app.utils.serialization import MESSAGE_RESPONSE_COLUMNS, json_response, rows_to_dicts
+from app.utils.read_routing import get_read_db
+from app.utils.revisions import bump_revision, cache_headers, etag_matches, not_modified, session_etag
+from app.utils.context_cache import context_cache, get_session_context
+from app.utils.stream_relay import StreamRelay, active_streams, attach_stream
+from app.utils.archive import archived_messages, ensure_restored
+from app.utils.server_timing import current_timings
+from app.utils.memory import context_bytes, stream_memory
+from app.utils.request_context import bind_session
+from app.utils.usage import STREAM_OPTIONS, estimate_usage, read_usage, record_usage
+from app.utils.tracing import tracer
+from app.utils.metrics import chat_errors, chat_stream_duration, chat_tokens_per_second, chat_ttft, tool_calls
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 logger = logging.getLogger(__name__)
 
+# Response headers for SSE streams (no caching or proxy buffering)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
 # Configure LiteLLM - set environment variables for each provider
 # LiteLLM automatically reads these when making API calls
 if settings.OPENAI_API_KEY:
@@ -45,13 +68,19 @@ async def send_message(
     - **session_id**: ID of the session to add message to
     - **message**: User message content
     """
+    bind_session(chat_request.session_id)
+
     # Verify session exists
-    session = db.query(Session).filter(Session.id == chat_request.session_id).first()
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Session {chat_request.session_id} not found"
-        )
+    with tracer.start_span("chat.load_session", {"session.id": str(chat_request.session_id)}):
+        session = db.query(Session).filter(Session.id == chat_request.session_id, Session.deleted_at.is_(None)).first()
+        if not session:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Session {chat_request.session_id} not found"
+            )
+
+        # First turn in an archived session brings its history back
+        ensure_restored(db, session)
 
     # Build file metadata for user message from request
     file_metadata = None
@@ -73,46 +102,52 @@ async def send_message(
         content=chat_request.message,
         message_metadata=file_metadata
     )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
-
-    # Get all previous messages in this session for context
-    previous_messages = db.query(Message).filter(
-        Message.session_id == chat_request.session_id
-    ).order_by(Message.created_at).all()
+    with tracer.start_span("chat.save_user_message"):
+        db.add(user_message)
+        revision = bump_revision(db, session.id)
+        db.commit()
+        db.refresh(user_message)
 
-    # Build conversation history for OpenAI
-    messages = [
-        {"role": msg.role, "content": msg.content}
-        for msg in previous_messages
-    ]
+    # Conversation history (including inherited history), from the per-worker context cache
+    with tracer.start_span("chat.load_context") as span:
+        context = get_session_context(db, session, revision, appended=user_message)
+        messages = context.llm_messages(include_files=False)
+        span.set_attributes({"context.messages": len(messages), "context.bytes": context.size})
 
     try:
         # Call LLM API (non-streaming)
-        response = litellm.completion(
-            model=session.llm_model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000
-        )
+        with tracer.start_span("llm.completion", {"llm.provider": session.llm_provider, "llm.model": session.llm_model}):
+            response = litellm.completion(
+                model=session.llm_model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000
+            )
 
         # Extract assistant response
         assistant_content = response.choices[0].message.content
+        usage = read_usage(response, 1) or estimate_usage(1, messages, assistant_content or "")
 
         # Create assistant message
-        assistant_message = Message(
-            session_id=chat_request.session_id,
-            role="assistant",
-            content=assistant_content
-        )
-        db.add(assistant_message)
+        with tracer.start_span("chat.persist"):
+            assistant_id = uuid7()
+            usage_summary = record_usage(db, assistant_id, session.id, session.llm_provider, session.llm_model, [usage])
+            assistant_message = Message(
+                id=assistant_id,
+                session_id=chat_request.session_id,
+                role="assistant",
+                content=assistant_content,
+                message_metadata={"usage": usage_summary}
+            )
+            db.add(assistant_message)
 
-        # Update session updated_at timestamp
-        session.updated_at = datetime.utcnow()
+            # Update session updated_at timestamp
+            session.updated_at = datetime.utcnow()
+            revision = bump_revision(db, session.id)
 
-        db.commit()
-        db.refresh(assistant_message)
+            db.commit()
+            db.refresh(assistant_message)
+            context_cache.append(session.id, revision, "assistant", assistant_content)
 
         return ChatResponse(
             user_message=user_message,
@@ -120,6 +155,7 @@ async def send_message(
         )
 
     except Exception as e:
+        chat_errors.inc(session.llm_provider, session.llm_model, "llm")
         # Rollback if LLM call fails
         db.rollback()
         raise HTTPException(
@@ -128,28 +164,144 @@ async def send_message(
         )
 
 
+def _message_key(db: DBSession, message_id: UUID, session_ids: List[UUID]) -> HistoryKey:
+    """
+    Resolve a cursor message id to its (created_at, id) history position.
+
+    Only the sessions of the history being read are searched, so the lookup
+    prunes to their messages partitions.
+    """
+    row = db.query(Message.created_at, Message.id).filter(
+        Message.session_id.in_(session_ids),
+        Message.id == message_id
+    ).first()
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cursor message {message_id} not found"
+        )
+    return row.created_at, row.id
+
+
+def _archived_window(
+    messages: List[dict],
+    before_id: Optional[UUID],
+    after_id: Optional[UUID],
+    since_id: Optional[UUID],
+    limit: Optional[int]
+) -> Tuple[List[dict], Optional[bool]]:
+    """Apply get_session_messages windowing to an archived history. has_more is None when unlimited."""
+    positions = {message["id"]: index for index, message in enumerate(messages)}
+
+    def position(message_id: UUID) -> int:
+        if str(message_id) not in positions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cursor message {message_id} not found"
+            )
+        return positions[str(message_id)]
+
+    start, end = 0, len(messages)
+    if before_id is not None:
+        end = position(before_id)
+    if after_id is not None:
+        start = position(after_id) + 1
+    if since_id is not None:
+        start = position(since_id) + 1
+    window = messages[start:end]
+
+    if limit is None or since_id is not None:
+        return window, None
+    if after_id is not None:
+        return window[:limit], len(window) > limit
+    return window[-limit:], len(window) > limit
+
+
 @router.get("/sessions/{session_id}/messages", response_model=list[MessageResponse])
 async def get_session_messages(
     session_id: str,
-    db: DBSession = Depends(get_db)
+    before_id: Optional[UUID] = Query(None, alias="before", description="Return messages older than this message id"),
+    after_id: Optional[UUID] = Query(None, alias="after", description="Return messages newer than this message id"),
+    since_id: Optional[UUID] = Query(None, alias="since", description="Return every message appended after this message id"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Window size"),
+    if_none_match: Optional[str] = Header(None),
+    db: DBSession = Depends(get_read_db)
 ):
     """
-    Get all messages for a session.
+    Get messages for a session, in chronological order.
+
+    Includes history inherited from the session it was cloned from; inherited
+    messages keep their original id and session_id.
+
+    Windowing (ordered by created_at with id as tiebreak, served by
+    idx_messages_session_created):
+    - no parameters: full history
+    - **limit**: newest `limit` messages
+    - **before** + **limit**: the `limit` messages preceding a message (page backwards)
+    - **after** + **limit**: the `limit` messages following a message (page forwards)
+    - **since**: every message appended after a known message id
+
+    When a window is cut short by `limit`, the `X-Has-More` header is `true`.
+    Rows are projected and encoded with orjson (see app.utils.serialization).
+    The ETag follows the session revision; a matching If-None-Match gets 304
+    before any message is read. Archived sessions are served from their
+    cold-storage blob.
     """
+    if since_id is not None and (before_id is not None or after_id is not None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since cannot be combined with before/after"
+        )
+
     # Verify session exists
-    session = db.query(Session).filter(Session.id == session_id).first()
+    session = db.query(Session).filter(Session.id == session_id, Session.deleted_at.is_(None)).first()
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Session {session_id} not found"
         )
 
-    # Get all messages
-    messages = db.query(Message).filter(
-        Message.session_id == session_id
-    ).order_by(Message.created_at).all()
-
-    return messages
+    etag = session_etag("messages", session.id, session.revision)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    if session.archived_at is not None:
+        messages, has_more = _archived_window(archived_messages(session.id), before_id, after_id, since_id, limit)
+        headers = cache_headers(etag)
+        if has_more is not None:
+            headers["X-Has-More"] = "true" if has_more else "false"
+        return json_response(messages, headers=headers)
+
+    # Walk the clone lineage, then narrow to the requested window
+    segments = get_lineage(db, session)
+    session_ids = [segment_id for segment_id, _ in segments]
+    query = db.query(*MESSAGE_RESPONSE_COLUMNS).filter(segments_filter(segments))
+    if before_id is not None:
+        query = query.filter(before(_message_key(db, before_id, session_ids)))
+    if after_id is not None:
+        query = query.filter(after(_message_key(db, after_id, session_ids)))
+    if since_id is not None:
+        query = query.filter(after(_message_key(db, since_id, session_ids)))
+
+    if limit is None or since_id is not None:
+        messages = query.order_by(Message.created_at, Message.id).all()
+        return json_response(rows_to_dicts(messages), headers=cache_headers(etag))
+
+    # Fetch one extra row to know whether the window was cut short.
+    # Without an after cursor the window is anchored at the newest end.
+    if after_id is not None:
+        messages = query.order_by(Message.created_at, Message.id).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+    else:
+        messages = query.order_by(desc(Message.created_at), desc(Message.id)).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = list(reversed(messages[:limit]))
+
+    return json_response(
+        rows_to_dicts(messages),
+        headers={"X-Has-More": "true" if has_more else "false", **cache_headers(etag)}
+    )
 
 
 @router.post("/stream")
@@ -163,20 +315,45 @@ async def stream_chat(
     SSE Event Types:
     - content_delta: {"chunk": "text"} - Streamed text chunk
     - user_message: {"message": {...}} - User message saved
-    - done: {"message_id": "uuid"} - Response complete
+    - timing: {"queue_ms", "ttft_ms", "tool_ms", "persist_ms", "db_ms", "total_ms",
+      "prompt_tokens", "completion_tokens"} - Latency breakdown, sent just before done
+      (tokens of all LLM rounds, as reported by the provider or else estimated)
+    - done: {"message_id": "uuid", "message": {...}} - Response complete; the message's
+      message_metadata.usage holds the turn's token usage and cost
     - error: {"detail": "error message"} - Error occurred
+
+    Returns 503 while this worker's streams hold STREAM_MEMORY_BUDGET_MB.
     """
+    # Request arrival, as seen by ServerTimingMiddleware when it is installed
+    request_timings = current_timings()
+    started = request_timings.started if request_timings is not None else time.perf_counter()
+    bind_session(chat_request.session_id)
+
     # Verify session exists and get model info
-    session = db.query(Session).filter(Session.id == chat_request.session_id).first()
-    if not session:
+    with tracer.start_span("chat.load_session", {"session.id": str(chat_request.session_id)}):
+        session = db.query(Session).filter(Session.id == chat_request.session_id, Session.deleted_at.is_(None)).first()
+        if not session:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Session {chat_request.session_id} not found"
+            )
+
+        # First turn in an archived session brings its history back
+        ensure_restored(db, session)
+
+    # Admission control, before anything is written
+    memory = stream_memory.admit(settings.STREAM_MEMORY_BUDGET_MB * 1024 * 1024)
+    if memory is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Session {chat_request.session_id} not found"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many responses are generating right now, please retry shortly",
+            headers={"Retry-After": "5"}
         )
 
     # Store session info we need (before db session closes)
     session_id = session.id
     llm_model = session.llm_model
+    llm_provider = session.llm_provider
 
     # Build file metadata for user message from request
     file_metadata = None
@@ -198,9 +375,15 @@ async def stream_chat(
         content=chat_request.message,
         message_metadata=file_metadata
     )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    try:
+        with tracer.start_span("chat.save_user_message"):
+            db.add(user_message)
+            revision = bump_revision(db, session_id)
+            db.commit()
+            db.refresh(user_message)
+    except Exception:
+        memory.release()
+        raise
 
     # Store user message info for the generator
     user_msg_data = {
@@ -212,39 +395,33 @@ async def stream_chat(
         "message_metadata": user_message.message_metadata
     }
 
-    # Get all previous messages for context (before db session closes)
-    previous_messages = db.query(Message).filter(
-        Message.session_id == session_id
-    ).order_by(Message.created_at).all()
-
-    # Build conversation history for LLM
-    llm_messages = [
-        {"role": msg.role, "content": msg.content}
-        for msg in previous_messages
-    ]
-
-    session_files = db.query(File).filter(
-        File.session_id == session_id
-    ).order_by(File.created_at).all()
-
-    # If there are files, prepend them as a system message
-    if session_files:
-        files_content = []
-        for file in session_files:
-            file_text = f"[File: {file.filename}]\n{file.extracted_text}\n[End of file]"
-            files_content.append(file_text)
-
-        system_message = {
-            "role": "system",
-            "content": "The following files have been uploaded by the user. Use their content to answer questions:\n\n" + "\n\n".join(files_content)
-        }
-        llm_messages.insert(0, system_message)
+    # Build conversation history for LLM (before db session closes). History and
+    # file text come from the per-worker context cache; files are prepended as a
+    # system message.
+    try:
+        with tracer.start_span("chat.load_context") as span:
+            context = get_session_context(db, session, revision, appended=user_message)
+            llm_messages = context.llm_messages()
+            span.set_attributes({"context.messages": len(llm_messages), "context.bytes": context.size})
+    except Exception:
+        memory.release()
+        raise
+    memory.grow(context_bytes(context))
+
+    # Lets other tabs, on any worker, attach to this stream while it generates
+    relay = StreamRelay(session_id)
 
     async def generate() -> AsyncGenerator[str, None]:
         """Generate SSE events for streaming response."""
         # Send user message confirmation
         yield f"event: user_message\ndata: {json.dumps(user_msg_data)}\n\n"
 
+        # Time spent before the generator got to run (event loop and response setup)
+        queued = time.perf_counter() - started
+        first_token = None
+        tool_seconds = 0.0
+        # Not entered as the current span: a span must not stay current across yields
+        llm_span = tracer.start_span("llm.completion", {"llm.provider": llm_provider, "llm.model": llm_model, "llm.round": 1})
         try:
             # Stream response using LiteLLM with tools
             response = await litellm.acompletion(
@@ -253,15 +430,20 @@ async def stream_chat(
                 tools=AVAILABLE_TOOLS,
                 temperature=0.7,
                 max_tokens=4096,
-                stream=True
+                stream=True,
+                stream_options=STREAM_OPTIONS
             )
 
-            # Collect full response for saving
-            full_content = ""
+            # The relay keeps the streamed chunks; the reply is joined from them once, for saving
+            reply_start = 0
             tool_calls_accumulator = []
+            # Token usage per LLM round (the provider's, from the last chunk, or estimated)
+            usage_rounds = []
+            usage = None
 
             async for chunk in response:
                 try:
+                    usage = read_usage(chunk, 1) or usage
                     if chunk.choices and len(chunk.choices) > 0:
                         delta = chunk.choices[0].delta
 
@@ -286,18 +468,32 @@ async def stream_chat(
                         # Handle regular content
                         content = getattr(delta, 'content', None)
                         if content:
-                            full_content += content
+                            if first_token is None:
+                                first_token = time.perf_counter()
+                                chat_ttft.observe(first_token - started, llm_provider, llm_model)
+                                llm_span.add_event("first_token")
+                            relay.content_delta(content)
+                            memory.grow(len(content))
                             yield f"event: content_delta\ndata: {json.dumps({'chunk': content})}\n\n"
 
                 except (AttributeError, IndexError) as e:
                     # Log error and send error event to frontend
                     logger.error(f"Error processing chunk: {e}", exc_info=True)
-                    yield f"event: error\ndata: {json.dumps({'detail': 'Stream interrupted - chunk processing failed'})}\n\n"
+                    chat_errors.inc(llm_provider, llm_model, "chunk")
+                    llm_span.record_exception(e)
+                    llm_span.end()
+                    yield await relay.finish("error", {'detail': 'Stream interrupted - chunk processing failed'})
                     return  # Stop streaming on error
 
+            llm_span.set_attribute("llm.tool_calls", len(tool_calls_accumulator))
+            llm_span.end()
+            usage_rounds.append(usage or estimate_usage(
+                1, llm_messages, relay.content() + "".join(call["function"]["arguments"] for call in tool_calls_accumulator)
+            ))
+
             # If LLM made tool calls, execute them and get final response
             if tool_calls_accumulator:
-                logger.info(f"LLM requested {len(tool_calls_accumulator)} tool call(s)", extra={"tool_calls": tool_calls_accumulator})
+                logger.info("LLM requested %d tool call(s)", len(tool_calls_accumulator), extra={"tool_calls": tool_calls_accumulator})
                 for tool_call in tool_calls_accumulator:
                     if tool_call["function"]["name"] == "search_internet":
                         try:
@@ -306,8 +502,11 @@ async def stream_chat(
                             query = args.get("query", "")
 
                             # Execute search
+                            tool_start = time.perf_counter()
                             search_results = search_internet(query)
-                            logger.info(f"Search completed for query: '{query}'", extra={"query": query, "result_count": len(search_results)})
+                            tool_calls.observe(time.perf_counter() - tool_start, "search_internet")
+                            tool_seconds += time.perf_counter() - tool_start
+                            logger.info("Search completed for query: '%s'", query, extra={"query": query, "result_count": len(search_results)})
 
                             # Add assistant message with tool call to conversation
                             llm_messages.append({
@@ -324,10 +523,12 @@ async def stream_chat(
                             })
 
                             # Add tool response to conversation
+                            tool_content = json.dumps(search_results)
+                            memory.grow(len(tool_content) + len(tool_call["function"]["arguments"]))
                             llm_messages.append({
                                 "role": "tool",
                                 "tool_call_id": tool_call["id"],
-                                "content": json.dumps(search_results)
+                                "content": tool_content
                             })
 
                         except Exception as e:
@@ -340,46 +541,93 @@ async def stream_chat(
                             })
 
                 # Call LLM again with tool results to get final response
-                logger.debug(f"Calling LLM with {len(llm_messages)} messages including tool results")
+                logger.debug("Calling LLM with %d messages including tool results", len(llm_messages))
+                llm_span = tracer.start_span("llm.completion", {"llm.provider": llm_provider, "llm.model": llm_model, "llm.round": 2})
                 response = await litellm.acompletion(
                     model=llm_model,
                     messages=llm_messages,
                     temperature=0.7,
                     max_tokens=4096,
-                    stream=True
+                    stream=True,
+                    stream_options=STREAM_OPTIONS
                 )
 
-                # Stream final response
-                full_content = ""
+                # Stream final response (the saved reply leaves out text from the first round)
+                reply_start = len(relay.chunks)
+                usage = None
                 async for chunk in response:
                     try:
+                        usage = read_usage(chunk, 2) or usage
                         if chunk.choices and len(chunk.choices) > 0:
                             delta = chunk.choices[0].delta
                             content = getattr(delta, 'content', None)
                             if content:
-                                full_content += content
+                                if first_token is None:
+                                    first_token = time.perf_counter()
+                                    chat_ttft.observe(first_token - started, llm_provider, llm_model)
+                                    llm_span.add_event("first_token")
+                                relay.content_delta(content)
+                                memory.grow(len(content))
                                 yield f"event: content_delta\ndata: {json.dumps({'chunk': content})}\n\n"
                     except (AttributeError, IndexError) as e:
                         logger.error(f"Error processing final response chunk: {e}", exc_info=True)
-                        yield f"event: error\ndata: {json.dumps({'detail': 'Stream interrupted - chunk processing failed'})}\n\n"
+                        chat_errors.inc(llm_provider, llm_model, "chunk")
+                        llm_span.record_exception(e)
+                        llm_span.end()
+                        yield await relay.finish("error", {'detail': 'Stream interrupted - chunk processing failed'})
                         return  # Stop streaming on error
+                llm_span.end()
+                usage_rounds.append(usage or estimate_usage(2, llm_messages, relay.content(reply_start)))
+
+            full_content = relay.content(reply_start)
+            memory.grow(len(full_content))
 
             # Save assistant message using a fresh db session
             with SessionLocal() as save_db:
-                assistant_message = Message(
-                    session_id=session_id,
-                    role="assistant",
-                    content=full_content
-                )
-                save_db.add(assistant_message)
-
-                # Update session timestamp
-                db_session = save_db.query(Session).filter(Session.id == session_id).first()
-                if db_session:
+                persist_start = time.perf_counter()
+                with tracer.start_span("chat.persist"):
+                    # Locked until commit, so a DELETE either waits for the reply or wins before it is written
+                    db_session = save_db.query(Session).filter(
+                        Session.id == session_id, Session.deleted_at.is_(None)
+                    ).with_for_update().first()
+                    if db_session is None:
+                        logger.info("Session %s was deleted while streaming, reply discarded", session_id,
+                                    extra={"session_id": str(session_id)})
+                        yield await relay.finish("error", {"detail": f"Session {session_id} was deleted"})
+                        return
+
+                    assistant_id = uuid7()
+                    usage_summary = record_usage(save_db, assistant_id, session_id, llm_provider, llm_model, usage_rounds)
+                    assistant_message = Message(
+                        id=assistant_id,
+                        session_id=session_id,
+                        role="assistant",
+                        content=full_content,
+                        message_metadata={"usage": usage_summary}
+                    )
+                    save_db.add(assistant_message)
+
+                    # Update session timestamp
                     db_session.updated_at = datetime.utcnow()
-
-                save_db.commit()
-                save_db.refresh(assistant_message)
+                    saved_revision = bump_revision(save_db, session_id)
+
+                    save_db.commit()
+                    save_db.refresh(assistant_message)
+                    context_cache.append(session_id, saved_revision, "assistant", full_content)
+                persisted = time.perf_counter()
+
+                if settings.SERVER_TIMING_ENABLED:
+                    timing_data = {
+                        "queue_ms": round(queued * 1000, 1),
+                        "ttft_ms": round((first_token - started) * 1000, 1) if first_token is not None else None,
+                        "tool_ms": round(tool_seconds * 1000, 1),
+                        "persist_ms": round((persisted - persist_start) * 1000, 1),
+                        "db_ms": round(request_timings.durations.get("db", 0.0) * 1000, 1) if request_timings else None,
+                        "total_ms": round((persisted - started) * 1000, 1),
+                        "prompt_tokens": usage_summary["prompt_tokens"],
+                        "completion_tokens": usage_summary["completion_tokens"],
+                    }
+                    yield f"event: timing\ndata: {json.dumps(timing_data)}\n\n"
 
                 # Send done event
                 done_data = {
@@ -389,21 +637,60 @@ async def stream_chat(
                         "session_id": str(assistant_message.session_id),
                         "role": assistant_message.role,
                         "content": assistant_message.content,
-                        "created_at": assistant_message.created_at.isoformat()
+                        "created_at": assistant_message.created_at.isoformat(),
+                        "message_metadata": assistant_message.message_metadata
                     }
                 }
-                yield f"event: done\ndata: {json.dumps(done_data)}\n\n"
+                yield await relay.finish("done", done_data)
+
+            finished = time.perf_counter()
+            chat_stream_duration.observe(finished - started, llm_provider, llm_model)
+            if first_token is not None and finished > first_token:
+                chat_tokens_per_second.observe(usage_summary["completion_tokens"] / (finished - first_token), llm_provider, llm_model)
 
         except Exception as e:
+            chat_errors.inc(llm_provider, llm_model, "llm" if first_token is None else "stream")
+            llm_span.record_exception(e)
+            llm_span.end()
             # Send error event
-            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            yield await relay.finish("error", {'detail': str(e)})
+
+    async def relayed() -> AsyncGenerator[str, None]:
+        """Run generate() with the stream announced to other workers."""
+        await relay.start()
+        try:
+            async for event in generate():
+                yield event
+        finally:
+            # Client disconnected mid-stream: still tell watchers the stream ended
+            if not relay.finished:
+                await relay.finish("error", {"detail": "Stream interrupted"})
+            memory.release()
 
     return StreamingResponse(
-        generate(),
+        relayed(),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+        headers=SSE_HEADERS,
+        # Also releases the stream's memory when the body never started
+        background=BackgroundTask(memory.release)
+    )
+
+
+@router.get("/sessions/{session_id}/stream")
+async def attach_session_stream(session_id: UUID):
+    """
+    Follow a response that is currently generating for this session.
+
+    The stream may be running on any worker. Starts with a content_delta
+    holding everything generated so far, then relays the live content_delta
+    events and the final done or error event. Returns 204 when nothing is
+    generating.
+    """
+    if str(session_id) not in active_streams:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    return StreamingResponse(
+        attach_stream(session_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
     )
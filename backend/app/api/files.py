@@ -2,41 +2,67 @@
 Files API endpoints.
 """
 import logging
+import time
+from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File as FastAPIFile, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, UploadFile, File as FastAPIFile, status
 from sqlalchemy.orm import Session as DBSession
 
-from app.database import get_db
+from app.database import get_db, uuid7
 from app.models.session import Session
 from app.models.file import File
 from app.schemas.file import FileResponse
 from app.utils.storage import storage
 from app.utils.text_extraction import extract_text
+from app.utils.read_routing import get_read_db
+from app.utils.revisions import bump_revision, cache_headers, etag_matches, get_revision, not_modified, session_etag
+from app.utils.context_cache import context_cache
+from app.utils.metrics import upload_bytes, upload_extraction
+from app.utils.server_timing import record as record_timing
+from app.utils.request_context import bind_session
 
 router = APIRouter(prefix="/api/sessions", tags=["files"])
 logger = logging.getLogger(__name__)
 
+# Columns selected for FileResponse (never extracted_text)
+FILE_RESPONSE_COLUMNS = (
+    File.id,
+    File.session_id,
+    File.filename,
+    File.file_size,
+    File.file_type,
+    File.created_at,
+)
+
 
 @router.get("/{session_id}/files", response_model=list[FileResponse])
 async def get_session_files(
     session_id: UUID,
-    db: DBSession = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: DBSession = Depends(get_read_db)
 ):
     """
     Get all files for a session.
 
-    Returns list of files with metadata (no extracted text).
+    Returns list of files with metadata (no extracted text). Answers a
+    matching If-None-Match with 304 without loading any file rows.
     """
     # Verify session exists
-    session = db.query(Session).filter(Session.id == session_id).first()
-    if not session:
+    revision = get_revision(db, session_id)
+    if revision is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Session {session_id} not found"
         )
 
-    # Get all files for this session
-    files = db.query(File).filter(
+    etag = session_etag("files", session_id, revision)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
+
+    # Project only the columns FileResponse needs
+    files = db.query(*FILE_RESPONSE_COLUMNS).filter(
         File.session_id == session_id
     ).order_by(File.created_at).all()
 
@@ -55,8 +81,10 @@ async def upload_file(
     Validates file type, size, and session file count.
     Extracts text content and stores both file and extracted text.
     """
+    bind_session(session_id)
+
     # Verify session exists
-    session = db.query(Session).filter(Session.id == session_id).first()
+    session = db.query(Session).filter(Session.id == session_id, Session.deleted_at.is_(None)).first()
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -92,16 +120,21 @@ async def upload_file(
         )
 
     # Extract text
+    upload_bytes.observe(file_size, file_ext)
     try:
+        start = time.perf_counter()
         extracted_text = extract_text(content, file_ext)
+        upload_extraction.observe(time.perf_counter() - start, file_ext)
+        record_timing("extract", time.perf_counter() - start)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to extract text: {str(e)}"
         )
 
-    # Create file record
+    # Create file record (id assigned up front, it names the stored file)
     file_record = File(
+        id=uuid7(),
         session_id=session_id,
         filename=file.filename,
         file_type=file_ext,
@@ -126,8 +159,10 @@ async def upload_file(
 
     # Save to database
     db.add(file_record)
+    bump_revision(db, session_id)
     db.commit()
     db.refresh(file_record)
+    context_cache.invalidate(session_id)
 
     return file_record
 
@@ -143,10 +178,11 @@ async def delete_file(
 
     Removes both the database record and the physical file.
     """
-    # Get file record
-    file_record = db.query(File).filter(
+    # Get file record (files of deleted sessions are gone as far as the API is concerned)
+    file_record = db.query(File).join(Session, Session.id == File.session_id).filter(
         File.id == file_id,
-        File.session_id == session_id
+        File.session_id == session_id,
+        Session.deleted_at.is_(None)
     ).first()
 
     if not file_record:
@@ -164,6 +200,8 @@ async def delete_file(
 
     # Delete from database
     db.delete(file_record)
+    bump_revision(db, session_id)
     db.commit()
+    context_cache.invalidate(session_id)
 
     return None
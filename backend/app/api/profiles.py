@@ -0,0 +1,60 @@
+"""
+Request profile and memory snapshot API endpoints.
+"""
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import Response
+
+from app.utils.memory import memory_snapshots
+from app.utils.profiling import PROFILE_FORMATS, profile_path, token_matches
+from app.utils.serialization import json_response
+
+router = APIRouter(prefix="/api/profiles", tags=["profiles"])
+
+
+@router.get("/memory", include_in_schema=False)
+async def get_memory_diff(
+    limit: int = Query(25, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    profile: Optional[str] = Query(None, description="Profiling token (or the X-Profile-Token header)"),
+    x_profile_token: Optional[str] = Header(None)
+):
+    """
+    Allocations that changed the most since the previous call (or since startup).
+
+    Requires the profiling token and TRACEMALLOC_FRAMES > 0; returns 404
+    while tracemalloc is not running.
+    """
+    if not token_matches(x_profile_token or profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+    if not memory_snapshots.tracing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="tracemalloc is not running (TRACEMALLOC_FRAMES)")
+
+    return json_response(await asyncio.to_thread(memory_snapshots.diff, limit, group_by))
+
+
+@router.get("/{profile_id}", include_in_schema=False)
+async def get_profile(
+    profile_id: str,
+    format: str = Query("folded", pattern="^(folded|pstats|json)$", description="folded, pstats or json"),
+    profile: Optional[str] = Query(None, description="Profiling token (or the X-Profile-Token header)"),
+    x_profile_token: Optional[str] = Header(None)
+):
+    """
+    Download a request profile by the X-Profile-Id its response carried.
+
+    Requires the profiling token. Returns 404 for unknown ids and for
+    profiles of requests that have not finished yet.
+    """
+    if not token_matches(x_profile_token or profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+    metadata = profile_path(profile_id, "json")
+    if metadata is None or not metadata.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile {profile_id} not found")
+
+    path = profile_path(profile_id, format)
+    media_type = PROFILE_FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="{path.name}"'} if format == "pstats" else None
+    return Response(content=path.read_bytes(), media_type=media_type, headers=headers)
@@ -0,0 +1,40 @@
+"""
+Full-text search API endpoint.
+"""
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session as DBSession
+
+from app.schemas.search import SearchResponse
+from app.utils.pagination import decode_rank_cursor, encode_rank_cursor
+from app.utils.read_routing import get_read_db
+from app.utils.search import describe, search
+from app.utils.serialization import json_response
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+
+@router.get("", response_model=SearchResponse)
+async def search_sessions(
+    q: str = Query(..., min_length=1, max_length=256, description="Search words (web search syntax on PostgreSQL)"),
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    session_id: Optional[UUID] = Query(None, description="Only search this session"),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Search session titles and message history.
+
+    Results are ranked by relevance and carry a snippet of the matching text
+    with the offsets of matching words. See app.utils.search for the
+    indexes behind it.
+    """
+    rows = search(db, q, limit, decode_rank_cursor(cursor) if cursor else None, session_id)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_rank_cursor(rows[-1].rank, rows[-1].id)
+
+    return json_response({"results": describe(db, rows, q), "next_cursor": next_cursor})
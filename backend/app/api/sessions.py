@@ -2,17 +2,33 @@
 Session management API endpoints.
 """
 import logging
-from uuid import UUID, uuid4
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session as DBSession
-from sqlalchemy import desc
-
-from app.database import get_db
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session as DBSession, undefer
+from sqlalchemy import and_, case, desc, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from app.database import get_db, uuid7
 from app.models.session import Session
-from app.models.message import Message
 from app.models.file import File
-from app.schemas.session import SessionCreate, SessionResponse, SessionListResponse, SessionUpdate
+from app.schemas.session import (
+    BatchResponse, BatchSessionIds, BatchUpdateRequest, SessionCreate, SessionResponse, SessionListResponse, SessionUpdate
+)
 from app.utils.storage import storage
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.serialization import SESSION_RESPONSE_COLUMNS, json_response, rows_to_dicts
+from app.utils.context_cache import context_cache
+from app.utils.read_routing import get_read_db, note_write
+from app.utils.archive import ensure_restored
+from app.utils.revisions import bump_revision, bump_revisions, cache_headers, etag_matches, get_revision, list_etag, not_modified, session_etag
+from app.utils.lineage import last_message_id, last_message_ids, lineage_depth, lineage_depths, materialize_if_deep
+from app.utils.reaper import reap_session_by_id, reap_sessions_by_ids
+from app.utils.transfer import SessionImporter, TransferFormatError, export_ndjson
+from app.utils.tracing import tracer
+from app.config import settings
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 logger = logging.getLogger(__name__)
@@ -43,56 +59,168 @@ async def create_session(
     db.add(new_session)
     db.commit()
     db.refresh(new_session)
+    note_write(new_session.id)
 
     return new_session
 
 
 @router.get("", response_model=SessionListResponse)
 async def list_sessions(
-    db: DBSession = Depends(get_db)
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (all sessions if omitted)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    updated_since: Optional[datetime] = Query(None, description="Only sessions updated after this time"),
+    include_total: bool = Query(True, description="Count all matching sessions"),
+    if_none_match: Optional[str] = Header(None),
+    db: DBSession = Depends(get_read_db)
 ):
     """
-    List all sessions, sorted by most recently updated.
+    List sessions, sorted by most recently updated.
+
+    - **limit** / **cursor**: Keyset pagination on (updated_at, id), served by
+      idx_sessions_updated_at. Pass next_cursor back to get the following page.
+    - **updated_since**: Incremental sync, returns only sessions changed since
+      the client's last fetch (deleted sessions are not reported).
+    - **include_total**: Set to false to skip the COUNT query when paging.
+
+    Rows are projected and encoded with orjson (see app.utils.serialization).
+    The response carries an ETag; a matching If-None-Match gets 304 after a
+    single aggregate query.
+    """
+    etag = list_etag(db, request.url.query)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    query = db.query(*SESSION_RESPONSE_COLUMNS).filter(Session.deleted_at.is_(None))
+    if updated_since is not None:
+        query = query.filter(Session.updated_at > updated_since)
+
+    total = query.with_entities(func.count(Session.id)).scalar() if include_total else None
+
+    if cursor is not None:
+        cursor_updated_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Session.updated_at < cursor_updated_at,
+            and_(Session.updated_at == cursor_updated_at, Session.id < cursor_id)
+        ))
+
+    query = query.order_by(desc(Session.updated_at), desc(Session.id))
+
+    next_cursor = None
+    if limit is None:
+        sessions = query.all()
+    else:
+        # Fetch one extra row to know whether another page exists
+        sessions = query.limit(limit + 1).all()
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = encode_cursor(sessions[-1].updated_at, sessions[-1].id)
+
+    return json_response({
+        "sessions": rows_to_dicts(sessions),
+        "total": total,
+        "next_cursor": next_cursor
+    }, headers=cache_headers(etag))
+
+
+@router.get("/export")
+async def export_sessions(
+    session_ids: Optional[List[UUID]] = Query(None, description="Only these sessions (repeat the parameter)"),
+    updated_since: Optional[datetime] = Query(None, description="Only sessions updated after this time"),
+    include_blobs: bool = Query(False, description="Embed uploaded file contents (base64)"),
+):
     """
-    sessions = db.query(Session).order_by(desc(Session.updated_at)).all()
+    Export sessions with their messages and files as a streamed NDJSON document.
 
-    return SessionListResponse(
-        sessions=sessions,
-        total=len(sessions)
+    The format is described in app.utils.transfer. Rows are read with
+    server-side cursors and written as they arrive, so memory use does not
+    grow with the export. Feed the body to POST /api/sessions/import.
+    """
+    return StreamingResponse(
+        export_ndjson(session_ids, updated_since, include_blobs),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="sessions.ndjson"'}
     )
 
 
+@router.post("/import")
+async def import_sessions(
+    request: Request,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Import an NDJSON document produced by GET /api/sessions/export.
+
+    The request body is read incrementally and rows are inserted in batches
+    (whole sessions per commit). Sessions that already exist are skipped, so
+    a failed import can simply be re-run. Returns the number of sessions,
+    messages and files imported and of sessions skipped. A malformed line
+    returns 400 naming it, as does a line over IMPORT_MAX_LINE_BYTES; batches
+    committed before it stay imported.
+    """
+    importer = SessionImporter(db)
+    try:
+        async for chunk in request.stream():
+            importer.feed_chunk(chunk)
+        counts = importer.finish()
+    except (TransferFormatError, IntegrityError) as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e).splitlines()[0])
+
+    logger.info("Imported %d sessions (%d messages, %d files)", counts["sessions"], counts["messages"], counts["files"], extra=counts)
+    return counts
+
+
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session(
     session_id: UUID,
-    db: DBSession = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: DBSession = Depends(get_read_db)
 ):
     """
     Get a specific session by ID.
+
+    Answers a matching If-None-Match with 304 after reading only the revision.
     """
-    session = db.query(Session).filter(Session.id == session_id).first()
+    revision = get_revision(db, session_id)
+    if revision is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Session {session_id} not found"
+        )
 
+    etag = session_etag("session", session_id, revision)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    session = db.query(Session).filter(Session.id == session_id, Session.deleted_at.is_(None)).first()
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Session {session_id} not found"
         )
-
+    response.headers.update(cache_headers(session_etag("session", session_id, session.revision)))
     return session
 
 
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_session(
     session_id: UUID,
+    background_tasks: BackgroundTasks,
     db: DBSession = Depends(get_db)
 ):
     """
     Delete a session by ID.
 
-    Deletes the session and all associated messages and files.
-    Also cleans up physical files from disk.
+    Marks the session deleted (a tombstone) and returns immediately; from then
+    on it is hidden from every read. Messages, files, the archive blob and the
+    row itself are removed by the reaper (app.utils.reaper), right after the
+    response and again by the periodic sweep if that run fails. Sessions
+    cloned from this one get their inherited history copied in first so they
+    stay intact.
     """
-    session = db.query(Session).filter(Session.id == session_id).first()
+    session = db.query(Session).filter(Session.id == session_id, Session.deleted_at.is_(None)).first()
 
     if not session:
         raise HTTPException(
@@ -100,16 +228,13 @@ async def delete_session(
             detail=f"Session {session_id} not found"
         )
 
-    # Clean up physical files before deleting database records
-    try:
-        storage.delete_session_files(session_id)
-    except Exception as e:
-        # Log warning but continue with database deletion
-        logger.warning(f"Failed to delete physical files for session {session_id}: {e}", extra={"session_id": str(session_id)})
-
-    # Delete session (cascade will handle messages and files table records)
-    db.delete(session)
+    session.deleted_at = datetime.utcnow()
+    bump_revision(db, session_id)
     db.commit()
+    context_cache.invalidate(session_id)
+    note_write(session_id)
+
+    background_tasks.add_task(tracer.bind(reap_session_by_id), session_id)
 
     return None
 
@@ -123,7 +248,7 @@ async def update_session(
     """
     Update a session (currently only title).
     """
-    session = db.query(Session).filter(Session.id == session_id).first()
+    session = db.query(Session).filter(Session.id == session_id, Session.deleted_at.is_(None)).first()
 
     if not session:
         raise HTTPException(
@@ -133,6 +258,7 @@ async def update_session(
 
     if session_data.title is not None:
         session.title = session_data.title
+        bump_revision(db, session_id)
 
     db.commit()
     db.refresh(session)
@@ -143,15 +269,21 @@ async def update_session(
 @router.post("/{session_id}/clone", response_model=SessionResponse, status_code=status.HTTP_201_CREATED)
 async def clone_session(
     session_id: UUID,
+    background_tasks: BackgroundTasks,
     db: DBSession = Depends(get_db)
 ):
     """
     Clone an existing session.
     Creates a new session with the same title (with " (Copy)" appended), provider, model,
-    and copies all messages and files.
+    and copies all files.
+
+    Messages are not copied: the clone points at the original session and the
+    last message at fork time, and history reads walk that lineage. Clone cost
+    doesn't grow with history size. Lineages deeper than LINEAGE_MAX_DEPTH are
+    flattened by a background job.
     """
     # Get original session
-    original_session = db.query(Session).filter(Session.id == session_id).first()
+    original_session = db.query(Session).filter(Session.id == session_id, Session.deleted_at.is_(None)).first()
 
     if not original_session:
         raise HTTPException(
@@ -159,74 +291,246 @@ async def clone_session(
             detail=f"Session {session_id} not found"
         )
 
-    # Create cloned session
+    # The clone shares the original's history, so it has to be back in the hot tables
+    ensure_restored(db, original_session)
+
+    # Create cloned session, forked at the newest message of the original's history
     cloned_session = Session(
         title=f"{original_session.title} (Copy)",
         llm_provider=original_session.llm_provider,
-        llm_model=original_session.llm_model
+        llm_model=original_session.llm_model,
+        parent_session_id=original_session.id,
+        fork_message_id=last_message_id(db, original_session)
     )
 
     db.add(cloned_session)
     db.flush()  # Flush to get the cloned_session.id
 
-    # Clone all messages
-    original_messages = db.query(Message).filter(
-        Message.session_id == session_id
-    ).order_by(Message.created_at).all()
-
-    for original_msg in original_messages:
-        cloned_msg = Message(
-            session_id=cloned_session.id,
-            role=original_msg.role,
-            content=original_msg.content,
-            created_at=original_msg.created_at,
-            message_metadata=original_msg.message_metadata
-        )
-        db.add(cloned_msg)
-
-    # Clone all files
-    original_files = db.query(File).filter(
+    # Clone all files (bounded at 3 per session)
+    original_files = db.query(File).options(undefer(File.extracted_text)).filter(
         File.session_id == session_id
     ).order_by(File.created_at).all()
 
     for original_file in original_files:
-        # Create new file ID for the clone
-        new_file_id = uuid4()
-
-        # Read original file content
-        try:
-            file_content = storage.read_file(original_file.file_path)
-        except Exception as e:
-            # If file doesn't exist on disk, skip it
-            logger.warning(f"Could not read file during clone: {e}", extra={"file_path": original_file.file_path, "file_id": str(original_file.id)})
-            continue
+        cloned_file = _clone_file(original_file, cloned_session.id)
+        if cloned_file is not None:
+            db.add(cloned_file)
+
+    db.commit()
+    db.refresh(cloned_session)
+    note_write(cloned_session.id)
+
+    if lineage_depth(db, cloned_session) > settings.LINEAGE_MAX_DEPTH:
+        background_tasks.add_task(tracer.bind(materialize_if_deep), cloned_session.id)
+
+    return cloned_session
+
+
+def _clone_file(original_file: File, cloned_session_id: UUID) -> Optional[File]:
+    """Copy a file's blob into a cloned session and build its record (None if the blob can't be copied)."""
+    # Create new file ID for the clone
+    new_file_id = uuid7()
+
+    # Read original file content
+    try:
+        file_content = storage.read_file(original_file.file_path)
+    except Exception as e:
+        # If file doesn't exist on disk, skip it
+        logger.warning(f"Could not read file during clone: {e}", extra={"file_path": original_file.file_path, "file_id": str(original_file.id)})
+        return None
 
-        # Create cloned file record
-        cloned_file = File(
-            id=new_file_id,
-            session_id=cloned_session.id,
+    # Save file to new location
+    try:
+        file_path = storage.save_file(
+            session_id=cloned_session_id,
+            file_id=new_file_id,
             filename=original_file.filename,
-            file_type=original_file.file_type,
-            file_size=original_file.file_size,
-            extracted_text=original_file.extracted_text,
-            created_at=original_file.created_at
+            content=file_content
         )
+    except Exception as e:
+        logger.warning(f"Could not save cloned file: {e}", extra={"filename": original_file.filename, "new_file_id": str(new_file_id)})
+        return None
+
+    return File(
+        id=new_file_id,
+        session_id=cloned_session_id,
+        filename=original_file.filename,
+        file_path=file_path,
+        file_type=original_file.file_type,
+        file_size=original_file.file_size,
+        extracted_text=original_file.extracted_text,
+        created_at=original_file.created_at
+    )
 
-        # Save file to new location
-        try:
-            file_path = storage.save_file(
-                session_id=cloned_session.id,
-                file_id=new_file_id,
-                filename=original_file.filename,
-                content=file_content
-            )
-            cloned_file.file_path = file_path
-            db.add(cloned_file)
-        except Exception as e:
-            logger.warning(f"Could not save cloned file: {e}", extra={"filename": original_file.filename, "new_file_id": str(new_file_id)})
+
+def _chunks(items: List[Any]) -> Iterator[List[Any]]:
+    """Split a bulk request into BATCH_CHUNK_SIZE pieces, each handled in one transaction."""
+    size = settings.BATCH_CHUNK_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _batch_response(ids: List[UUID], results: Dict[UUID, Dict[str, Any]]) -> Response:
+    """One result per requested id, in request order; ids without a result were not found."""
+    return json_response({"results": [
+        results.get(item_id) or {"id": item_id, "status": status.HTTP_404_NOT_FOUND, "detail": f"Session {item_id} not found"}
+        for item_id in ids
+    ]})
+
+
+def _session_rows(db: DBSession, session_ids: List[UUID]) -> Dict[UUID, Dict[str, Any]]:
+    """SessionResponse dicts for the given sessions, keyed by id."""
+    rows = db.query(*SESSION_RESPONSE_COLUMNS).filter(Session.id.in_(session_ids)).all()
+    return {row["id"]: row for row in rows_to_dicts(rows)}
+
+
+@router.post(":batchDelete", response_model=BatchResponse)
+async def batch_delete_sessions(
+    batch: BatchSessionIds,
+    background_tasks: BackgroundTasks,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Delete many sessions.
+
+    Sessions are tombstoned with one UPDATE per chunk of BATCH_CHUNK_SIZE ids
+    (one transaction each) and reaped by a single background job, like
+    DELETE /api/sessions/{id}. Each result has status 204 or 404.
+    """
+    ids = list(dict.fromkeys(batch.session_ids))
+    results: Dict[UUID, Dict[str, Any]] = {}
+    deleted: List[UUID] = []
+
+    for chunk in _chunks(ids):
+        found = [row.id for row in db.query(Session.id).filter(Session.id.in_(chunk), Session.deleted_at.is_(None))]
+        if not found:
             continue
+        db.query(Session).filter(Session.id.in_(found)).update(
+            {Session.deleted_at: datetime.utcnow(), Session.updated_at: Session.updated_at},
+            synchronize_session=False
+        )
+        bump_revisions(db, found)
+        db.commit()
+        for session_id in found:
+            context_cache.invalidate(session_id)
+            note_write(session_id)
+            results[session_id] = {"id": session_id, "status": status.HTTP_204_NO_CONTENT}
+        deleted.extend(found)
 
-    db.commit()
-    db.refresh(cloned_session)
+    if deleted:
+        background_tasks.add_task(tracer.bind(reap_sessions_by_ids), deleted)
 
-    return cloned_session
+    return _batch_response(ids, results)
+
+
+@router.post(":batchUpdate", response_model=BatchResponse)
+async def batch_update_sessions(
+    batch: BatchUpdateRequest,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Update many sessions (currently only titles).
+
+    Each chunk of BATCH_CHUNK_SIZE items is applied with a single
+    UPDATE ... SET title = CASE id ... and committed on its own. When an id
+    appears more than once the last item wins. Each result has status 200
+    with the updated session, or 404.
+    """
+    items = {item.id: item for item in batch.items}
+    ids = list(items)
+    results: Dict[UUID, Dict[str, Any]] = {}
+
+    for chunk in _chunks(ids):
+        found = [row.id for row in db.query(Session.id).filter(Session.id.in_(chunk), Session.deleted_at.is_(None))]
+        titles = {session_id: items[session_id].title for session_id in found if items[session_id].title is not None}
+        if titles:
+            db.query(Session).filter(Session.id.in_(list(titles))).update(
+                {Session.title: case(
+                    *[(Session.id == session_id, title) for session_id, title in titles.items()],
+                    else_=Session.title
+                )},
+                synchronize_session=False
+            )
+            bump_revisions(db, list(titles))
+            db.commit()
+        for session_id, row in _session_rows(db, found).items():
+            results[session_id] = {"id": session_id, "status": status.HTTP_200_OK, "session": row}
+
+    return _batch_response(ids, results)
+
+
+@router.post(":batchClone", response_model=BatchResponse)
+async def batch_clone_sessions(
+    batch: BatchSessionIds,
+    background_tasks: BackgroundTasks,
+    db: DBSession = Depends(get_db)
+):
+    """
+    Clone many sessions, like POST /api/sessions/{id}/clone for each.
+
+    Per chunk of BATCH_CHUNK_SIZE ids, originals, their fork points and their
+    files are loaded with one query each and the clones are inserted and
+    committed together. An id listed twice is cloned twice; each result has
+    status 201 with the clone, or 404.
+    """
+    ids = list(batch.session_ids)
+    results: List[Dict[str, Any]] = []
+
+    for chunk in _chunks(ids):
+        originals = {
+            session.id: session
+            for session in db.query(Session).filter(Session.id.in_(chunk), Session.deleted_at.is_(None))
+        }
+        for original_session in originals.values():
+            ensure_restored(db, original_session)
+        fork_points = last_message_ids(db, list(originals.values())) if originals else {}
+
+        chunk_results: List[Dict[str, Any]] = []
+        clones = []
+        for session_id in chunk:
+            original_session = originals.get(session_id)
+            if original_session is None:
+                chunk_results.append({"id": session_id, "status": status.HTTP_404_NOT_FOUND, "detail": f"Session {session_id} not found"})
+                continue
+            cloned_session = Session(
+                id=uuid7(),
+                title=f"{original_session.title} (Copy)",
+                llm_provider=original_session.llm_provider,
+                llm_model=original_session.llm_model,
+                parent_session_id=original_session.id,
+                fork_message_id=fork_points[original_session.id]
+            )
+            clones.append(cloned_session)
+            chunk_results.append({"id": session_id, "clone_id": cloned_session.id})
+        results.extend(chunk_results)
+        if not clones:
+            continue
+        db.add_all(clones)
+        db.flush()
+
+        files_by_session: Dict[UUID, List[File]] = {}
+        for original_file in db.query(File).options(undefer(File.extracted_text)).filter(
+            File.session_id.in_(list(originals))
+        ).order_by(File.created_at):
+            files_by_session.setdefault(original_file.session_id, []).append(original_file)
+        for cloned_session in clones:
+            for original_file in files_by_session.get(cloned_session.parent_session_id, []):
+                cloned_file = _clone_file(original_file, cloned_session.id)
+                if cloned_file is not None:
+                    db.add(cloned_file)
+        # Before the commit expires the clones, which would reload them one by one
+        depths = lineage_depths(db, clones, settings.LINEAGE_MAX_DEPTH)
+        db.commit()
+
+        rows = _session_rows(db, list(depths))
+        for result in chunk_results:
+            clone_id = result.pop("clone_id", None)
+            if clone_id is None:
+                continue
+            result["status"] = status.HTTP_201_CREATED
+            result["session"] = rows[clone_id]
+            note_write(clone_id)
+            if depths[clone_id] > settings.LINEAGE_MAX_DEPTH:
+                background_tasks.add_task(tracer.bind(materialize_if_deep), clone_id)
+
+    return json_response({"results": results})
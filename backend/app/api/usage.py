@@ -0,0 +1,46 @@
+"""
+Token usage API endpoint.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session as DBSession
+
+from app.schemas.usage import UsageResponse
+from app.utils.read_routing import get_read_db
+from app.utils.serialization import json_response
+from app.utils.usage import aggregate
+
+router = APIRouter(prefix="/api/usage", tags=["usage"])
+
+# Default window when no start is given
+DEFAULT_WINDOW = timedelta(days=7)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+@router.get("", response_model=UsageResponse)
+async def get_usage(
+    start: Optional[datetime] = Query(None, description="Window start (UTC, default: 7 days before end)"),
+    end: Optional[datetime] = Query(None, description="Window end, exclusive (UTC, default: now)"),
+    bucket: str = Query("day", pattern="^(hour|day|week)$", description="hour, day or week (weeks start on Monday)"),
+    session_id: Optional[UUID] = Query(None, description="Only count this session"),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Token usage and cost per time bucket, provider and model.
+
+    Counts every LLM round of every chat turn, deleted sessions included.
+    See app.utils.usage for how usage is captured and priced.
+    """
+    # Stored times are naive UTC
+    end = _naive_utc(end) if end else datetime.utcnow()
+    start = _naive_utc(start) if start else end - DEFAULT_WINDOW
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+
+    buckets = aggregate(db, start, end, bucket, session_id)
+    return json_response({"start": start, "end": end, "bucket": bucket, "buckets": buckets})
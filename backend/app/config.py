@@ -2,7 +2,7 @@
 Application configuration using Pydantic settings.
 """
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -12,8 +12,14 @@ class Settings(BaseSettings):
     APP_NAME: str = "Floatplane Zero Agent"
     DEBUG: bool = True
 
+    # Logging (app.logging_config): "text" or "json" lines on stdout
+    LOG_FORMAT: str = "text"
+    LOG_SAMPLE_RATES: Dict[str, float] = {}  # Logger name -> share of its sub-WARNING records kept (JSON in env)
+
     # Database
     DATABASE_URL: str = "postgresql://postgres:postgres@db:5432/floatplane"
+    DATABASE_REPLICA_URLS: List[str] = []  # Read replicas for GET endpoints (JSON list in env)
+    READ_YOUR_WRITES_SECONDS: float = 5.0  # Reads of a session written this recently use the primary
 
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:5173"]
@@ -26,6 +32,74 @@ class Settings(BaseSettings):
     # Search API Keys
     TAVILY_API_KEY: str = ""
 
+    # Compression for large text columns (messages.content, files.extracted_text)
+    TEXT_COMPRESSION_MIN_BYTES: int = 512
+    TEXT_COMPRESSION_LEVEL: int = 3
+    TEXT_COMPRESSION_DICT_PATH: str = ""  # Trained zstd dictionary (scripts/train_text_dictionary.py)
+
+    # Response compression (br when the optional brotli package is installed, else gzip)
+    RESPONSE_COMPRESSION: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+
+    # Per-worker prompt context cache (history + file text per session)
+    CONTEXT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Cross-worker pub/sub: "auto" (Postgres LISTEN/NOTIFY when the database is Postgres), "postgres" or "memory"
+    PUBSUB_BACKEND: str = "auto"
+    STREAM_ATTACH_IDLE_TIMEOUT: float = 60.0  # Seconds an attached watcher waits for the next event
+    STREAM_HEARTBEAT_SECONDS: float = 5.0  # Generating workers re-announce their streams this often
+    STREAM_HEARTBEAT_MISSES: int = 3  # Other workers forget a stream after this many missed heartbeats
+
+    # Cold storage: sessions untouched this long are archived by scripts/archive_sessions.py
+    ARCHIVE_AFTER_DAYS: int = 7
+    ARCHIVE_COMPRESSION_LEVEL: int = 10
+
+    # Deleted sessions: the reaper removes tombstones in batches, the reconciler reclaims unreferenced uploads
+    BACKGROUND_MAINTENANCE: bool = True  # Run both periodically in each worker
+    REAPER_INTERVAL_SECONDS: float = 30.0
+    REAPER_BATCH_SIZE: int = 1000
+    REAPER_GRACE_SECONDS: float = 60.0  # The sweep leaves younger tombstones to the reap their DELETE scheduled
+    ORPHAN_RECONCILE_INTERVAL_SECONDS: float = 3600.0
+    ORPHAN_GRACE_SECONDS: float = 3600.0  # Never reclaim blobs younger than this (uploads in flight)
+
+    # Bulk session endpoints (POST /api/sessions:batchDelete etc.): items per transaction
+    BATCH_CHUNK_SIZE: int = 200
+
+    # Full-text search (GET /api/search): matches ranked per kind (sessions, messages) and snippet length
+    SEARCH_MAX_CANDIDATES: int = 10000
+    SEARCH_SNIPPET_CHARS: int = 160
+
+    # Prometheus metrics at GET /metrics (database query and pool timing is set up at startup)
+    METRICS_ENABLED: bool = True
+
+    # Server-Timing response header (db, extract, storage, total) and the chat stream's timing event
+    SERVER_TIMING_ENABLED: bool = True
+
+    # Event-loop lag sampling and blocking-call watchdog (app.utils.loop_monitor)
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.1
+    LOOP_BLOCK_THRESHOLD_MS: float = 250.0  # Log the loop thread's stack when blocked this long
+    LOOP_BLOCK_FAIL_MS: float = 0.0  # Debug mode: > 0 makes the test suite fail on blocks this long
+
+    # Chat stream admission: estimated bytes all in-flight streams of a worker may hold (0: no limit)
+    STREAM_MEMORY_BUDGET_MB: int = 512
+    TRACEMALLOC_FRAMES: int = 0  # > 0 traces allocations from startup for GET /api/profiles/memory
+
+    # On-demand request profiling (app.utils.profiling): off while PROFILING_TOKEN is empty
+    PROFILING_TOKEN: str = ""
+    PROFILING_MAX_PER_MINUTE: int = 6
+    PROFILING_INTERVAL_MS: float = 1.0
+    PROFILING_DIR: str = "./profiles"
+    PROFILING_KEEP: int = 200  # Newest profiles kept in PROFILING_DIR; older ones are deleted as new ones are written
+
+    # Request tracing (app.utils.tracing): sampled traces are appended to TRACING_EXPORT_PATH as OTLP/JSON lines
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.01  # Share of traces recorded when the caller sends no sampled flag
+    TRACING_EXPORT_PATH: str = "./traces.jsonl"
+
+    # Session cloning: flatten lineages deeper than this in the background
+    LINEAGE_MAX_DEPTH: int = 8
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -1,19 +1,69 @@
 """
 Database connection and session management.
 """
+import os
+import threading
+import time
 import uuid
-from sqlalchemy import create_engine, TypeDecorator, CHAR
-from sqlalchemy.dialects.postgresql import UUID as PostgreSQLUUID
+from functools import lru_cache
+from typing import Any, Dict, Optional
+import zstandard
+from sqlalchemy import create_engine, TypeDecorator, CHAR, LargeBinary, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID as PostgreSQLUUID
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.functions import FunctionElement
 from app.config import settings
 
 
+_uuid7_lock = threading.Lock()
+_uuid7_last_ms = 0
+_uuid7_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a time-ordered UUIDv7 (RFC 9562).
+
+    Layout: 48-bit Unix timestamp in milliseconds, version, 12-bit counter,
+    variant, 62 random bits. The counter is re-seeded every millisecond and
+    incremented within one, so ids generated by this process are strictly
+    increasing. New rows land at the right edge of the primary key B-tree
+    instead of at random pages, like uuid4 keys do.
+    """
+    global _uuid7_last_ms, _uuid7_counter
+    with _uuid7_lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _uuid7_last_ms:
+            _uuid7_last_ms = now_ms
+            _uuid7_counter = int.from_bytes(os.urandom(2), "big") & 0x7FF  # leave headroom
+        else:
+            _uuid7_counter += 1
+            if _uuid7_counter > 0xFFF:
+                # Counter exhausted within this millisecond: borrow the next one
+                _uuid7_last_ms += 1
+                _uuid7_counter = 0
+        timestamp_ms = _uuid7_last_ms
+        counter = _uuid7_counter
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (timestamp_ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp_ms(value: uuid.UUID) -> int:
+    """Extract the Unix millisecond timestamp embedded in a UUIDv7."""
+    return value.int >> 80
+
+
 class UUIDType(TypeDecorator):
     """
     UUID type that works with both PostgreSQL (UUID) and SQLite (CHAR(36)).
 
     Uses native UUID for PostgreSQL, falls back to CHAR(36) for SQLite.
+    Pair with default=uuid7 for time-ordered primary keys; existing uuid4
+    values remain valid, so no data migration is required.
     """
     impl = CHAR
     cache_ok = True
@@ -44,26 +94,170 @@ class UUIDType(TypeDecorator):
                 return uuid.UUID(value)
             return value
 
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+@lru_cache(maxsize=1)
+def _zstd_dictionary() -> Optional[zstandard.ZstdCompressionDict]:
+    """Load the trained dictionary from TEXT_COMPRESSION_DICT_PATH, if configured."""
+    if not settings.TEXT_COMPRESSION_DICT_PATH:
+        return None
+    with open(settings.TEXT_COMPRESSION_DICT_PATH, "rb") as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+
+def compress_text(value: str) -> bytes:
+    """
+    Encode text for a CompressedText column.
+
+    Values shorter than TEXT_COMPRESSION_MIN_BYTES are stored as plain UTF-8,
+    longer ones as a zstd frame (using the trained dictionary when configured).
+    """
+    raw = value.encode("utf-8")
+    if len(raw) < settings.TEXT_COMPRESSION_MIN_BYTES:
+        return raw
+    compressor = zstandard.ZstdCompressor(
+        level=settings.TEXT_COMPRESSION_LEVEL,
+        dict_data=_zstd_dictionary()
+    )
+    compressed = compressor.compress(raw)
+    # Keep plain text when compression doesn't pay off
+    return compressed if len(compressed) < len(raw) else raw
+
+
+def decompress_text(value: bytes) -> str:
+    """
+    Decode a CompressedText value.
+
+    zstd frames are recognised by their magic number, which can't start a
+    valid UTF-8 string, so plain legacy rows and compressed rows can be mixed.
+    """
+    if value[:4] != ZSTD_MAGIC:
+        return value.decode("utf-8")
+    dict_id = zstandard.get_frame_parameters(value).dict_id
+    decompressor = zstandard.ZstdDecompressor(dict_data=_zstd_dictionary() if dict_id else None)
+    return decompressor.decompress(value).decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text type stored as zstd-compressed bytes (bytea on PostgreSQL, BLOB on SQLite).
+
+    Transparent to the ORM: attributes are plain str. Short values are kept
+    as raw UTF-8, and rows written before compression was enabled (or as
+    text) read back unchanged.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        if isinstance(value, str):
+            return value
+        return decompress_text(bytes(value))
+
+# Text search configuration for tsvectors and queries (fixed by the migrations' GIN indexes)
+SEARCH_CONFIG = "english"
+
+# Longest text indexed per value; PostgreSQL caps a tsvector at 1 MB
+SEARCH_MAX_CHARS = 200_000
+
+
+class to_search_vector(FunctionElement):
+    """to_tsvector(SEARCH_CONFIG, text) on PostgreSQL; the plain text elsewhere (indexed by FTS5)."""
+    inherit_cache = True
+
+
+@compiles(to_search_vector, "postgresql")
+def _compile_to_search_vector_pg(element, compiler, **kw):
+    return f"to_tsvector('{SEARCH_CONFIG}', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(to_search_vector)
+def _compile_to_search_vector(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+class SearchVector(TypeDecorator):
+    """
+    Full-text search document of a text column (see app.utils.search).
+
+    Written with the plain text, which PostgreSQL turns into a tsvector on
+    insert; other databases store the text for an FTS5 table kept in sync by
+    triggers. Write-only: searches filter on it but never load it.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(TSVECTOR())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return value
+        return value[:SEARCH_MAX_CHARS]
+
+    def bind_expression(self, bindvalue):
+        return to_search_vector(bindvalue)
+
+
+def _create_engine(url: str):
+    """Create an engine with the application's pool settings."""
+    return create_engine(
+        url,
+        # Connection Pool Settings
+        pool_size=5,              # Base pool: 5 persistent connections
+        max_overflow=10,           # Burst capacity: +10 connections
+        pool_timeout=30,           # Wait up to 30s for available connection
+        pool_recycle=3600,         # Recycle connections after 1 hour (prevents stale connections)
+        pool_pre_ping=True,        # Verify connection health before using (adds slight overhead)
+        # Query Performance
+        echo=False,                # Set to True for SQL query logging (debug only)
+    )
+
+
 # Create database engine with connection pooling
-engine = create_engine(
-    settings.DATABASE_URL,
-    # Connection Pool Settings
-    pool_size=5,              # Base pool: 5 persistent connections
-    max_overflow=10,           # Burst capacity: +10 connections
-    pool_timeout=30,           # Wait up to 30s for available connection
-    pool_recycle=3600,         # Recycle connections after 1 hour (prevents stale connections)
-    pool_pre_ping=True,        # Verify connection health before using (adds slight overhead)
-    # Query Performance
-    echo=False,                # Set to True for SQL query logging (debug only)
-)
+engine = _create_engine(settings.DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replicas (see app.utils.read_routing), one engine and pool each
+replica_engines = [_create_engine(url) for url in settings.DATABASE_REPLICA_URLS]
+ReplicaSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replica_engines
+]
+
 # Create base class for models
 Base = declarative_base()
 
 
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Connection pool usage for the primary and each replica, keyed by name."""
+    engines = {"primary": engine}
+    engines.update({f"replica-{i}": replica for i, replica in enumerate(replica_engines)})
+
+    stats = {}
+    for name, pool_engine in engines.items():
+        pool = pool_engine.pool
+        stats[name] = {
+            "host": pool_engine.url.host,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        }
+    return stats
+
+
 def get_db():
     """
     Dependency for getting database session.
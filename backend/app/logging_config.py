@@ -2,32 +2,160 @@
 Logging configuration for the application.
 
 Sets up Python's standard logging with appropriate formatters and handlers.
+
+Log calls never write to stdout themselves: the root logger's handler puts
+records on a queue and a listener thread formats and writes them, so log
+I/O stays off the event loop. On the way in, records are
+- sampled: below WARNING, loggers listed in LOG_SAMPLE_RATES keep only
+  that share of their records (warnings and errors are always kept)
+- tagged with request_id, session_id, trace_id and span_id of the code
+  that logged them
+
+LOG_FORMAT=json writes one JSON object per line with those ids and the
+record's `extra` fields; the default text format is for humans.
+
+Log with %-style arguments, e.g. logger.debug("Sent %d messages", count),
+so disabled levels skip formatting entirely.
 """
+import atexit
+import copy
 import logging
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import orjson
+
+from app.utils.request_context import current_request_id, current_session_id
+from app.utils.tracing import tracer
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+CONTEXT_FIELDS = ("request_id", "session_id", "trace_id", "span_id")
+
+# LogRecord attributes that are not `extra` fields
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of the sub-WARNING records of the listed loggers (and their children)."""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class ContextFilter(logging.Filter):
+    """Adds the request, session and trace ids of the logging code to its records."""
 
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = current_request_id()
+        if getattr(record, "session_id", None) is None:
+            record.session_id = current_session_id()
+        context = tracer.current_span().context
+        record.trace_id = context.trace_id if context is not None else None
+        record.span_id = context.span_id if context is not None else None
+        return True
 
-def setup_logging(log_level: str = "INFO") -> None:
+
+class _QueueHandler(QueueHandler):
+    """Enqueues records with their message resolved; formatting is left to the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments are resolved now since they may change before the listener gets to them
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, context ids and extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def setup_logging(log_level: str = "INFO", log_format: str = "text",
+                  sample_rates: Optional[Dict[str, float]] = None) -> None:
     """
     Configure application-wide logging.
 
     Args:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        log_format: "text" or "json"
+        sample_rates: Share of sub-WARNING records kept, by logger name
     """
+    global _listener
+
     # Convert string to logging level
     numeric_level = getattr(logging, log_level.upper(), logging.INFO)
 
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_rates))
+    handler.addFilter(ContextFilter())
+
     # Configure root logger
     logging.basicConfig(
         level=numeric_level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ],
+        handlers=[handler],
         force=True  # Override any existing configuration
     )
 
+    # Reconfiguring: write out what the previous listener still holds
+    stop_logging()
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
     # Set specific loggers to appropriate levels
     # Suppress overly verbose third-party loggers
     logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -35,7 +163,18 @@ def setup_logging(log_level: str = "INFO") -> None:
     logging.getLogger("LiteLLM").setLevel(logging.WARNING)
 
     logger = logging.getLogger(__name__)
-    logger.info(f"Logging configured with level: {log_level}")
+    logger.info("Logging configured with level: %s", log_level)
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
 
 
 def get_logger(name: str) -> logging.Logger:
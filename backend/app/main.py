@@ -1,20 +1,67 @@
 """
 Main FastAPI application entry point.
 """
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.api import sessions, chat, files
+from app.api import sessions, chat, files, search, profiles, usage
 from app.logging_config import setup_logging
+from app.utils.compression import CompressionMiddleware
+from app.utils.pubsub import pubsub
+from app.utils.stream_relay import setup_stream_relay
+from app.utils.read_routing import setup_read_routing
+from app.utils.reaper import run_maintenance
+from app.utils.loop_monitor import LoopMonitorMiddleware, loop_monitor
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.request_context import RequestContextMiddleware
+from app.utils.memory import memory_snapshots
+from app.utils.server_timing import ServerTimingMiddleware, setup_server_timing
+from app.utils.tracing import TracingMiddleware, setup_tracing, shutdown_tracing
+from app.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, setup_metrics
+from app.database import pool_stats
 
 # Setup logging
-setup_logging(log_level=settings.DEBUG and "DEBUG" or "INFO")
+setup_logging(
+    log_level=settings.DEBUG and "DEBUG" or "INFO",
+    log_format=settings.LOG_FORMAT,
+    sample_rates=settings.LOG_SAMPLE_RATES
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the cross-worker pub/sub bus, its subscribers, background maintenance and instrumentation."""
+    setup_stream_relay()
+    setup_read_routing()
+    if settings.METRICS_ENABLED:
+        setup_metrics()
+    if settings.SERVER_TIMING_ENABLED:
+        setup_server_timing()
+    setup_tracing()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start(settings.LOOP_LAG_INTERVAL_SECONDS, settings.LOOP_BLOCK_THRESHOLD_MS, settings.LOOP_BLOCK_FAIL_MS)
+    if settings.TRACEMALLOC_FRAMES > 0:
+        memory_snapshots.start(settings.TRACEMALLOC_FRAMES)
+    await pubsub.start()
+    maintenance = asyncio.create_task(run_maintenance()) if settings.BACKGROUND_MAINTENANCE else None
+    yield
+    if maintenance is not None:
+        maintenance.cancel()
+    await pubsub.stop()
+    await loop_monitor.stop()
+    memory_snapshots.stop()
+    shutdown_tracing()
+
 
 # Create FastAPI app
 app = FastAPI(
     title="Floatplane Zero Agent API",
     description="AI Chat Agent with multi-LLM support",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -26,10 +73,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON bodies (streaming responses are passed through)
+if settings.RESPONSE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+
+# Per-request latency breakdown in the Server-Timing header
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
+# Lets the loop watchdog name the route behind a blocked event loop
+if settings.LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware)
+
+# Trace requests when tracing is enabled
+app.add_middleware(TracingMiddleware)
+
+# Profiles single requests that present PROFILING_TOKEN (a settings check for all others)
+app.add_middleware(ProfilingMiddleware)
+
+# Request ids for logs and X-Request-ID (added last so it is outermost)
+app.add_middleware(RequestContextMiddleware)
+
 # Register routers
 app.include_router(sessions.router)
 app.include_router(chat.router)
 app.include_router(files.router)
+app.include_router(search.router)
+app.include_router(profiles.router)
+app.include_router(usage.router)
 
 
 @app.get("/health")
@@ -38,10 +109,19 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "floatplane-zero-agent",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "database_pools": pool_stats()
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Process metrics in the Prometheus text format (see app.utils.metrics)."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
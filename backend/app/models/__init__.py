@@ -3,5 +3,7 @@ Database models.
 """
 from app.models.session import Session
 from app.models.message import Message
+from app.models.archive import SessionArchive
+from app.models.usage import MessageUsage
 
-__all__ = ["Session", "Message"]
+__all__ = ["Session", "Message", "SessionArchive", "MessageUsage"]
@@ -0,0 +1,34 @@
+"""
+Archive index model for sessions moved to cold storage.
+"""
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy.orm import relationship, backref
+from app.database import Base, UUIDType
+
+
+class SessionArchive(Base):
+    """
+    One row per archived session.
+
+    The session's messages and file text live in a single NDJSON+zstd blob in
+    storage (see app.utils.archive); this row records where, and how big.
+    """
+    __tablename__ = "session_archives"
+
+    session_id = Column(UUIDType(), ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    blob_path = Column(String(512), nullable=False)  # Relative to the storage base path
+    message_count = Column(Integer, nullable=False)
+    file_count = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False)      # NDJSON size before compression
+    stored_bytes = Column(Integer, nullable=False)   # Blob size
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # Relationship to session
+    session = relationship(
+        "Session",
+        backref=backref("archive", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    )
+
+    def __repr__(self):
+        return f"<SessionArchive(session_id={self.session_id}, messages={self.message_count})>"
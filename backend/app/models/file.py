@@ -1,11 +1,10 @@
 """
 File model for uploaded files.
 """
-import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey
-from sqlalchemy.orm import relationship, backref
-from app.database import Base, UUIDType
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy.orm import relationship, backref, deferred
+from app.database import Base, UUIDType, CompressedText, uuid7
 
 
 class File(Base):
@@ -13,16 +12,19 @@ class File(Base):
     File model.
 
     Represents an uploaded file (PDF, TXT, MD) with extracted text.
+
+    extracted_text is deferred: it is only needed when building LLM context,
+    so loading File objects doesn't pull up to 100K characters per row.
     """
     __tablename__ = "files"
 
-    id = Column(UUIDType(), primary_key=True, default=uuid.uuid4)
+    id = Column(UUIDType(), primary_key=True, default=uuid7)
     session_id = Column(UUIDType(), ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False)
     filename = Column(String(255), nullable=False)
     file_path = Column(String(512), nullable=False)  # Path to file on disk
     file_size = Column(Integer, nullable=False)  # Size in bytes
     file_type = Column(String(50), nullable=False)  # pdf, txt, md
-    extracted_text = Column(Text, nullable=True)  # Extracted text content (max 100K chars)
+    extracted_text = deferred(Column(CompressedText, nullable=True))  # Extracted text content (max 100K chars), loaded on access
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     # Relationship to session
@@ -1,12 +1,14 @@
 """
 Message model for chat messages.
 """
-import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, JSON, TypeDecorator
+from sqlalchemy import Column, DDL, PrimaryKeyConstraint, String, DateTime, ForeignKey, JSON, TypeDecorator, event
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship, backref
-from app.database import Base, UUIDType
+from sqlalchemy.orm import relationship, backref, deferred
+from app.database import Base, UUIDType, CompressedText, SearchVector, uuid7
+
+# Hash partitions of the messages table on PostgreSQL (fixed at table creation)
+MESSAGE_PARTITIONS = 16
 
 
 class JSONType(TypeDecorator):
@@ -25,20 +27,37 @@ class JSONType(TypeDecorator):
             return dialect.type_descriptor(JSON())
 
 
+def _content_search_text(context):
+    """Index a new message's content (the plain text, before compression)."""
+    return context.get_current_parameters().get("content")
+
+
 class Message(Base):
     """
     Chat message model.
 
     Represents a single message in a conversation (user or assistant).
+
+    On PostgreSQL the table is hash-partitioned by session_id, so the primary
+    key includes session_id and queries filtering on session_id touch a
+    single partition. Other databases get a plain table with the same key.
+
+    search_vector is filled from content on insert (messages are never
+    edited) and backs full-text search (app.utils.search).
     """
     __tablename__ = "messages"
+    __table_args__ = (
+        PrimaryKeyConstraint("session_id", "id"),
+        {"postgresql_partition_by": "HASH (session_id)"},
+    )
 
-    id = Column(UUIDType(), primary_key=True, default=uuid.uuid4)
-    session_id = Column(UUIDType(), ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False)
+    id = Column(UUIDType(), primary_key=True, default=uuid7)
+    session_id = Column(UUIDType(), ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
     role = Column(String(20), nullable=False)  # "user" or "assistant"
-    content = Column(Text, nullable=False)
+    content = Column(CompressedText, nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     message_metadata = Column(JSONType, nullable=True)  # Stores file metadata: {"files": [{"filename": "...", "file_type": "..."}]}
+    search_vector = deferred(Column(SearchVector, nullable=True, default=_content_search_text))
 
     # Relationship to session
     session = relationship(
@@ -48,3 +67,36 @@ class Message(Base):
 
     def __repr__(self):
         return f"<Message(id={self.id}, role={self.role}, session_id={self.session_id})>"
+
+
+# create_all() on PostgreSQL: create the hash partitions with the parent table
+for _remainder in range(MESSAGE_PARTITIONS):
+    event.listen(
+        Message.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TABLE messages_p{_remainder:02d} PARTITION OF messages "
+            f"FOR VALUES WITH (MODULUS {MESSAGE_PARTITIONS}, REMAINDER {_remainder})"
+        ).execute_if(dialect="postgresql")
+    )
+
+
+# create_all(): the full-text index on search_vector (GIN on PostgreSQL,
+# an FTS5 table fed by triggers on SQLite)
+event.listen(
+    Message.__table__,
+    "after_create",
+    DDL("CREATE INDEX idx_messages_search_vector ON messages USING GIN (search_vector)").execute_if(dialect="postgresql")
+)
+for _statement in (
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(body)",
+    "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages WHEN new.search_vector IS NOT NULL BEGIN "
+    "INSERT INTO messages_fts (rowid, body) VALUES (new.rowid, new.search_vector); END",
+    "CREATE TRIGGER messages_fts_update AFTER UPDATE OF search_vector ON messages BEGIN "
+    "DELETE FROM messages_fts WHERE rowid = old.rowid; "
+    "INSERT INTO messages_fts (rowid, body) SELECT new.rowid, new.search_vector WHERE new.search_vector IS NOT NULL; END",
+    "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "DELETE FROM messages_fts WHERE rowid = old.rowid; END",
+):
+    event.listen(Message.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Message.__table__, "before_drop", DDL("DROP TABLE IF EXISTS messages_fts").execute_if(dialect="sqlite"))
@@ -1,10 +1,9 @@
 """
 Session model for chat sessions.
 """
-import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime
-from app.database import Base, UUIDType
+from sqlalchemy import Column, DDL, String, Integer, DateTime, ForeignKey, event
+from app.database import Base, UUIDType, SEARCH_CONFIG, uuid7
 
 
 class Session(Base):
@@ -12,15 +11,55 @@ class Session(Base):
     Chat session model.
 
     Represents a conversation session with a specific LLM provider.
+
+    Cloned sessions share history with their parent instead of copying it:
+    parent_session_id points at the session they were forked from and
+    fork_message_id at the last message of the parent's history at fork time.
+
+    revision is bumped on every write to the session, its messages or files and
+    versions anything derived from them (e.g. the prompt context cache and
+    HTTP ETags).
+
+    Deleting a session only sets deleted_at; rows and storage are removed in
+    the background by app.utils.reaper. Every lookup filters tombstones out.
+
+    Titles are full-text indexed (app.utils.search): an expression GIN index
+    on PostgreSQL, an FTS5 table fed by triggers on SQLite.
     """
     __tablename__ = "sessions"
 
-    id = Column(UUIDType(), primary_key=True, default=uuid.uuid4)
+    id = Column(UUIDType(), primary_key=True, default=uuid7)
     title = Column(String(255), nullable=False)
     llm_provider = Column(String(50), nullable=False)  # openai, anthropic, google
     llm_model = Column(String(100), nullable=False)    # gpt-4, claude-sonnet-4, gemini-flash-2.0
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    parent_session_id = Column(UUIDType(), ForeignKey("sessions.id", ondelete="SET NULL"), nullable=True, index=True)
+    fork_message_id = Column(UUIDType(), nullable=True)  # Last inherited message (None = empty prefix)
+    revision = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, nullable=True)  # Set while history is in cold storage (SessionArchive)
+    deleted_at = Column(DateTime, nullable=True)   # Tombstone: hidden from every read until the reaper removes it
 
     def __repr__(self):
         return f"<Session(id={self.id}, title={self.title}, provider={self.llm_provider})>"
+
+
+# create_all(): the title full-text index
+event.listen(
+    Session.__table__,
+    "after_create",
+    DDL(
+        f"CREATE INDEX idx_sessions_title_search ON sessions USING GIN (to_tsvector('{SEARCH_CONFIG}', title))"
+    ).execute_if(dialect="postgresql")
+)
+for _statement in (
+    "CREATE VIRTUAL TABLE sessions_fts USING fts5(title)",
+    "CREATE TRIGGER sessions_fts_insert AFTER INSERT ON sessions BEGIN "
+    "INSERT INTO sessions_fts (rowid, title) VALUES (new.rowid, new.title); END",
+    "CREATE TRIGGER sessions_fts_update AFTER UPDATE OF title ON sessions BEGIN "
+    "UPDATE sessions_fts SET title = new.title WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER sessions_fts_delete AFTER DELETE ON sessions BEGIN "
+    "DELETE FROM sessions_fts WHERE rowid = old.rowid; END",
+):
+    event.listen(Session.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Session.__table__, "before_drop", DDL("DROP TABLE IF EXISTS sessions_fts").execute_if(dialect="sqlite"))
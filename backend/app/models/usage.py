@@ -0,0 +1,40 @@
+"""
+Token usage model for LLM calls.
+"""
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, String
+from app.database import Base, UUIDType, uuid7
+
+
+class MessageUsage(Base):
+    """
+    Token usage and cost of one LLM round of a chat turn.
+
+    A turn has one round, or two when the model called tools (the follow-up
+    completion re-sends the whole prompt). Rows point at the assistant
+    message and session without foreign keys: spend history outlives
+    deleted sessions. estimated is set when the provider reported no usage
+    and tokens were estimated from text length; cost is None for models
+    missing from LiteLLM's price table.
+    """
+    __tablename__ = "message_usage"
+    __table_args__ = (
+        Index("idx_message_usage_created_at", "created_at"),
+        Index("idx_message_usage_session_id", "session_id"),
+    )
+
+    id = Column(UUIDType(), primary_key=True, default=uuid7)
+    message_id = Column(UUIDType(), nullable=False)   # Assistant message of the turn
+    session_id = Column(UUIDType(), nullable=False)
+    llm_provider = Column(String(50), nullable=False)
+    llm_model = Column(String(100), nullable=False)
+    round = Column(Integer, nullable=False)           # 1 = first completion, 2 = after tool calls
+    prompt_tokens = Column(Integer, nullable=False)
+    completion_tokens = Column(Integer, nullable=False)
+    cached_tokens = Column(Integer, nullable=False, default=0)  # Part of prompt_tokens served from the provider's cache
+    cost = Column(Float, nullable=True)                # USD
+    estimated = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MessageUsage(message_id={self.message_id}, round={self.round}, model={self.llm_model})>"
@@ -0,0 +1,26 @@
+"""
+Pydantic schemas for the search endpoint.
+"""
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+
+class SearchResult(BaseModel):
+    """One matching session title or message."""
+    type: str = Field(..., description="session or message")
+    session_id: UUID
+    session_title: str
+    message_id: Optional[UUID] = None
+    role: Optional[str] = None
+    created_at: datetime = Field(..., description="Message time, or the session's last update for title matches")
+    rank: float
+    snippet: str
+    highlights: List[List[int]] = Field(..., description="[start, end) offsets of matching words in snippet")
+
+
+class SearchResponse(BaseModel):
+    """Schema for search results, best match first."""
+    results: List[SearchResult]
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page")
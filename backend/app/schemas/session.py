@@ -2,7 +2,7 @@
 Pydantic schemas for session endpoints.
 """
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel, Field
 
@@ -39,9 +39,42 @@ class SessionResponse(BaseModel):
 class SessionListResponse(BaseModel):
     """Schema for listing sessions."""
     sessions: list[SessionResponse]
-    total: int
+    total: Optional[int] = Field(None, description="Total matching sessions (omitted when include_total=false)")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page")
 
 
 class SessionUpdate(BaseModel):
     """Schema for updating a session."""
     title: Optional[str] = Field(None, max_length=255, description="Session title")
+
+
+# Largest number of items accepted by one bulk request
+BATCH_MAX_ITEMS = 1000
+
+
+class BatchSessionIds(BaseModel):
+    """Schema for bulk delete and clone."""
+    session_ids: List[UUID] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class BatchUpdateItem(SessionUpdate):
+    """One session's changes in a bulk update."""
+    id: UUID
+
+
+class BatchUpdateRequest(BaseModel):
+    """Schema for bulk update."""
+    items: List[BatchUpdateItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class BatchItemResult(BaseModel):
+    """Outcome for one item of a bulk request, with the status code the single-item endpoint would return."""
+    id: UUID
+    status: int
+    detail: Optional[str] = None
+    session: Optional[SessionResponse] = None
+
+
+class BatchResponse(BaseModel):
+    """Schema for bulk responses, one result per requested item in request order."""
+    results: List[BatchItemResult]
@@ -0,0 +1,29 @@
+"""
+Pydantic schemas for the usage endpoint.
+"""
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class UsageBucket(BaseModel):
+    """Token usage and cost of one provider and model in one time bucket."""
+    start: datetime = Field(..., description="Bucket start (UTC)")
+    llm_provider: str
+    llm_model: str
+    messages: int = Field(..., description="Assistant messages")
+    rounds: int = Field(..., description="LLM calls (two for turns with tool calls)")
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int = Field(..., description="Prompt tokens served from the provider's cache")
+    cost: Optional[float] = Field(None, description="USD, for priced_rounds; null when no round had a known price")
+    priced_rounds: int
+    estimated_rounds: int = Field(..., description="Rounds without provider-reported usage (tokens estimated)")
+
+
+class UsageResponse(BaseModel):
+    """Schema for usage totals, oldest bucket first."""
+    start: datetime
+    end: datetime
+    bucket: str
+    buckets: List[UsageBucket]
@@ -4,14 +4,18 @@ Internet search tool using Tavily (AI-powered) with DuckDuckGo fallback.
 Provides search functionality for the agent to access current information.
 """
 import logging
+import time
 from typing import List, Dict
 from ddgs import DDGS
 from tavily import TavilyClient
 from app.config import settings
+from app.utils.metrics import search_backend_latency, search_requests
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+@traced("search_internet")
 def search_internet(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     """
     Search internet using Tavily (AI summary) or DuckDuckGo (raw results).
@@ -37,7 +41,8 @@ def search_internet(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     # Try Tavily first (AI-powered search with answer summary)
     if settings.TAVILY_API_KEY:
         try:
-            logger.info(f"Using Tavily search for query: '{query}'")
+            logger.info("Using Tavily search for query: '%s'", query)
+            start = time.perf_counter()
             client = TavilyClient(api_key=settings.TAVILY_API_KEY)
             response = client.search(
                 query=query,
@@ -45,10 +50,12 @@ def search_internet(query: str, max_results: int = 5) -> List[Dict[str, str]]:
                 search_depth="basic",
                 include_answer=True
             )
+            search_backend_latency.observe(time.perf_counter() - start, "tavily")
 
             # Return AI-generated answer as single result
             if response.get("answer"):
-                logger.info(f"Tavily returned AI answer for query: '{query}'", extra={"answer_preview": response['answer'][:100]})
+                logger.info("Tavily returned AI answer for query: '%s'", query, extra={"answer_preview": response['answer'][:100]})
+                search_requests.inc("tavily", "answer")
                 return [{
                     "title": "AI Search Summary",
                     "snippet": response["answer"],
@@ -56,14 +63,17 @@ def search_internet(query: str, max_results: int = 5) -> List[Dict[str, str]]:
                 }]
 
             logger.info("Tavily returned no answer, falling back to DuckDuckGo", extra={"query": query})
+            search_requests.inc("tavily", "no_answer")
 
         except Exception as e:
             logger.warning(f"Tavily search failed: {e}, falling back to DuckDuckGo", exc_info=True, extra={"query": query})
+            search_requests.inc("tavily", "error")
 
     # Fallback to DuckDuckGo
     return _search_with_ddgs(query, max_results)
 
 
+@traced("search_internet.ddgs")
 def _search_with_ddgs(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     """
     Search DuckDuckGo and return formatted results.
@@ -77,9 +87,11 @@ def _search_with_ddgs(query: str, max_results: int = 5) -> List[Dict[str, str]]:
         Returns empty list on error
     """
     try:
-        logger.info(f"Using DuckDuckGo search for query: '{query}'")
+        logger.info("Using DuckDuckGo search for query: '%s'", query)
+        start = time.perf_counter()
         with DDGS() as ddgs:
             results = list(ddgs.text(query, max_results=max_results))
+        search_backend_latency.observe(time.perf_counter() - start, "ddgs")
 
         # Format for LLM consumption
         formatted = []
@@ -90,11 +102,13 @@ def _search_with_ddgs(query: str, max_results: int = 5) -> List[Dict[str, str]]:
                 "link": r.get("href", "")
             })
 
-        logger.info(f"DuckDuckGo returned {len(formatted)} results for query: '{query}'")
+        logger.info("DuckDuckGo returned %d results for query: '%s'", len(formatted), query)
+        search_requests.inc("ddgs", "results" if formatted else "empty")
         return formatted
 
     except Exception as e:
         # Silent failure - return empty results
         # LLM can handle missing data gracefully
         logger.error(f"DuckDuckGo search failed: {e}", exc_info=True, extra={"query": query})
+        search_requests.inc("ddgs", "error")
         return []
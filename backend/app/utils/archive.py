@@ -0,0 +1,245 @@
+"""
+Cold storage for inactive sessions.
+
+Archiving packs a session's full history (inherited messages included) and
+its files' extracted text into one NDJSON+zstd blob in storage, records it in
+session_archives and deletes the hot rows: messages are removed and
+files.extracted_text is cleared (file metadata and uploads stay in place).
+The hot tables and their indexes therefore only grow with active sessions.
+
+Archived sessions stay readable: the messages endpoint serves history from
+the blob. Anything that writes (a chat turn, cloning) restores the session to
+the hot tables first.
+
+Blob layout, one JSON object per line:
+    {"type": "session", "version": 1, "session_id": ...}
+    {"type": "message", "id", "role", "content", "created_at", "message_metadata"}
+    {"type": "file", "id", "extracted_text"}
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+import orjson
+import zstandard
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session as DBSession
+
+from app.config import settings
+from app.database import uuid7
+from app.models.session import Session
+from app.models.message import Message
+from app.models.file import File
+from app.models.archive import SessionArchive
+from app.utils.context_cache import context_cache
+from app.utils.lineage import detach_children, history_query
+from app.utils.revisions import bump_revision
+from app.utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_VERSION = 1
+
+
+def pack(records: List[Dict[str, Any]]) -> bytes:
+    """Encode records as zstd-compressed NDJSON."""
+    ndjson = b"".join(orjson.dumps(record) + b"\n" for record in records)
+    return zstandard.ZstdCompressor(level=settings.ARCHIVE_COMPRESSION_LEVEL).compress(ndjson)
+
+
+def unpack(blob: bytes) -> Iterator[Dict[str, Any]]:
+    """Decode a blob written by pack()."""
+    ndjson = zstandard.ZstdDecompressor().decompress(blob)
+    for line in ndjson.splitlines():
+        if line:
+            yield orjson.loads(line)
+
+
+def read_archive(session_id: UUID) -> Iterator[Dict[str, Any]]:
+    """Records of an archived session, header first."""
+    records = unpack(storage.read_file(storage.archive_path(session_id)))
+    header = next(records)
+    if header.get("version") != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported archive version {header.get('version')} for session {session_id}")
+    return records
+
+
+def archived_messages(session_id: UUID) -> List[Dict[str, Any]]:
+    """
+    An archived session's history in chronological order.
+
+    Dicts have the MessageResponse fields, like rows_to_dicts output.
+    """
+    return [
+        {
+            "id": record["id"],
+            "session_id": str(session_id),
+            "role": record["role"],
+            "content": record["content"],
+            "created_at": record["created_at"],
+            "message_metadata": record["message_metadata"],
+        }
+        for record in read_archive(session_id)
+        if record["type"] == "message"
+    ]
+
+
+def archive_session(db: DBSession, session: Session) -> Optional[SessionArchive]:
+    """
+    Move a session's history and file text to cold storage. Does not commit.
+
+    Sessions cloned from this one get their inherited history copied in first.
+    Inherited messages are stored as the session's own (with new ids), so the
+    blob is self-contained and the session leaves its lineage.
+
+    Returns:
+        The archive row, or None if there was nothing to archive
+    """
+    detach_children(db, session.id)
+
+    history = history_query(
+        db, session,
+        Message.id, Message.session_id, Message.role, Message.content, Message.created_at, Message.message_metadata
+    ).all()
+    files = db.query(File.id, File.extracted_text).filter(
+        File.session_id == session.id, File.extracted_text.isnot(None)
+    ).all()
+    if not history and not files:
+        return None
+
+    records: List[Dict[str, Any]] = [{"type": "session", "version": ARCHIVE_VERSION, "session_id": str(session.id)}]
+    for row in history:
+        records.append({
+            "type": "message",
+            "id": str(row.id if row.session_id == session.id else uuid7()),
+            "role": row.role,
+            "content": row.content,
+            "created_at": row.created_at.isoformat(),
+            "message_metadata": row.message_metadata,
+        })
+    for row in files:
+        records.append({"type": "file", "id": str(row.id), "extracted_text": row.extracted_text})
+
+    raw_bytes = sum(len(orjson.dumps(record)) + 1 for record in records)
+    blob = pack(records)
+    blob_path = storage.save_archive(session.id, blob)
+
+    db.query(Message).filter(Message.session_id == session.id).delete(synchronize_session=False)
+    db.query(File).filter(File.session_id == session.id).update(
+        {File.extracted_text: None}, synchronize_session=False
+    )
+
+    archive = db.query(SessionArchive).filter(SessionArchive.session_id == session.id).first()
+    if archive is None:
+        archive = SessionArchive(session_id=session.id)
+        db.add(archive)
+    archive.blob_path = blob_path
+    archive.message_count = len(history)
+    archive.file_count = len(files)
+    archive.raw_bytes = raw_bytes
+    archive.stored_bytes = len(blob)
+    archive.archived_at = datetime.utcnow()
+
+    session.parent_session_id = None
+    session.fork_message_id = None
+    session.archived_at = archive.archived_at
+    db.flush()
+    bump_revision(db, session.id)
+    context_cache.invalidate(session.id)
+
+    return archive
+
+
+def restore_session(db: DBSession, session: Session) -> int:
+    """
+    Move an archived session back to the hot tables. Does not commit.
+
+    The blob is left in storage; the next archive overwrites it, otherwise
+    the orphan reconciler (app.utils.reaper) reclaims it.
+
+    Returns:
+        Number of messages restored
+    """
+    batch = []
+    file_texts = {}
+    for record in read_archive(session.id):
+        if record["type"] == "message":
+            batch.append({
+                "id": UUID(record["id"]),
+                "session_id": session.id,
+                "role": record["role"],
+                "content": record["content"],
+                "created_at": datetime.fromisoformat(record["created_at"]),
+                "message_metadata": record["message_metadata"],
+            })
+        elif record["type"] == "file":
+            file_texts[UUID(record["id"])] = record["extracted_text"]
+
+    if batch:
+        db.execute(insert(Message), batch)
+    for file in db.query(File).filter(File.id.in_(list(file_texts))).all():
+        file.extracted_text = file_texts[file.id]
+
+    db.query(SessionArchive).filter(SessionArchive.session_id == session.id).delete(synchronize_session=False)
+    session.archived_at = None
+    db.flush()
+    bump_revision(db, session.id)
+    context_cache.invalidate(session.id)
+
+    logger.info("Restored archived session %s (%d messages)", session.id, len(batch), extra={"session_id": str(session.id)})
+    return len(batch)
+
+
+def ensure_restored(db: DBSession, session: Session) -> None:
+    """
+    Restore a session before writing to it, if it is archived. Does not commit.
+
+    Locks the session row so a concurrent archive run either finishes first
+    (and is undone here) or sees the new revision and skips the session.
+    """
+    if session.archived_at is None:
+        return
+    db.refresh(session, with_for_update=True)
+    if session.archived_at is not None:
+        restore_session(db, session)
+
+
+def archive_inactive_sessions(db: DBSession, older_than: timedelta, limit: int = 100) -> int:
+    """
+    Archive up to `limit` sessions not updated for `older_than`, committing each.
+
+    Returns:
+        Number of sessions archived
+    """
+    cutoff = datetime.utcnow() - older_than
+    has_messages = db.query(Message.id).filter(Message.session_id == Session.id).exists()
+    has_file_text = db.query(File.id).filter(File.session_id == Session.id, File.extracted_text.isnot(None)).exists()
+    candidates = db.query(Session.id, Session.revision).filter(
+        Session.archived_at.is_(None),
+        Session.deleted_at.is_(None),
+        Session.updated_at < cutoff,
+        or_(has_messages, has_file_text)
+    ).order_by(Session.updated_at).limit(limit).all()
+
+    archived = 0
+    for candidate in candidates:
+        session = db.query(Session).filter(Session.id == candidate.id).with_for_update().first()
+        # Skip sessions written to since they were selected
+        if session is None or session.revision != candidate.revision or session.archived_at is not None:
+            db.rollback()
+            continue
+        try:
+            archive = archive_session(db, session)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to archive session {candidate.id}: {e}", exc_info=True, extra={"session_id": str(candidate.id)})
+            continue
+        if archive is not None:
+            archived += 1
+            logger.info(
+                f"Archived session {session.id} ({archive.message_count} messages, {archive.stored_bytes} bytes)",
+                extra={"session_id": str(session.id)}
+            )
+    return archived
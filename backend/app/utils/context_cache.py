@@ -0,0 +1,212 @@
+"""
+Per-session prompt context cache.
+
+stream_chat and send_message need the full conversation history plus the
+concatenated text of every session file on each turn. This module keeps that
+context per session in an in-process LRU bounded by approximate byte size:
+history as compact (role, content, token_count) tuples and the file block
+pre-joined into a single string.
+
+Entries are versioned by sessions.revision. A turn that bumps the revision
+from N to N+1 can append to an entry cached at N; any other mismatch means
+someone else wrote to the session (possibly on another worker) and the entry
+is rebuilt from the database. Explicit invalidations are forwarded to the
+registered hooks so other workers can drop their copies too.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session as DBSession
+
+from app.config import settings
+from app.models.session import Session
+from app.models.message import Message
+from app.models.file import File
+from app.utils.lineage import history_query
+
+logger = logging.getLogger(__name__)
+
+FILES_PREAMBLE = "The following files have been uploaded by the user. Use their content to answer questions:\n\n"
+
+# (role, content, approximate token count)
+ContextMessage = Tuple[str, str, int]
+
+# Fixed per-entry and per-message bookkeeping overhead, in bytes
+ENTRY_OVERHEAD = 512
+MESSAGE_OVERHEAD = 120
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class SessionContext:
+    """Prompt context for one session at one revision."""
+    revision: int
+    messages: List[ContextMessage]
+    files_block: Optional[str]
+    size: int = 0
+
+    def __post_init__(self):
+        self.size = ENTRY_OVERHEAD + len(self.files_block or "") + sum(
+            len(content) + MESSAGE_OVERHEAD for _, content, _ in self.messages
+        )
+
+    def llm_messages(self, include_files: bool = True) -> List[Dict[str, Optional[str]]]:
+        """Build the LiteLLM message list (a fresh list, safe to extend)."""
+        messages = [{"role": role, "content": content} for role, content, _ in self.messages]
+        if include_files and self.files_block:
+            messages.insert(0, {"role": "system", "content": FILES_PREAMBLE + self.files_block})
+        return messages
+
+    @property
+    def token_count(self) -> int:
+        """Approximate prompt tokens for history plus files."""
+        files_tokens = estimate_tokens(self.files_block) if self.files_block else 0
+        return files_tokens + sum(tokens for _, _, tokens in self.messages)
+
+
+class ContextCache:
+    """Thread-safe LRU of SessionContext entries bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[UUID, SessionContext]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hooks: List[Callable[[UUID], None]] = []
+        # Lookup statistics, updated by get_session_context
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: UUID, revision: int) -> Optional[SessionContext]:
+        """Return the entry if cached at exactly this revision."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry.revision != revision:
+                return None
+            self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id: UUID, context: SessionContext) -> None:
+        """Store an entry, evicting least recently used ones to stay in budget."""
+        with self._lock:
+            self._discard(session_id)
+            if context.size > self.max_bytes:
+                return
+            self._entries[session_id] = context
+            self._size += context.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def append(self, session_id: UUID, new_revision: int, role: str, content: str) -> Optional[SessionContext]:
+        """
+        Append a message to an entry cached at new_revision - 1.
+
+        Returns the updated entry, or None (and drops the entry) when the
+        cached revision shows another writer got in between.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if entry.revision != new_revision - 1:
+                self._discard(session_id)
+                return None
+            added = len(content) + MESSAGE_OVERHEAD
+            entry.messages.append((role, content, estimate_tokens(content)))
+            entry.revision = new_revision
+            entry.size += added
+            self._size += added
+            self._entries.move_to_end(session_id)
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+            return self._entries.get(session_id)
+
+    def invalidate(self, session_id: UUID, broadcast: bool = True) -> None:
+        """
+        Drop a session's entry.
+
+        With broadcast=True the registered hooks are called so other workers
+        can drop theirs; receivers of a broadcast call with broadcast=False.
+        """
+        with self._lock:
+            self._discard(session_id)
+        if broadcast:
+            for hook in self._hooks:
+                try:
+                    hook(session_id)
+                except Exception as e:
+                    logger.warning(f"Context cache invalidation hook failed: {e}", extra={"session_id": str(session_id)})
+
+    def add_invalidation_hook(self, hook: Callable[[UUID], None]) -> None:
+        """Register a callback run on every broadcast invalidation."""
+        self._hooks.append(hook)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Approximate bytes held."""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, session_id: UUID) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+
+def load_session_context(db: DBSession, session: Session, revision: int) -> SessionContext:
+    """Build a session's prompt context from the database."""
+    history = history_query(db, session, Message.role, Message.content).all()
+    messages = [(row.role, row.content, estimate_tokens(row.content)) for row in history]
+
+    files = db.query(File.filename, File.extracted_text).filter(
+        File.session_id == session.id
+    ).order_by(File.created_at).all()
+    files_block = None
+    if files:
+        files_block = "\n\n".join(
+            f"[File: {f.filename}]\n{f.extracted_text}\n[End of file]" for f in files
+        )
+
+    return SessionContext(revision=revision, messages=messages, files_block=files_block)
+
+
+def get_session_context(db: DBSession, session: Session, revision: int, appended: Optional[Message] = None) -> SessionContext:
+    """
+    Return a session's prompt context at revision.
+
+    If `appended` is the message whose write produced this revision, an entry
+    cached at the previous revision is extended in place instead of rebuilt.
+    """
+    context = context_cache.get(session.id, revision)
+    if context is None and appended is not None:
+        context = context_cache.append(session.id, revision, appended.role, appended.content)
+    if context is not None:
+        context_cache.hits += 1
+        return context
+
+    context_cache.misses += 1
+    context = load_session_context(db, session, revision)
+    context_cache.put(session.id, context)
+    return context
+
+
+# Global cache instance
+context_cache = ContextCache(max_bytes=settings.CONTEXT_CACHE_MAX_BYTES)
@@ -0,0 +1,273 @@
+"""
+Session lineage utilities.
+
+Cloned sessions don't copy their parent's messages. Instead they record the
+parent session and the fork-point message, and history reads walk the chain:
+each ancestor contributes its messages up to the fork point, and the session
+itself contributes all of its own messages.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, or_, insert, desc, func
+from sqlalchemy.orm import Session as DBSession
+
+from app.config import settings
+from app.database import SessionLocal, uuid7
+from app.models.session import Session
+from app.models.message import Message
+from app.utils.revisions import bump_revision
+
+logger = logging.getLogger(__name__)
+
+# A position in history: (created_at, message_id), compared lexicographically
+HistoryKey = Tuple[datetime, UUID]
+
+# One lineage segment: (session_id, cutoff). cutoff is None for the session itself.
+Segment = Tuple[UUID, Optional[HistoryKey]]
+
+
+def get_lineage(db: DBSession, session: Session) -> List[Segment]:
+    """
+    Resolve the lineage of a session, from the session itself up to its root.
+
+    Each ancestor's cutoff is the earliest fork point seen on the way up, so a
+    grandparent only contributes what was visible when the chain was forked.
+
+    Returns:
+        List of (session_id, cutoff) segments, leaf first
+    """
+    segments: List[Segment] = [(session.id, None)]
+    seen = {session.id}
+    cutoff: Optional[HistoryKey] = None
+    parent_id = session.parent_session_id
+    fork_message_id = session.fork_message_id
+
+    while parent_id is not None and fork_message_id is not None and parent_id not in seen:
+        # The fork point is usually the parent's own message (one partition);
+        # only forks at an inherited message need the unpruned id lookup
+        fork = db.query(Message.created_at, Message.id).filter(
+            Message.session_id == parent_id, Message.id == fork_message_id
+        ).first() or db.query(Message.created_at, Message.id).filter(
+            Message.id == fork_message_id
+        ).first()
+        if fork is None:
+            logger.warning(f"Fork message {fork_message_id} missing, truncating lineage", extra={"session_id": str(session.id)})
+            break
+
+        fork_key = (fork.created_at, fork.id)
+        if cutoff is None or fork_key < cutoff:
+            cutoff = fork_key
+
+        parent = db.query(Session.id, Session.parent_session_id, Session.fork_message_id).filter(
+            Session.id == parent_id
+        ).first()
+        if parent is None:
+            break
+
+        segments.append((parent.id, cutoff))
+        seen.add(parent.id)
+        parent_id = parent.parent_session_id
+        fork_message_id = parent.fork_message_id
+
+    return segments
+
+
+def at_or_before(key: HistoryKey):
+    """SQL condition for messages positioned at or before key."""
+    created_at, message_id = key
+    return or_(
+        Message.created_at < created_at,
+        and_(Message.created_at == created_at, Message.id <= message_id)
+    )
+
+
+def before(key: HistoryKey):
+    """SQL condition for messages positioned strictly before key."""
+    created_at, message_id = key
+    return or_(
+        Message.created_at < created_at,
+        and_(Message.created_at == created_at, Message.id < message_id)
+    )
+
+
+def after(key: HistoryKey):
+    """SQL condition for messages positioned strictly after key."""
+    created_at, message_id = key
+    return or_(
+        Message.created_at > created_at,
+        and_(Message.created_at == created_at, Message.id > message_id)
+    )
+
+
+def segments_filter(segments: List[Segment]):
+    """Build the WHERE clause selecting the messages of the given segments."""
+    conditions = []
+    for segment_id, cutoff in segments:
+        if cutoff is None:
+            conditions.append(Message.session_id == segment_id)
+        else:
+            conditions.append(and_(Message.session_id == segment_id, at_or_before(cutoff)))
+    return or_(*conditions)
+
+
+def history_filter(db: DBSession, session: Session):
+    """WHERE clause selecting a session's full history, including inherited messages."""
+    return segments_filter(get_lineage(db, session))
+
+
+def history_query(db: DBSession, session: Session, *columns):
+    """
+    Query for a session's full history in chronological order.
+
+    Pass columns (e.g. Message.role, Message.content) to get lightweight row
+    tuples instead of full Message objects.
+    """
+    return db.query(*(columns or (Message,))).filter(
+        history_filter(db, session)
+    ).order_by(Message.created_at, Message.id)
+
+
+def last_message_id(db: DBSession, session: Session) -> Optional[UUID]:
+    """Id of the newest message in a session's full history (the fork point for clones)."""
+    row = db.query(Message.id).filter(
+        history_filter(db, session)
+    ).order_by(desc(Message.created_at), desc(Message.id)).first()
+    return row.id if row else None
+
+
+def last_message_ids(db: DBSession, sessions: Sequence[Session]) -> Dict[UUID, Optional[UUID]]:
+    """
+    last_message_id of many sessions with one query.
+
+    A session's own messages are newer than anything it inherited, so its
+    newest own message is the answer; a session without any ends its
+    history at its fork point.
+    """
+    position = func.row_number().over(
+        partition_by=Message.session_id, order_by=(desc(Message.created_at), desc(Message.id))
+    ).label("position")
+    newest = db.query(Message.session_id, Message.id, position).filter(
+        Message.session_id.in_([session.id for session in sessions])
+    ).subquery()
+    own = {row.session_id: row.id for row in db.query(newest.c.session_id, newest.c.id).filter(newest.c.position == 1)}
+    return {session.id: own.get(session.id, session.fork_message_id) for session in sessions}
+
+
+def lineage_depth(db: DBSession, session: Session) -> int:
+    """Number of ancestors a history read has to visit."""
+    return len(get_lineage(db, session)) - 1
+
+
+def lineage_depths(db: DBSession, sessions: Sequence[Session], limit: int) -> Dict[UUID, int]:
+    """
+    Ancestor counts of many sessions, following parent links with one query per level.
+
+    Counts stop at limit + 1 and, unlike lineage_depth, don't check that fork
+    messages still exist, so they may overestimate: use them to pick sessions
+    for materialize_if_deep, which checks again.
+    """
+    depths = {session.id: 0 for session in sessions}
+    # session id -> next ancestor to count
+    frontier = {session.id: session.parent_session_id for session in sessions if session.fork_message_id is not None}
+    for _ in range(limit + 1):
+        frontier = {session_id: parent_id for session_id, parent_id in frontier.items() if parent_id is not None}
+        if not frontier:
+            break
+        parents = {
+            row.id: row for row in db.query(Session.id, Session.parent_session_id, Session.fork_message_id)
+            .filter(Session.id.in_(set(frontier.values())))
+        }
+        for session_id, parent_id in frontier.items():
+            depths[session_id] += 1
+            parent = parents.get(parent_id)
+            frontier[session_id] = parent.parent_session_id if parent is not None and parent.fork_message_id is not None else None
+    return depths
+
+
+def materialize_session(db: DBSession, session: Session, batch_size: int = 1000) -> int:
+    """
+    Flatten a session's lineage by copying inherited messages into it.
+
+    Copies are inserted in batches with executemany. Children forked at one of
+    the copied messages are re-pointed at the copy so their own lineage stays
+    intact. Bumps the session's revision, since its messages get new ids.
+    Does not commit.
+
+    Returns:
+        Number of messages copied
+    """
+    inherited = get_lineage(db, session)[1:]
+    copied = 0
+
+    if inherited:
+        condition = segments_filter(inherited)
+        last_key: Optional[HistoryKey] = None
+
+        while True:
+            query = db.query(
+                Message.id, Message.role, Message.content, Message.created_at, Message.message_metadata
+            ).filter(condition)
+            if last_key is not None:
+                query = query.filter(after(last_key))
+            rows = query.order_by(Message.created_at, Message.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            id_map = {}
+            batch = []
+            for row in rows:
+                new_id = uuid7()
+                id_map[row.id] = new_id
+                batch.append({
+                    "id": new_id,
+                    "session_id": session.id,
+                    "role": row.role,
+                    "content": row.content,
+                    "created_at": row.created_at,
+                    "message_metadata": row.message_metadata
+                })
+            db.execute(insert(Message), batch)
+
+            children = db.query(Session).filter(
+                Session.parent_session_id == session.id,
+                Session.fork_message_id.in_(list(id_map))
+            ).all()
+            for child in children:
+                child.fork_message_id = id_map[child.fork_message_id]
+
+            copied += len(rows)
+            last_key = (rows[-1].created_at, rows[-1].id)
+
+    session.parent_session_id = None
+    session.fork_message_id = None
+    db.flush()
+    if copied:
+        bump_revision(db, session.id)
+
+    return copied
+
+
+def detach_children(db: DBSession, session_id: UUID) -> None:
+    """Materialize every session forked from session_id, e.g. before it is deleted."""
+    children = db.query(Session).filter(Session.parent_session_id == session_id).all()
+    for child in children:
+        copied = materialize_session(db, child)
+        logger.info("Materialized %d inherited messages into session %s", copied, child.id, extra={"session_id": str(child.id), "parent_session_id": str(session_id)})
+
+
+def materialize_if_deep(session_id: UUID) -> None:
+    """
+    Background job: flatten a session whose lineage exceeds LINEAGE_MAX_DEPTH.
+
+    Uses its own database session since it runs after the response is sent.
+    """
+    with SessionLocal() as db:
+        session = db.query(Session).filter(Session.id == session_id).first()
+        if not session or lineage_depth(db, session) <= settings.LINEAGE_MAX_DEPTH:
+            return
+        copied = materialize_session(db, session)
+        db.commit()
+        logger.info("Materialized deep lineage for session %s (%d messages)", session_id, copied, extra={"session_id": str(session_id)})
@@ -0,0 +1,208 @@
+"""
+Event-loop lag monitor and blocking-call watchdog.
+
+Sync work inside `async def` handlers (SQLAlchemy queries, PyMuPDF, file
+writes, sync LLM or search calls) stalls every other request on the worker.
+The monitor makes that visible:
+
+- A watchdog thread schedules a no-op callback on the loop every
+  LOOP_LAG_INTERVAL_SECONDS and records how long the loop takes to get to
+  it in the event_loop_lag_seconds histogram.
+- When a callback has waited LOOP_BLOCK_THRESHOLD_MS the loop is blocked:
+  the watchdog grabs the loop thread's stack while it still shows the
+  culprit and logs it with the route being served (event_loop_blocks_total
+  counts these per route).
+
+Routes are found through the asyncio task running on the loop:
+LoopMonitorMiddleware tags the request task with its ASGI scope and a task
+factory passes the tag on to tasks the request spawns (e.g. the task
+streaming a response body). app.utils.profiling uses the same tags.
+
+Debug mode (LOOP_BLOCK_FAIL_MS > 0, meant for tests) also collects every
+block longer than that many milliseconds in `loop_monitor.violations`;
+tests/conftest.py fails the test that caused them.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.utils.metrics import event_loop_blocks, event_loop_lag
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames kept in a reported stack
+MAX_STACK_FRAMES = 30
+
+# ASGI scope of the request a task is working for
+_request_scope: ContextVar[Optional[dict]] = ContextVar("loop_monitor_scope", default=None)
+_task_scopes: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+
+
+def route_name(scope: Optional[dict]) -> str:
+    """'METHOD /route/{template}' of a request scope (the raw path before routing)."""
+    if scope is None:
+        return "-"
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}".strip()
+
+
+@dataclass
+class BlockedLoop:
+    """A stretch of time the event loop did not answer the watchdog's ping."""
+    route: str
+    blocked_ms: float
+    stack: str
+
+
+def tag_request(scope: dict) -> None:
+    """Mark the current task, and tasks it creates from now on, as working for this request."""
+    _request_scope.set(scope)
+    task = asyncio.current_task()
+    if task is not None:
+        _task_scopes[task] = scope
+
+
+def request_scope(task: Optional[asyncio.Task]) -> Optional[dict]:
+    """ASGI scope of the request a task was tagged with (safe to call from other threads)."""
+    return _task_scopes.get(task) if task is not None else None
+
+
+def install_task_tagging(loop: asyncio.AbstractEventLoop) -> None:
+    """Make tasks created on this loop inherit their creator's request tag. Idempotent."""
+    if not getattr(loop.get_task_factory(), "tags_requests", False):
+        loop.set_task_factory(_tagging_task_factory(loop.get_task_factory()))
+
+
+class LoopMonitorMiddleware:
+    """ASGI middleware tagging request tasks with their scope, for the watchdog's reports."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            tag_request(scope)
+        await self.app(scope, receive, send)
+
+
+def _tagging_task_factory(previous):
+    """Task factory copying the creating request's scope onto new tasks."""
+    def factory(loop, coro, context=None):
+        if previous is not None:
+            task = previous(loop, coro, context=context) if context is not None else previous(loop, coro)
+        elif context is not None:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop)
+        scope = context.get(_request_scope) if context is not None else _request_scope.get()
+        if scope is not None:
+            _task_scopes[task] = scope
+        return task
+    factory.tags_requests = True
+    return factory
+
+
+class LoopMonitor:
+    """Measures event-loop lag and reports blocking calls. One per worker process."""
+
+    def __init__(self):
+        self.interval = 0.1
+        self.threshold = 0.25
+        self.fail_after: Optional[float] = None
+        self.violations: List[BlockedLoop] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # Monotonic time the pending ping was scheduled, None once the loop ran it
+        self._ping_sent: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._watchdog is not None
+
+    def start(self, interval: float, threshold_ms: float, fail_ms: float = 0.0) -> None:
+        """Start watching the running loop from a thread."""
+        if self.running:
+            return
+        self.interval = interval
+        self.threshold = threshold_ms / 1000
+        self.fail_after = fail_ms / 1000 if fail_ms > 0 else None
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        install_task_tagging(self._loop)
+        self._ping_sent = None
+        self._stopping.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._stopping.set()
+        await asyncio.to_thread(self._watchdog.join, 2)
+        self._watchdog = None
+        self._loop = None
+
+    def drain_violations(self) -> List[BlockedLoop]:
+        """Return and clear the blocks collected in debug mode."""
+        violations, self.violations = self.violations, []
+        return violations
+
+    def _pong(self, sent: float) -> None:
+        """Runs on the loop: the ping got through."""
+        event_loop_lag.observe(time.monotonic() - sent)
+        self._ping_sent = None
+
+    def _watch(self) -> None:
+        """Watchdog thread: ping the loop, report once per blocked stretch."""
+        limits = sorted({limit for limit in (self.threshold, self.fail_after) if limit is not None})
+        poll = max(0.005, min(self.interval, limits[0] / 4))
+        next_ping = 0.0
+        reported = set()
+        while not self._stopping.wait(poll):
+            now = time.monotonic()
+            sent = self._ping_sent
+            if sent is None:
+                reported.clear()
+                if now >= next_ping:
+                    next_ping = now + self.interval
+                    self._ping_sent = now
+                    try:
+                        self._loop.call_soon_threadsafe(self._pong, now)
+                    except RuntimeError:
+                        return  # Loop closed
+                continue
+            blocked = now - sent
+            for limit in limits:
+                if blocked >= limit and limit not in reported:
+                    reported.add(limit)
+                    self._report(blocked, log=limit == self.threshold, collect=limit == self.fail_after)
+
+    def _report(self, blocked: float, log: bool, collect: bool) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)[-MAX_STACK_FRAMES:]) if frame is not None else ""
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        route = route_name(request_scope(task))
+        if log:
+            event_loop_blocks.inc(route)
+            logger.warning(
+                f"Event loop blocked for at least {blocked * 1000:.0f} ms in {route}\n{stack}",
+                extra={"route": route, "blocked_ms": round(blocked * 1000, 1)}
+            )
+        if collect:
+            self.violations.append(BlockedLoop(route, round(blocked * 1000, 1), stack))
+
+
+# Global monitor instance
+loop_monitor = LoopMonitor()
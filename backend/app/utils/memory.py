@@ -0,0 +1,171 @@
+"""
+Memory accounting for in-flight chat streams and tracemalloc snapshots.
+
+A chat stream holds its prompt context (history and file text, the files
+system message being a concatenated copy), tool results and the reply
+until it ends. Each stream_chat call gets a StreamMemory that estimates
+those bytes as they are added; the per-worker StreamMemoryBudget sums them
+and refuses new streams (503) while the sum would exceed
+STREAM_MEMORY_BUDGET_MB. A lone stream is always admitted, so a session
+larger than the budget still works on an idle worker.
+
+Exported metrics:
+- chat_streams_in_flight, chat_streams_memory_bytes: current streams and
+  their summed estimate
+- chat_stream_memory_bytes: histogram of each stream's peak estimate
+- chat_streams_rejected_total: streams refused by admission control
+
+Estimates count string lengths plus fixed overheads; they track what a
+stream adds, not the exact RSS.
+
+With TRACEMALLOC_FRAMES > 0, tracemalloc runs from startup and
+GET /api/profiles/memory (see app.api.profiles) returns the allocations
+that grew since the previous call.
+"""
+import logging
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from app.utils.context_cache import SessionContext
+from app.utils.metrics import chat_stream_memory, chat_stream_rejections, metrics
+
+logger = logging.getLogger(__name__)
+
+# Generator frame, relay, response and SSE formatting of one stream, in bytes
+STREAM_OVERHEAD = 64 * 1024
+
+# Allocations made by tracemalloc and the import system are noise in a diff
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def context_bytes(context: SessionContext) -> int:
+    """Bytes a stream holds for its prompt: the cached context plus the files message copy."""
+    return context.size + len(context.files_block or "")
+
+
+class StreamMemory:
+    """Estimated bytes one chat stream holds until it ends."""
+
+    __slots__ = ("_budget", "bytes", "peak", "released")
+
+    def __init__(self, budget: "StreamMemoryBudget"):
+        self._budget = budget
+        self.bytes = 0
+        self.peak = 0
+        self.released = False
+
+    def grow(self, size: int) -> None:
+        if self.released:
+            return
+        self.bytes += size
+        self.peak = max(self.peak, self.bytes)
+        self._budget.in_flight_bytes += size
+
+    def release(self) -> None:
+        """Return the stream's bytes to the budget. Idempotent."""
+        if self.released:
+            return
+        self.released = True
+        self._budget.streams -= 1
+        self._budget.in_flight_bytes -= self.bytes
+        chat_stream_memory.observe(self.peak)
+
+
+class StreamMemoryBudget:
+    """Admission control for chat streams against a per-worker memory budget.
+
+    Only the event loop thread admits, grows and releases streams.
+    """
+
+    def __init__(self):
+        self.streams = 0
+        self.in_flight_bytes = 0
+
+    def admit(self, limit_bytes: int) -> Optional[StreamMemory]:
+        """Reserve a new stream, or None while the budget is used up (limit 0: no limit)."""
+        if limit_bytes > 0 and self.streams and self.in_flight_bytes + STREAM_OVERHEAD > limit_bytes:
+            chat_stream_rejections.inc()
+            logger.warning(
+                f"Refusing chat stream: {self.streams} streams hold ~{self.in_flight_bytes} bytes",
+                extra={"streams": self.streams, "in_flight_bytes": self.in_flight_bytes}
+            )
+            return None
+        self.streams += 1
+        memory = StreamMemory(self)
+        memory.grow(STREAM_OVERHEAD)
+        return memory
+
+
+class MemorySnapshots:
+    """tracemalloc snapshots diffed against the previous one."""
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int) -> None:
+        """Start tracing allocations and take the first baseline."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._take()
+
+    def stop(self) -> None:
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        self._baseline, self._baseline_at = snapshot, time.time()
+        return snapshot
+
+    def diff(self, limit: int = 25, group_by: str = "lineno") -> Dict[str, Any]:
+        """Largest allocation changes since the previous call; the new snapshot becomes the baseline.
+
+        Blocking (snapshots walk every traced block); call from a worker thread.
+        """
+        with self._lock:
+            previous, previous_at = self._baseline, self._baseline_at
+            snapshot = self._take()
+        if previous is None:
+            stats = snapshot.statistics(group_by)
+        else:
+            stats = snapshot.compare_to(previous, group_by)
+        current, peak = tracemalloc.get_traced_memory()
+        entries: List[Dict[str, Any]] = []
+        for stat in stats[:limit]:
+            entries.append({
+                "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size": stat.size,
+                "size_diff": getattr(stat, "size_diff", stat.size),
+                "count": stat.count,
+                "count_diff": getattr(stat, "count_diff", stat.count),
+            })
+        return {
+            "since": previous_at,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "stats": entries,
+        }
+
+
+# Global instances
+stream_memory = StreamMemoryBudget()
+memory_snapshots = MemorySnapshots()
+
+metrics.gauge("chat_streams_in_flight", "Chat streams currently generating.", (),
+              lambda: [((), stream_memory.streams)])
+metrics.gauge("chat_streams_memory_bytes", "Estimated bytes held by chat streams currently generating.", (),
+              lambda: [((), stream_memory.in_flight_bytes)])
@@ -0,0 +1,351 @@
+"""
+Process metrics in the Prometheus text format (GET /metrics).
+
+A small registry of counters, histograms and callback gauges, kept free of
+client libraries. Recording never takes a lock: every thread updates its own
+shard of each metric (the event loop thread records nearly everything) and
+shards are only summed when /metrics is scraped. The lock is taken once per
+thread per metric, when the shard is created.
+
+Nothing is recorded per streamed chunk; a chat turn records its time to
+first token once and its duration, token rate and outcome when it ends.
+
+Exposed metrics:
+- chat_ttft_seconds, chat_stream_duration_seconds, chat_tokens_per_second
+  {provider, model}: streaming turns; the token rate uses the completion
+  tokens the provider reported (app.utils.usage), estimated from the text
+  only when it reports none
+- llm_tokens_total {provider, model, type}: prompt, completion and cached
+  tokens per LLM round, counted by the same usage records
+- chat_errors_total {provider, model, stage}: failed turns
+- tool_call_seconds {tool}: tool execution inside a chat turn
+- search_requests_total {backend, outcome}, search_backend_seconds {backend}:
+  search_internet; outcome "answer" for Tavily is the share of searches
+  served without falling back to DuckDuckGo
+- db_query_seconds {pool, statement}: cursor execution time
+- db_pool_checkout_seconds {pool}: time to get a connection, waits included
+- db_pool_timeouts_total {pool}: checkouts that gave up after pool_timeout
+- db_pool_size, db_pool_checked_out, db_pool_checked_in, db_pool_overflow
+  {pool}: read from the pools at scrape time
+- upload_extraction_seconds, upload_bytes {file_type}: file uploads
+- event_loop_lag_seconds, event_loop_blocks_total {route}: see
+  app.utils.loop_monitor
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.database import engine, pool_stats, replica_engines
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2)
+
+LabelValues = Tuple[str, ...]
+
+_setup_done = False
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base for recorded metrics: one dict of label values -> state per thread."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _snapshots(self) -> List[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        # dict.copy() runs without releasing the GIL, so it never sees a half-made update
+        return [shard.copy() for shard in shards]
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        return totals
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Observations in fixed buckets per label set, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # One slot per bucket plus +Inf, then sum
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def values(self) -> Dict[LabelValues, List[float]]:
+        totals: Dict[LabelValues, List[float]] = {}
+        for shard in self._snapshots():
+            for labels, state in shard.items():
+                total = totals.setdefault(labels, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        return totals
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        names = self.labelnames + ("le",)
+        for labels, state in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Current values, read from a callback when metrics are rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.collect():
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str],
+              collect: Callable[[], Iterable[Tuple[LabelValues, float]]]) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.warning(f"Failed to render metric {metric.name}: {e}", extra={"metric": metric.name})
+        return "\n".join(lines) + "\n"
+
+
+# Global registry
+metrics = MetricsRegistry()
+
+# Chat streaming
+chat_ttft = metrics.histogram(
+    "chat_ttft_seconds", "Time from request to the first streamed content chunk.", ("provider", "model")
+)
+chat_stream_duration = metrics.histogram(
+    "chat_stream_duration_seconds", "Duration of streamed chat turns, tool calls included.", ("provider", "model")
+)
+chat_tokens_per_second = metrics.histogram(
+    "chat_tokens_per_second", "Completion tokens per second after the first token (as reported by the provider).", ("provider", "model"),
+    buckets=RATE_BUCKETS
+)
+chat_errors = metrics.counter(
+    "chat_errors_total", "Chat turns that failed, by the stage that failed.", ("provider", "model", "stage")
+)
+llm_tokens = metrics.counter(
+    "llm_tokens_total", "Tokens used by chat LLM calls, by type (prompt includes cached).", ("provider", "model", "type")
+)
+chat_stream_memory = metrics.histogram(
+    "chat_stream_memory_bytes", "Peak estimated bytes held by one chat stream.",
+    buckets=BYTES_BUCKETS + (50 * 1024 ** 2, 100 * 1024 ** 2)
+)
+chat_stream_rejections = metrics.counter(
+    "chat_streams_rejected_total", "Chat streams refused because the worker's stream memory budget was used up."
+)
+
+# Tools
+tool_calls = metrics.histogram("tool_call_seconds", "Tool execution time inside chat turns.", ("tool",))
+search_requests = metrics.counter(
+    "search_requests_total", "search_internet backend requests by outcome.", ("backend", "outcome")
+)
+search_backend_latency = metrics.histogram(
+    "search_backend_seconds", "search_internet backend request time.", ("backend",)
+)
+
+# Database
+db_queries = metrics.histogram("db_query_seconds", "Cursor execution time.", ("pool", "statement"))
+db_pool_checkouts = metrics.histogram(
+    "db_pool_checkout_seconds", "Time to get a pooled connection, waiting included.", ("pool",)
+)
+db_pool_timeouts = metrics.counter(
+    "db_pool_timeouts_total", "Connection checkouts that timed out waiting for the pool.", ("pool",)
+)
+
+# Uploads
+upload_extraction = metrics.histogram(
+    "upload_extraction_seconds", "Text extraction time for uploaded files.", ("file_type",)
+)
+upload_bytes = metrics.histogram(
+    "upload_bytes", "Size of uploaded files.", ("file_type",), buckets=BYTES_BUCKETS
+)
+
+# Event loop (app.utils.loop_monitor)
+event_loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up a sleeping task.",
+    buckets=(0.001, 0.0025) + LATENCY_BUCKETS
+)
+event_loop_blocks = metrics.counter(
+    "event_loop_blocks_total", "Times the event loop was blocked past the threshold, by route.", ("route",)
+)
+
+
+def _pool_gauge(field: str) -> Callable[[], Iterable[Tuple[LabelValues, float]]]:
+    def collect():
+        return [((name, ), stats[field]) for name, stats in pool_stats().items()]
+    return collect
+
+
+for _field in ("size", "checked_out", "checked_in", "overflow"):
+    metrics.gauge(f"db_pool_{_field}", f"Connection pool {_field.replace('_', ' ')} connections.", ("pool",),
+                  _pool_gauge(_field))
+
+
+def _statement_kind(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return word if word in ("select", "insert", "update", "delete", "with") else "other"
+
+
+def _instrument_engine(pool_name: str, db_engine) -> None:
+    """Time cursor executions and pool checkouts of one engine."""
+
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if starts:
+            db_queries.observe(time.perf_counter() - starts.pop(), pool_name, _statement_kind(statement))
+
+    @event.listens_for(db_engine, "handle_error")
+    def _failed(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    # Pools have no "before checkout" event; every Session and engine.begin()
+    # gets its connection from engine.connect(), so time that
+    connect = db_engine.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        except PoolTimeoutError:
+            db_pool_timeouts.inc(pool_name)
+            raise
+        finally:
+            db_pool_checkouts.observe(time.perf_counter() - start, pool_name)
+
+    db_engine.connect = timed_connect
+
+
+def setup_metrics() -> None:
+    """Instrument the primary and replica engines. Idempotent."""
+    global _setup_done
+    if _setup_done:
+        return
+    _setup_done = True
+    _instrument_engine("primary", engine)
+    for i, replica in enumerate(replica_engines):
+        _instrument_engine(f"replica-{i}", replica)
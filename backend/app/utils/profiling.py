@@ -0,0 +1,260 @@
+"""
+On-demand sampling profiles of single requests.
+
+A request carrying the profiling token, either as an `X-Profile-Token`
+header or a `profile` query parameter, is profiled from its first byte to
+the end of its response body, streamed bodies included. The response gets
+an `X-Profile-Id` header. The profile is written once the response ends and
+is served by GET /api/profiles/{id} (see app.api.profiles):
+- folded: collapsed stacks, one "frame;frame;frame count" line per stack,
+  for flamegraph.pl, speedscope or inferno
+- pstats: a marshal file for `python -m pstats` or snakeviz; call counts
+  are sample counts
+- json: request, duration and sample count
+
+A sampler thread reads the event loop thread's stack every
+PROFILING_INTERVAL_MS and keeps it only while the loop is running a task of
+the profiled request. Concurrent requests are therefore left out, and so is
+work the request hands to worker threads, which shows up as time the
+request spends waiting.
+
+Each write deletes all but the newest PROFILING_KEEP profiles.
+
+Profiling is off unless PROFILING_TOKEN is set. Requests without the token
+cost one settings check. At most PROFILING_MAX_PER_MINUTE profiles are
+taken per worker; beyond that the request gets 429.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from pathlib import Path
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.utils.loop_monitor import install_task_tagging, request_scope, route_name, tag_request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_QUERY_PARAM = "profile"
+
+# Downloading a profile with the token does not profile the download
+PROFILES_PATH = "/api/profiles/"
+
+PROFILE_FORMATS = {"folded": "text/plain; charset=utf-8", "pstats": "application/octet-stream", "json": "application/json"}
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# (filename, first line, function name), the key pstats uses for a function
+FrameKey = Tuple[str, int, str]
+
+
+def token_matches(candidate: Optional[str]) -> bool:
+    """Whether a token grants profiling (always False while PROFILING_TOKEN is unset)."""
+    if not settings.PROFILING_TOKEN or not candidate:
+        return False
+    return hmac.compare_digest(candidate.encode(), settings.PROFILING_TOKEN.encode())
+
+
+def profile_path(profile_id: str, fmt: str) -> Optional[Path]:
+    """Path of a stored profile in the given format, None for malformed ids."""
+    if not PROFILE_ID_PATTERN.match(profile_id) or fmt not in PROFILE_FORMATS:
+        return None
+    return Path(settings.PROFILING_DIR) / f"{profile_id}.{fmt}"
+
+
+class _RateLimiter:
+    """At most `limit` acquisitions per sliding minute."""
+
+    def __init__(self):
+        self._taken: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, limit: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._taken and now - self._taken[0] >= 60:
+                self._taken.popleft()
+            if len(self._taken) >= limit:
+                return False
+            self._taken.append(now)
+            return True
+
+
+_rate_limiter = _RateLimiter()
+
+
+def prune_profiles(directory: Path, keep: int) -> int:
+    """Delete all but the `keep` newest profiles (every format) in directory; returns how many went."""
+    newest: Dict[str, float] = {}
+    files: Dict[str, list] = {}
+    for path in directory.iterdir():
+        if path.suffix[1:] not in PROFILE_FORMATS or not PROFILE_ID_PATTERN.match(path.stem):
+            continue
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            # Pruned by another worker
+            continue
+        newest[path.stem] = max(newest.get(path.stem, 0.0), mtime)
+        files.setdefault(path.stem, []).append(path)
+
+    expired = sorted(newest, key=newest.__getitem__, reverse=True)[keep:]
+    for profile_id in expired:
+        for path in files[profile_id]:
+            path.unlink(missing_ok=True)
+    return len(expired)
+
+
+def pstats_table(samples: Counter, interval: float) -> dict:
+    """pstats' {function: (cc, nc, tt, ct, callers)} table built from sampled stacks."""
+    table: Dict[FrameKey, list] = {}
+    callers: Dict[FrameKey, Dict[FrameKey, list]] = {}
+    for stack, count in samples.items():
+        seconds = count * interval
+        for func in set(stack):
+            entry = table.setdefault(func, [0, 0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += count
+            entry[3] += seconds
+        table[stack[-1]][2] += seconds
+        for caller, callee in zip(stack, stack[1:]):
+            edge = callers.setdefault(callee, {}).setdefault(caller, [0, 0, 0.0, 0.0])
+            edge[0] += count
+            edge[1] += count
+            edge[3] += seconds
+    return {
+        func: (cc, nc, tt, ct, {caller: tuple(edge) for caller, edge in callers.get(func, {}).items()})
+        for func, (cc, nc, tt, ct) in table.items()
+    }
+
+
+class RequestProfiler:
+    """Samples the event loop thread while it runs tasks of one request."""
+
+    def __init__(self, scope: dict, loop: asyncio.AbstractEventLoop, interval: float):
+        self.id = uuid.uuid4().hex
+        self.scope = scope
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.started = time.time()
+        self.duration = 0.0
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id[:8]}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        while not self._stopping.wait(self.interval):
+            task = asyncio.current_task(self._loop)
+            if request_scope(task) is not self.scope:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+        self.duration = time.perf_counter() - start
+        try:
+            self._write()
+        except OSError as e:
+            logger.error(f"Failed to write profile {self.id}: {e}", extra={"profile_id": self.id})
+
+    def stop(self) -> None:
+        """Stop sampling and write the profile (blocking; call from a worker thread)."""
+        self._stopping.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        lines = []
+        for stack, count in self.samples.most_common():
+            frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def _write(self) -> None:
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{self.id}.folded").write_text(self.folded())
+        (directory / f"{self.id}.pstats").write_bytes(marshal.dumps(pstats_table(self.samples, self.interval)))
+        # Metadata last: its presence marks the profile complete
+        (directory / f"{self.id}.json").write_text(json.dumps({
+            "id": self.id,
+            "route": route_name(self.scope),
+            "path": self.scope.get("path"),
+            "started_at": self.started,
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.samples.values()),
+        }))
+        logger.info("Wrote profile %s for %s", self.id, route_name(self.scope), extra={"profile_id": self.id})
+        prune_profiles(directory, settings.PROFILING_KEEP)
+
+
+def _requested_token(scope: Scope) -> Optional[str]:
+    token = Headers(scope=scope).get(PROFILE_HEADER)
+    if token is None and scope.get("query_string"):
+        values = parse_qs(scope["query_string"].decode("latin-1")).get(PROFILE_QUERY_PARAM)
+        token = values[0] if values else None
+    return token
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that present the profiling token."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.PROFILING_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        token = _requested_token(scope)
+        if token is None or scope["path"].startswith(PROFILES_PATH):
+            await self.app(scope, receive, send)
+            return
+
+        if not token_matches(token):
+            await JSONResponse({"detail": "Invalid profiling token"}, status_code=403)(scope, receive, send)
+            return
+        if not _rate_limiter.acquire(settings.PROFILING_MAX_PER_MINUTE):
+            response = JSONResponse({"detail": "Profiling rate limit exceeded"}, status_code=429, headers={"Retry-After": "60"})
+            await response(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        install_task_tagging(loop)
+        tag_request(scope)
+        profiler = RequestProfiler(scope, loop, settings.PROFILING_INTERVAL_MS / 1000)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profiler.id)
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await asyncio.to_thread(profiler.stop)
@@ -0,0 +1,298 @@
+"""
+Cross-worker publish/subscribe.
+
+Several uvicorn workers serve the API, and anything held in process memory
+(the context cache, live stream state) is local to one of them. This module
+gives them a small message bus:
+
+- PostgresPubSub: LISTEN/NOTIFY on the application database. One dedicated
+  connection per worker listens on a background thread; another publishes.
+- InMemoryPubSub: same interface within one process, for tests and
+  single-worker deployments.
+
+Messages are JSON objects delivered on the event loop to listener callbacks
+or Subscription queues. Publishes from one worker go through a single outbox
+task, so they are delivered in the order they were made. NOTIFY payloads are
+limited to 8000 bytes, so callers keep messages small (MAX_TEXT_PER_MESSAGE).
+"""
+import abc
+import asyncio
+import json
+import logging
+import select
+import threading
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Global channel for small, infrequent control messages
+EVENTS_CHANNEL = "floatplane_events"
+
+# Text per message that stays well below the NOTIFY limit once JSON-encoded
+MAX_TEXT_PER_MESSAGE = 1500
+
+# Identifies this worker in published messages
+WORKER_ID = uuid.uuid4().hex
+
+Listener = Callable[[Dict[str, Any]], None]
+
+
+def session_channel(session_id) -> str:
+    """Per-session channel name (a valid Postgres identifier)."""
+    return f"floatplane_session_{uuid.UUID(str(session_id)).hex}"
+
+
+class Subscription:
+    """Queue-backed subscription to one channel."""
+
+    def __init__(self, pubsub: "PubSub", channel: str):
+        self.pubsub = pubsub
+        self.channel = channel
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    async def get(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait for the next message (raises asyncio.TimeoutError on timeout)."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self) -> None:
+        """Stop receiving messages."""
+        self.pubsub.remove_listener(self.channel, self.queue.put_nowait)
+
+
+class PubSub(abc.ABC):
+    """Listener bookkeeping, ordered outbox and dispatch shared by all backends."""
+
+    def __init__(self):
+        self._listeners: Dict[str, List[Listener]] = defaultdict(list)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: Optional["asyncio.Queue[Tuple[str, Dict[str, Any], Optional[asyncio.Future]]]"] = None
+        self._outbox_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Bind to the running event loop and start the outbox."""
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+        self._outbox_task = self._loop.create_task(self._drain_outbox())
+
+    async def stop(self) -> None:
+        """Flush and stop the outbox."""
+        if self._outbox_task is not None:
+            await self._outbox.join()
+            self._outbox_task.cancel()
+            self._outbox_task = None
+            self._outbox = None
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        """Publish a message and wait until it has been sent."""
+        if self._outbox is None:
+            await self._send(channel, message)
+            return
+        done = asyncio.get_running_loop().create_future()
+        self._outbox.put_nowait((channel, message, done))
+        await done
+
+    def publish_nowait(self, channel: str, message: Dict[str, Any]) -> None:
+        """
+        Queue a message from code that can't await; keeps publish order.
+
+        Safe from worker threads (revision hooks run in threadpool code):
+        the outbox belongs to the event loop, so other threads hand the
+        message over with call_soon_threadsafe.
+        """
+        outbox = self._outbox
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if outbox is not None:
+            if running is self._loop:
+                outbox.put_nowait((channel, message, None))
+                return
+            try:
+                self._loop.call_soon_threadsafe(outbox.put_nowait, (channel, message, None))
+            except RuntimeError as e:
+                # The loop closed while this thread was finishing up
+                logger.warning(f"Pub/sub publish on {channel} dropped: {e}")
+            return
+        if running is not None:
+            running.create_task(self._send(channel, message))
+            return
+        # Not started (scripts, shutdown): nothing reaches other workers, deliver locally
+        self._dispatch(channel, json.loads(json.dumps(message)))
+
+    def add_listener(self, channel: str, callback: Listener) -> None:
+        """Call callback(message) on the event loop for every message on channel."""
+        first = not self._listeners[channel]
+        self._listeners[channel].append(callback)
+        if first:
+            self._on_first_listener(channel)
+
+    def remove_listener(self, channel: str, callback: Listener) -> None:
+        """Undo add_listener."""
+        listeners = self._listeners.get(channel)
+        if not listeners or callback not in listeners:
+            return
+        listeners.remove(callback)
+        if not listeners:
+            del self._listeners[channel]
+            self._on_last_listener(channel)
+
+    def subscribe(self, channel: str) -> Subscription:
+        """Receive channel messages through a queue."""
+        subscription = Subscription(self, channel)
+        self.add_listener(channel, subscription.queue.put_nowait)
+        return subscription
+
+    @abc.abstractmethod
+    async def _send(self, channel: str, message: Dict[str, Any]) -> None:
+        """Deliver one message through the backend."""
+
+    async def _drain_outbox(self) -> None:
+        while True:
+            channel, message, done = await self._outbox.get()
+            try:
+                await self._send(channel, message)
+                if done is not None and not done.done():
+                    done.set_result(None)
+            except Exception as e:
+                logger.warning(f"Pub/sub publish on {channel} failed: {e}")
+                if done is not None and not done.done():
+                    done.set_exception(e)
+            finally:
+                self._outbox.task_done()
+
+    def _dispatch(self, channel: str, message: Dict[str, Any]) -> None:
+        for callback in list(self._listeners.get(channel, ())):
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"Pub/sub listener failed on {channel}: {e}", exc_info=True)
+
+    def _on_first_listener(self, channel: str) -> None:
+        """Hook for backends that subscribe per channel."""
+
+    def _on_last_listener(self, channel: str) -> None:
+        """Hook for backends that subscribe per channel."""
+
+
+class InMemoryPubSub(PubSub):
+    """Single-process backend: messages go straight to local listeners."""
+
+    async def _send(self, channel: str, message: Dict[str, Any]) -> None:
+        # Round-trip through JSON so listeners see exactly what Postgres would deliver
+        self._dispatch(channel, json.loads(json.dumps(message)))
+
+
+class PostgresPubSub(PubSub):
+    """
+    LISTEN/NOTIFY backend on the application database.
+
+    If the database can't be reached at startup, the worker logs an error and
+    falls back to local-only delivery instead of failing to boot.
+    """
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        # psycopg2 wants a plain libpq URI, without the SQLAlchemy driver suffix
+        self.dsn = dsn.replace("postgresql+psycopg2://", "postgresql://")
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._commands: List[str] = []
+        self._commands_lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    async def start(self) -> None:
+        import psycopg2
+
+        await super().start()
+        try:
+            self._listen_conn = psycopg2.connect(self.dsn)
+            self._listen_conn.autocommit = True
+            self._publish_conn = psycopg2.connect(self.dsn)
+            self._publish_conn.autocommit = True
+        except Exception as e:
+            logger.error(f"Pub/sub could not connect to Postgres, using local-only delivery: {e}")
+            self._listen_conn = self._publish_conn = None
+            return
+
+        with self._commands_lock:
+            self._commands.extend(f'LISTEN "{channel}"' for channel in self._listeners)
+        self._running = True
+        self._thread = threading.Thread(target=self._listen_loop, name="pubsub-listener", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        await super().stop()
+        self._running = False
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 2)
+            self._thread = None
+        for conn in (self._listen_conn, self._publish_conn):
+            if conn is not None:
+                conn.close()
+        self._listen_conn = self._publish_conn = None
+
+    async def _send(self, channel: str, message: Dict[str, Any]) -> None:
+        if self._publish_conn is None:
+            self._dispatch(channel, json.loads(json.dumps(message)))
+            return
+        await asyncio.to_thread(self._notify, channel, json.dumps(message))
+
+    def _notify(self, channel: str, payload: str) -> None:
+        with self._publish_lock:
+            with self._publish_conn.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+    def _on_first_listener(self, channel: str) -> None:
+        with self._commands_lock:
+            self._commands.append(f'LISTEN "{channel}"')
+
+    def _on_last_listener(self, channel: str) -> None:
+        with self._commands_lock:
+            self._commands.append(f'UNLISTEN "{channel}"')
+
+    def _listen_loop(self) -> None:
+        """Background thread: apply LISTEN changes and forward notifications to the loop."""
+        conn = self._listen_conn
+        while self._running:
+            with self._commands_lock:
+                commands, self._commands = self._commands, []
+            try:
+                if commands:
+                    with conn.cursor() as cursor:
+                        for command in commands:
+                            cursor.execute(command)
+                if select.select([conn], [], [], 0.1) == ([], [], []):
+                    continue
+                conn.poll()
+            except Exception as e:
+                logger.error(f"Pub/sub listener connection failed: {e}", exc_info=True)
+                self._running = False
+                break
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    message = json.loads(notify.payload)
+                except ValueError:
+                    continue
+                self._loop.call_soon_threadsafe(self._dispatch, notify.channel, message)
+
+
+def create_pubsub() -> PubSub:
+    """Pick the backend from PUBSUB_BACKEND ("auto" uses Postgres when the database is Postgres)."""
+    backend = settings.PUBSUB_BACKEND
+    if backend == "auto":
+        backend = "postgres" if settings.DATABASE_URL.startswith("postgresql") else "memory"
+    if backend == "postgres":
+        return PostgresPubSub(settings.DATABASE_URL)
+    return InMemoryPubSub()
+
+
+# Global pub/sub instance (started in the application lifespan)
+pubsub = create_pubsub()
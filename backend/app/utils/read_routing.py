@@ -0,0 +1,118 @@
+"""
+Read-replica routing for GET endpoints.
+
+When DATABASE_REPLICA_URLS is set, the session list, session, message and
+file reads are served by a replica (round-robin) instead of the primary, so
+history reads don't compete with chat-turn writes.
+
+Replicas lag behind the primary, so reads fall back to the primary when they
+could observe stale data:
+- a session written in the last READ_YOUR_WRITES_SECONDS (on any worker;
+  writes are shared over pub/sub)
+- a session with a response still streaming
+- the session list, while any session was written in that window
+- a replica that can't be reached
+
+Without replicas every read uses the primary session from get_db.
+"""
+import itertools
+import logging
+import time
+from typing import Dict, Generator, Optional
+from uuid import UUID
+
+from fastapi import Depends, Request
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session as DBSession
+
+from app.config import settings
+from app.database import ReplicaSessionLocals, get_db
+from app.utils.pubsub import pubsub, EVENTS_CHANNEL, WORKER_ID
+from app.utils.revisions import add_revision_hook
+from app.utils.stream_relay import active_streams
+
+logger = logging.getLogger(__name__)
+
+# session_id -> monotonic time of its last known write
+_recent_writes: Dict[str, float] = {}
+_last_write = 0.0
+_next_replica = itertools.count()
+_setup_done = False
+
+# Prune _recent_writes when it grows past this many entries
+_PRUNE_THRESHOLD = 1000
+
+
+def _record_write(session_id: str) -> None:
+    global _last_write
+    now = time.monotonic()
+    _recent_writes[session_id] = now
+    _last_write = now
+    if len(_recent_writes) > _PRUNE_THRESHOLD:
+        cutoff = now - settings.READ_YOUR_WRITES_SECONDS
+        # Copied at once: revision hooks also record writes from worker threads
+        for stale in [key for key, written in list(_recent_writes.items()) if written < cutoff]:
+            _recent_writes.pop(stale, None)
+
+
+def note_write(session_id: UUID) -> None:
+    """Record a write to a session here and on the other workers."""
+    if not ReplicaSessionLocals:
+        return
+    _record_write(str(session_id))
+    pubsub.publish_nowait(EVENTS_CHANNEL, {
+        "type": "write", "session_id": str(session_id), "origin": WORKER_ID
+    })
+
+
+def use_primary(session_id: Optional[str]) -> bool:
+    """Whether a read must go to the primary to see its own writes."""
+    window = settings.READ_YOUR_WRITES_SECONDS
+    now = time.monotonic()
+    if session_id is None:
+        return now - _last_write < window
+    if session_id in active_streams:
+        return True
+    written = _recent_writes.get(session_id)
+    return written is not None and now - written < window
+
+
+def get_read_db(request: Request, db: DBSession = Depends(get_db)) -> Generator[DBSession, None, None]:
+    """
+    Dependency for read-only endpoints: a replica session when it is safe, else the primary.
+
+    The primary session comes from get_db (it only connects if used), so
+    dependency overrides of get_db apply here too.
+    """
+    session_id = request.path_params.get("session_id")
+    if not ReplicaSessionLocals or use_primary(str(session_id) if session_id else None):
+        yield db
+        return
+
+    index = next(_next_replica) % len(ReplicaSessionLocals)
+    replica_db = ReplicaSessionLocals[index]()
+    try:
+        try:
+            replica_db.connection()  # Check out now (pool_pre_ping) so a dead replica falls back
+        except OperationalError as e:
+            logger.warning(f"Replica {index} unavailable, reading from primary: {e}")
+            yield db
+            return
+        yield replica_db
+    finally:
+        replica_db.close()
+
+
+def _on_event(message: Dict) -> None:
+    if message.get("type") == "write" and message.get("origin") != WORKER_ID:
+        _record_write(message["session_id"])
+
+
+def setup_read_routing() -> None:
+    """Track writes from revision bumps and other workers (idempotent)."""
+    global _setup_done
+    if _setup_done:
+        return
+    add_revision_hook(note_write)
+    pubsub.add_listener(EVENTS_CHANNEL, _on_event)
+    _setup_done = True
@@ -0,0 +1,227 @@
+"""
+Background removal of deleted sessions and orphaned storage.
+
+DELETE /api/sessions/{id} only marks the session deleted (sessions.deleted_at)
+and returns. Reaping does the expensive part afterwards:
+
+- reap_session: gives clones their own copy of inherited history, deletes
+  messages in batches (one transaction each, so a long history never holds
+  locks for long), removes uploads and the archive blob, then deletes the
+  file, archive and session rows.
+- reap_tombstones: reaps every tombstone left behind, e.g. when the worker
+  died before its post-response reap ran. Tombstones younger than
+  REAPER_GRACE_SECONDS are left to the reap their DELETE scheduled.
+
+Each reaping transaction starts by locking the tombstone row
+(SELECT ... FOR UPDATE SKIP LOCKED), so a post-DELETE reap and the sweep of
+another worker never work on the same session at once: whoever finds the
+row locked moves on. SQLite has no row locks and ignores the clause.
+
+- reconcile_orphans: compares the storage tree with files.file_path and
+  session_archives.blob_path and removes blobs no row points at (failed
+  uploads, clones that crashed half-way, restored archives). Only session
+  directories (named by UUID) and archives/ are considered, and only blobs
+  older than ORPHAN_GRACE_SECONDS, so uploads still being committed are safe.
+
+run_maintenance runs the last two periodically from the application lifespan.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+from uuid import UUID
+
+from sqlalchemy.orm import Session as DBSession
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.session import Session
+from app.models.message import Message
+from app.models.file import File
+from app.models.archive import SessionArchive
+from app.utils.lineage import detach_children
+from app.utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVES_DIR = "archives"
+
+
+def _claim(db: DBSession, session_id: UUID) -> Optional[Session]:
+    """Lock the tombstone for the current transaction; None when it is gone or another reaper holds it."""
+    return db.query(Session).filter(
+        Session.id == session_id, Session.deleted_at.isnot(None)
+    ).with_for_update(skip_locked=True).first()
+
+
+def reap_session(db: DBSession, session_id: UUID, batch_size: int = 1000) -> int:
+    """
+    Remove a tombstoned session and everything it owns, committing as it goes.
+
+    Every transaction re-claims the tombstone first and the reap stops
+    where another reaper holds it.
+
+    Returns:
+        Number of messages deleted
+    """
+    if _claim(db, session_id) is None:
+        return 0
+
+    # Clones keep reading this session's messages until they have their own copy
+    detach_children(db, session_id)
+    db.commit()
+
+    deleted = 0
+    while True:
+        if _claim(db, session_id) is None:
+            return deleted
+        ids = [row.id for row in db.query(Message.id).filter(Message.session_id == session_id).limit(batch_size)]
+        if not ids:
+            break
+        db.query(Message).filter(Message.session_id == session_id, Message.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+
+    # Still locked by the claim that found no messages left
+    try:
+        storage.delete_session_files(session_id)
+        storage.delete_archive(session_id)
+    except Exception as e:
+        # Anything left behind is picked up by reconcile_orphans
+        logger.warning(f"Failed to delete physical files for session {session_id}: {e}", extra={"session_id": str(session_id)})
+
+    db.query(File).filter(File.session_id == session_id).delete(synchronize_session=False)
+    db.query(SessionArchive).filter(SessionArchive.session_id == session_id).delete(synchronize_session=False)
+    db.query(Session).filter(Session.id == session_id).delete(synchronize_session=False)
+    db.commit()
+
+    logger.info("Reaped session %s (%d messages)", session_id, deleted, extra={"session_id": str(session_id)})
+    return deleted
+
+
+def reap_session_by_id(session_id: UUID) -> None:
+    """
+    Background job: reap one session right after its DELETE returns.
+
+    Uses its own database session since it runs after the response is sent.
+    """
+    reap_sessions_by_ids([session_id])
+
+
+def reap_sessions_by_ids(session_ids: List[UUID]) -> None:
+    """Background job: reap sessions deleted together (batch delete) with one database session."""
+    with SessionLocal() as db:
+        for session_id in session_ids:
+            try:
+                reap_session(db, session_id, settings.REAPER_BATCH_SIZE)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to reap session {session_id}: {e}", exc_info=True, extra={"session_id": str(session_id)})
+
+
+def reap_tombstones(limit: int = 100, grace_seconds: float = 60) -> int:
+    """
+    Reap up to `limit` tombstoned sessions older than `grace_seconds`, oldest first.
+
+    Tombstones another reaper is working on are skipped.
+
+    Returns:
+        Number of sessions reaped
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    reaped = 0
+    with SessionLocal() as db:
+        candidates = [
+            row.id for row in db.query(Session.id).filter(Session.deleted_at.isnot(None), Session.deleted_at <= cutoff)
+            .order_by(Session.deleted_at).limit(limit).with_for_update(skip_locked=True)
+        ]
+        # Each reap re-claims its tombstone; these locks only kept busy ones out of the list
+        db.rollback()
+        for session_id in candidates:
+            try:
+                # Taken by another reaper since the list was read: not ours to count
+                if _claim(db, session_id) is None:
+                    db.rollback()
+                    continue
+                reap_session(db, session_id, settings.REAPER_BATCH_SIZE)
+                reaped += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to reap session {session_id}: {e}", exc_info=True, extra={"session_id": str(session_id)})
+    return reaped
+
+
+def _is_session_dir(name: str) -> bool:
+    try:
+        UUID(name)
+    except ValueError:
+        return False
+    return True
+
+
+def reconcile_orphans(grace_seconds: float = 3600) -> int:
+    """
+    Delete stored blobs that no files or session_archives row refers to.
+
+    Returns:
+        Number of blobs deleted
+    """
+    if not storage.base_path.is_dir():
+        return 0
+    directories = [
+        entry.name for entry in storage.base_path.iterdir()
+        if entry.is_dir() and (entry.name == ARCHIVES_DIR or _is_session_dir(entry.name))
+    ]
+    cutoff = time.time() - grace_seconds
+
+    removed = 0
+    with SessionLocal() as db:
+        for directory in directories:
+            # Old enough to be an orphan; anything newer may belong to an upload in flight
+            stale = [path for path, mtime in storage.iter_blobs(directory) if mtime < cutoff]
+            if not stale:
+                continue
+
+            if directory == ARCHIVES_DIR:
+                known: Set[str] = {
+                    row.blob_path for row in db.query(SessionArchive.blob_path).filter(SessionArchive.blob_path.in_(stale))
+                }
+            else:
+                known = {
+                    row.file_path for row in db.query(File.file_path).filter(
+                        File.session_id == UUID(directory), File.file_path.in_(stale)
+                    )
+                }
+
+            for path in stale:
+                if path in known:
+                    continue
+                try:
+                    storage.delete_file(path)
+                    removed += 1
+                    logger.info("Removed orphaned blob %s", path, extra={"file_path": path})
+                except Exception as e:
+                    logger.warning(f"Failed to remove orphaned blob {path}: {e}", extra={"file_path": path})
+
+            if directory != ARCHIVES_DIR:
+                storage.remove_empty_dir(directory)
+    return removed
+
+
+async def run_maintenance() -> None:
+    """Reap tombstones every REAPER_INTERVAL_SECONDS and reconcile storage every ORPHAN_RECONCILE_INTERVAL_SECONDS."""
+    last_reconcile = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.REAPER_INTERVAL_SECONDS)
+        try:
+            reaped = await asyncio.to_thread(reap_tombstones, grace_seconds=settings.REAPER_GRACE_SECONDS)
+            if reaped:
+                logger.info("Reaped %d deleted sessions", reaped)
+            if time.monotonic() - last_reconcile >= settings.ORPHAN_RECONCILE_INTERVAL_SECONDS:
+                last_reconcile = time.monotonic()
+                removed = await asyncio.to_thread(reconcile_orphans, settings.ORPHAN_GRACE_SECONDS)
+                if removed:
+                    logger.info("Removed %d orphaned blobs", removed)
+        except Exception as e:
+            logger.error(f"Background maintenance failed: {e}", exc_info=True)
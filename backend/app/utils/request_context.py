@@ -0,0 +1,68 @@
+"""
+Request and session ids for log records.
+
+RequestContextMiddleware gives each HTTP request an id, either the caller's
+X-Request-ID (so ids can be followed across services) or a new one, and
+echoes it in the response. Endpoints working on one session call
+bind_session() so every record they log, including records from the
+streamed body and threadpool work, carries the session id.
+app.logging_config adds both ids to each record.
+"""
+import re
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+from uuid import UUID
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Caller-supplied ids are kept only when they look like ids
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_session_id: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def current_session_id() -> Optional[str]:
+    return _session_id.get()
+
+
+def bind_session(session_id: UUID) -> None:
+    """Tag the rest of the current request with the session it works on."""
+    _session_id.set(str(session_id))
+
+
+class RequestContextMiddleware:
+    """ASGI middleware assigning request ids and returning them as X-Request-ID."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        if request_id is None or not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request_token = _request_id.set(request_id)
+        session_token = _session_id.set(None)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _session_id.reset(session_token)
+            _request_id.reset(request_token)
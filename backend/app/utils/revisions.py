@@ -0,0 +1,115 @@
+"""
+Per-session revision counter.
+
+Every write to a session, its messages or its files bumps sessions.revision in the
+same transaction. Caches and other derived state compare revisions instead of
+re-reading the rows to find out whether they are stale.
+
+The revision also versions HTTP responses: session, message and file reads
+send a strong ETag built from it and answer a matching If-None-Match with 304
+after reading only the revision, without loading or serializing any rows.
+"""
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional
+from uuid import UUID
+
+from fastapi import Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session as DBSession
+
+from app.models.session import Session
+
+logger = logging.getLogger(__name__)
+
+# Callbacks run with the session id on every bump (see add_revision_hook)
+_revision_hooks: List[Callable[[UUID], None]] = []
+
+
+def add_revision_hook(hook: Callable[[UUID], None]) -> None:
+    """Register a callback run whenever a session's revision is bumped."""
+    _revision_hooks.append(hook)
+
+
+def bump_revision(db: DBSession, session_id: UUID) -> int:
+    """
+    Atomically increment a session's revision. Does not commit.
+
+    updated_at is left alone: the bump records a content change, not
+    activity, so it must not reorder the session list.
+
+    Returns:
+        The new revision
+    """
+    db.query(Session).filter(Session.id == session_id).update(
+        {Session.revision: Session.revision + 1, Session.updated_at: Session.updated_at},
+        synchronize_session=False
+    )
+    _run_hooks(session_id)
+    return db.query(Session.revision).filter(Session.id == session_id).scalar()
+
+
+def bump_revisions(db: DBSession, session_ids: List[UUID]) -> None:
+    """Increment the revision of many sessions in one UPDATE. Does not commit."""
+    if not session_ids:
+        return
+    db.query(Session).filter(Session.id.in_(session_ids)).update(
+        {Session.revision: Session.revision + 1, Session.updated_at: Session.updated_at},
+        synchronize_session=False
+    )
+    for session_id in session_ids:
+        _run_hooks(session_id)
+
+
+def _run_hooks(session_id: UUID) -> None:
+    for hook in _revision_hooks:
+        try:
+            hook(session_id)
+        except Exception as e:
+            logger.warning(f"Revision hook failed: {e}", extra={"session_id": str(session_id)})
+
+
+def get_revision(db: DBSession, session_id: UUID) -> Optional[int]:
+    """A session's current revision, or None if it doesn't exist or is deleted. Loads no other columns."""
+    row = db.query(Session.revision).filter(Session.id == session_id, Session.deleted_at.is_(None)).first()
+    return row.revision if row else None
+
+
+def session_etag(kind: str, session_id: UUID, revision: int) -> str:
+    """Strong ETag for one representation (kind) of a session at a revision."""
+    return f'"{kind}-{session_id.hex}-{revision}"'
+
+
+def list_etag(db: DBSession, query_string: str) -> str:
+    """
+    Strong ETag for the session list.
+
+    Derived from one aggregate over sessions: any create, delete or revision
+    bump changes the count, the newest updated_at or the revision sum. The
+    query string is folded in so each page/filter gets its own tag.
+    """
+    count, newest, revisions = db.query(
+        func.count(Session.id), func.max(Session.updated_at), func.coalesce(func.sum(Session.revision), 0)
+    ).filter(Session.deleted_at.is_(None)).one()
+    state = f"{count}:{newest.isoformat() if newest else ''}:{revisions}:{query_string}"
+    return f'"sessions-{hashlib.blake2b(state.encode(), digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison, per RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """Headers letting clients keep a copy but revalidate it on every use."""
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the ETag and cache headers."""
+    return Response(status_code=304, headers=cache_headers(etag))
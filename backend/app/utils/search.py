@@ -0,0 +1,199 @@
+"""
+Full-text search over session titles and message history.
+
+PostgreSQL: messages.search_vector is a tsvector computed from the content
+on insert (content itself is stored compressed, so it can't be indexed
+directly) and sessions are matched through an expression index on
+to_tsvector(title). Both have GIN indexes; results are ranked with ts_rank.
+
+SQLite (tests, local development): the same queries run against FTS5
+tables kept in sync by triggers and are ranked with bm25.
+
+Matches of both kinds are merged into one list ordered by rank, paged by
+keyset on (rank, id). Ranks are double precision on both databases (ts_rank
+returns real, which would not compare equal to the cursor's float). Only the
+SEARCH_MAX_CANDIDATES best-ranked matches of each kind (ties broken by id)
+are merged and paged, which bounds the merge and sort for very common
+terms; every match is still ranked once per page request. Snippets are
+cut from the decompressed text of the returned page only, with the offsets
+of words matching the query. Archived sessions match by title only.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Float, and_, cast, column, desc, func, literal, literal_column, or_, select, table, union_all
+from sqlalchemy.orm import Session as DBSession
+
+from app.config import settings
+from app.database import SEARCH_CONFIG, to_search_vector
+from app.models.session import Session
+from app.models.message import Message
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Words websearch_to_tsquery treats as operators
+_OPERATORS = {"or", "and", "not"}
+
+sessions_fts = table("sessions_fts", column("rowid"))
+messages_fts = table("messages_fts", column("rowid"))
+
+
+def query_terms(q: str) -> List[str]:
+    """Words of a search query, lowercased, without operators."""
+    return [word.lower() for word in _WORD.findall(q) if word.lower() not in _OPERATORS]
+
+
+def _postgres_branches(q: str):
+    tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), q)
+    title_vector = to_search_vector(Session.title)
+
+    sessions = select(
+        literal("session").label("kind"),
+        Session.id.label("id"),
+        Session.id.label("session_id"),
+        cast(func.ts_rank(title_vector, tsquery), Float(precision=53)).label("rank"),
+    ).where(title_vector.op("@@")(tsquery), Session.deleted_at.is_(None))
+
+    messages = select(
+        literal("message").label("kind"),
+        Message.id.label("id"),
+        Message.session_id.label("session_id"),
+        cast(func.ts_rank(Message.search_vector, tsquery), Float(precision=53)).label("rank"),
+    ).join(Session, Session.id == Message.session_id).where(
+        Message.search_vector.op("@@")(tsquery), Session.deleted_at.is_(None)
+    )
+    return sessions, messages
+
+
+def _sqlite_branches(q: str):
+    # Every word must match; quoting keeps FTS5 syntax out of user input
+    fts_query = " ".join(f'"{term}"' for term in query_terms(q))
+
+    sessions = select(
+        literal("session").label("kind"),
+        Session.id.label("id"),
+        Session.id.label("session_id"),
+        (-func.bm25(literal_column("sessions_fts"))).label("rank"),
+    ).select_from(sessions_fts).join(Session, literal_column("sessions.rowid") == sessions_fts.c.rowid).where(
+        literal_column("sessions_fts").op("MATCH")(fts_query), Session.deleted_at.is_(None)
+    )
+
+    messages = select(
+        literal("message").label("kind"),
+        Message.id.label("id"),
+        Message.session_id.label("session_id"),
+        (-func.bm25(literal_column("messages_fts"))).label("rank"),
+    ).select_from(messages_fts).join(Message, literal_column("messages.rowid") == messages_fts.c.rowid).join(
+        Session, Session.id == Message.session_id
+    ).where(
+        literal_column("messages_fts").op("MATCH")(fts_query), Session.deleted_at.is_(None)
+    )
+    return sessions, messages
+
+
+def search(
+    db: DBSession,
+    q: str,
+    limit: int,
+    after: Optional[Tuple[float, UUID]] = None,
+    session_id: Optional[UUID] = None
+) -> List[Any]:
+    """
+    One page of ranked matches as (kind, id, session_id, rank) rows, best first.
+
+    Fetches limit + 1 rows so callers can tell whether another page exists.
+    """
+    if not query_terms(q):
+        return []
+
+    build = _postgres_branches if db.get_bind().dialect.name == "postgresql" else _sqlite_branches
+    sessions, messages = build(q)
+    if session_id is not None:
+        sessions = sessions.where(Session.id == session_id)
+        messages = messages.where(Message.session_id == session_id)
+    candidates = union_all(*(
+        branch.order_by(desc(branch.selected_columns.rank), desc(branch.selected_columns.id))
+        .limit(settings.SEARCH_MAX_CANDIDATES).subquery().select()
+        for branch in (sessions, messages)
+    )).subquery()
+
+    query = select(candidates)
+    if after is not None:
+        rank, row_id = after
+        query = query.where(or_(
+            candidates.c.rank < rank,
+            and_(candidates.c.rank == rank, candidates.c.id < row_id)
+        ))
+    query = query.order_by(desc(candidates.c.rank), desc(candidates.c.id)).limit(limit + 1)
+    return db.execute(query).all()
+
+
+def snippet(text: str, terms: List[str], length: int) -> Tuple[str, List[List[int]]]:
+    """
+    A window of text around the first word matching a query term.
+
+    Words match a term when they share its first characters, which
+    approximates stemming (e.g. "indexes" for "indexing").
+
+    Returns:
+        (snippet, [[start, end], ...] offsets of matching words in the snippet)
+    """
+    stems = sorted({term[:max(3, len(term) - 3)] for term in terms}, key=len, reverse=True)
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(stem) for stem in stems) + r")\w*", re.IGNORECASE)
+
+    first = pattern.search(text)
+    start = 0
+    if first is not None and first.start() > length // 3:
+        start = first.start() - length // 3
+        # Start at a word boundary
+        space = text.rfind(" ", 0, start + 1)
+        start = space + 1 if space >= 0 and start - space < 20 else start
+    window = text[start:start + length]
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + length < len(text) else ""
+
+    highlights = [[m.start() + len(prefix), m.end() + len(prefix)] for m in pattern.finditer(window)]
+    return prefix + window + suffix, highlights
+
+
+def describe(db: DBSession, rows: List[Any], q: str) -> List[Dict[str, Any]]:
+    """Result dicts (SearchResult fields) for a page of search() rows, with snippets."""
+    terms = query_terms(q)
+    session_ids = {row.session_id for row in rows}
+    message_ids = [row.id for row in rows if row.kind == "message"]
+
+    sessions = {
+        row.id: row for row in db.query(Session.id, Session.title, Session.updated_at).filter(Session.id.in_(session_ids))
+    } if session_ids else {}
+    messages = {
+        row.id: row for row in db.query(Message.id, Message.role, Message.content, Message.created_at).filter(
+            Message.session_id.in_(session_ids), Message.id.in_(message_ids)
+        )
+    } if message_ids else {}
+
+    results = []
+    for row in rows:
+        session = sessions.get(row.session_id)
+        if session is None:
+            continue
+        result = {
+            "type": row.kind,
+            "session_id": row.session_id,
+            "session_title": session.title,
+            "message_id": None,
+            "role": None,
+            "created_at": session.updated_at,
+            "rank": row.rank,
+        }
+        if row.kind == "message":
+            message = messages.get(row.id)
+            if message is None:
+                continue
+            text = message.content
+            result.update(message_id=message.id, role=message.role, created_at=message.created_at)
+        else:
+            text = session.title
+        result["snippet"], result["highlights"] = snippet(text, terms, settings.SEARCH_SNIPPET_CHARS)
+        results.append(result)
+    return results
@@ -0,0 +1,46 @@
+"""
+Fast JSON serialization for list endpoints.
+
+Large lists spend more time in per-row Pydantic validation and the default
+JSON encoder than in the database. These helpers encode projected row tuples
+straight to JSON with orjson (which handles UUID and datetime natively).
+Endpoints keep their response_model, so the OpenAPI schema is unchanged; the
+returned Response simply bypasses validation.
+"""
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from fastapi.responses import ORJSONResponse
+
+from app.models.session import Session
+from app.models.message import Message
+
+
+# Columns matching SessionResponse
+SESSION_RESPONSE_COLUMNS = (
+    Session.id,
+    Session.title,
+    Session.llm_provider,
+    Session.llm_model,
+    Session.created_at,
+    Session.updated_at,
+)
+
+# Columns matching MessageResponse
+MESSAGE_RESPONSE_COLUMNS = (
+    Message.id,
+    Message.session_id,
+    Message.role,
+    Message.content,
+    Message.created_at,
+    Message.message_metadata,
+)
+
+
+def rows_to_dicts(rows: Iterable[Any]) -> list[Dict[str, Any]]:
+    """Convert projected SQLAlchemy rows to plain dicts keyed by column name."""
+    return [row._asdict() for row in rows]
+
+
+def json_response(content: Any, headers: Optional[Mapping[str, str]] = None) -> ORJSONResponse:
+    """Encode content with orjson, skipping response_model validation."""
+    return ORJSONResponse(content=content, headers=dict(headers) if headers else None)
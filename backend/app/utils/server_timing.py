@@ -0,0 +1,146 @@
+"""
+Per-request latency breakdown in the Server-Timing response header.
+
+ServerTimingMiddleware gives each HTTP request a RequestTimings in a
+ContextVar (threadpool endpoints and background work see the same object),
+and the instrumented code adds time to it:
+- db: SQLAlchemy cursor executions
+- extract: text extraction of uploads
+- storage: reads and writes of stored blobs (timed decorator)
+
+When the response starts the middleware adds, for example:
+
+    Server-Timing: db;dur=3.1, extract;dur=12.4, storage;dur=0.8, total;dur=18.9
+
+Streaming responses start before the body is produced, so their header
+covers the work done up to that point; stream_chat reports the rest of the
+turn in its `timing` SSE event.
+"""
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.database import engine, replica_engines
+
+# Metrics reported in the header, in this order (omitted while zero)
+HEADER_METRICS = ("db", "extract", "storage")
+
+_setup_done = False
+
+
+class RequestTimings:
+    """Accumulated seconds per metric for one request."""
+
+    __slots__ = ("started", "durations")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        """Seconds since the request arrived."""
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        parts = [
+            f"{name};dur={self.durations[name] * 1000:.1f}" for name in HEADER_METRICS if self.durations.get(name)
+        ]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the request being handled, if any."""
+    return _current.get()
+
+
+def record(name: str, seconds: float) -> None:
+    """Add time to a metric of the current request (no-op outside requests)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator adding each call's duration to a metric of the current request."""
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware collecting RequestTimings and sending them as Server-Timing."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+
+
+def _instrument_engine(db_engine) -> None:
+    """Add cursor execution time to the current request's db metric."""
+
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("timing_start", []).append(time.perf_counter())
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("timing_start")
+        if starts:
+            record("db", time.perf_counter() - starts.pop())
+
+    @event.listens_for(db_engine, "handle_error")
+    def _failed(context):
+        starts = context.connection.info.get("timing_start") if context.connection is not None else None
+        if starts:
+            record("db", time.perf_counter() - starts.pop())
+
+
+def setup_server_timing() -> None:
+    """Time database queries of the primary and replica engines. Idempotent."""
+    global _setup_done
+    if _setup_done:
+        return
+    _setup_done = True
+    _instrument_engine(engine)
+    for replica in replica_engines:
+        _instrument_engine(replica)
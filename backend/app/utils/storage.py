@@ -3,8 +3,12 @@ Local file storage utility.
 """
 import os
 from pathlib import Path
+from typing import Iterator, Tuple
 from uuid import UUID
 
+from app.utils.server_timing import timed
+from app.utils.tracing import traced
+
 
 class LocalStorage:
     """Handle local file storage operations."""
@@ -19,6 +23,8 @@ class LocalStorage:
         session_dir.mkdir(parents=True, exist_ok=True)
         return session_dir
 
+    @traced("storage.save_file")
+    @timed("storage")
     def save_file(self, session_id: UUID, file_id: UUID, filename: str, content: bytes) -> str:
         """
         Save file to local storage.
@@ -37,17 +43,71 @@ class LocalStorage:
         # Return relative path
         return str(file_path.relative_to(self.base_path))
 
+    @traced("storage.read_file")
+    @timed("storage")
     def read_file(self, relative_path: str) -> bytes:
         """Read file from storage."""
         file_path = self.base_path / relative_path
         return file_path.read_bytes()
 
+    @traced("storage.delete_file")
+    @timed("storage")
     def delete_file(self, relative_path: str) -> None:
         """Delete file from storage."""
         file_path = self.base_path / relative_path
         if file_path.exists():
             file_path.unlink()
 
+    def archive_path(self, session_id: UUID) -> str:
+        """Relative path of a session's cold-storage blob."""
+        return f"archives/{session_id}.ndjson.zst"
+
+    @traced("storage.save_archive")
+    @timed("storage")
+    def save_archive(self, session_id: UUID, content: bytes) -> str:
+        """
+        Write a session's archive blob (atomically replacing any previous one).
+
+        Returns: blob path relative to base_path
+        """
+        relative_path = self.archive_path(session_id)
+        file_path = self.base_path / relative_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_suffix(".tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, file_path)
+        return relative_path
+
+    @traced("storage.delete_archive")
+    @timed("storage")
+    def delete_archive(self, session_id: UUID) -> None:
+        """Delete a session's archive blob if present."""
+        self.delete_file(self.archive_path(session_id))
+
+    def iter_blobs(self, directory: str) -> Iterator[Tuple[str, float]]:
+        """
+        Files under a top-level directory of storage, with their mtimes.
+
+        Yields: (path relative to base_path, modification time) pairs
+        """
+        root = self.base_path / directory
+        if not root.is_dir():
+            return
+        for file_path in root.rglob("*"):
+            if file_path.is_file():
+                yield str(file_path.relative_to(self.base_path)), file_path.stat().st_mtime
+
+    def remove_empty_dir(self, directory: str) -> bool:
+        """Remove a top-level directory of storage if it is empty. Returns whether it was removed."""
+        dir_path = self.base_path / directory
+        try:
+            dir_path.rmdir()
+        except OSError:
+            return False
+        return True
+
+    @traced("storage.delete_session_files")
+    @timed("storage")
     def delete_session_files(self, session_id: UUID) -> None:
         """Delete all files for a session."""
         session_dir = self.get_session_dir(session_id)
@@ -0,0 +1,236 @@
+"""
+Live stream fan-out across workers.
+
+A chat turn streams from whichever worker received POST /api/chat/stream.
+A second tab on the same session may be served by another worker, so the
+generating worker announces the stream on the pub/sub events channel and
+relays its events on a per-session channel once someone attaches.
+
+Protocol on the session channel:
+- attach {request_id}: a watcher joined. The generator answers with the
+  content produced so far as snapshot parts tagged with request_id and the
+  sequence number they cover, then starts relaying events.
+- event {seq, event, data}: an SSE event from the generator. Watchers drop
+  events already covered by their snapshot.
+
+Relaying costs nothing until the first watcher attaches.
+
+Every worker keeps active_streams from stream_started / stream_ended on the
+events channel. The generating worker repeats stream_started every
+STREAM_HEARTBEAT_SECONDS, so workers that started after the stream learn
+about it, and entries whose worker died (no stream_ended) expire after
+STREAM_HEARTBEAT_MISSES missed heartbeats.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from app.config import settings
+from app.utils.pubsub import pubsub, EVENTS_CHANNEL, MAX_TEXT_PER_MESSAGE, WORKER_ID, session_channel
+from app.utils.context_cache import context_cache
+
+logger = logging.getLogger(__name__)
+
+_setup_done = False
+
+
+class ActiveStreams:
+    """Sessions with a stream generating on any worker, kept alive by heartbeats."""
+
+    def __init__(self):
+        # session_id -> (worker id, monotonic time of the last heartbeat)
+        self._streams: Dict[str, Tuple[str, float]] = {}
+
+    def _expired(self, seen: float, now: float) -> bool:
+        return now - seen > settings.STREAM_HEARTBEAT_SECONDS * settings.STREAM_HEARTBEAT_MISSES
+
+    def mark(self, session_id: str, origin: Optional[str]) -> None:
+        """Record a start or heartbeat, dropping entries whose worker went quiet."""
+        now = time.monotonic()
+        for stale in [key for key, (_, seen) in self._streams.items() if self._expired(seen, now)]:
+            del self._streams[stale]
+        self._streams[session_id] = (origin, now)
+
+    def discard(self, session_id: str) -> None:
+        self._streams.pop(session_id, None)
+
+    def __contains__(self, session_id: object) -> bool:
+        entry = self._streams.get(session_id)
+        if entry is None:
+            return False
+        if self._expired(entry[1], time.monotonic()):
+            del self._streams[session_id]
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+
+# Streams currently generating anywhere
+active_streams = ActiveStreams()
+
+
+def _split(text: str) -> List[str]:
+    """Split text into pieces that fit in one pub/sub message."""
+    return [text[i:i + MAX_TEXT_PER_MESSAGE] for i in range(0, len(text), MAX_TEXT_PER_MESSAGE)] or [""]
+
+
+def sse(event: str, data: Any) -> str:
+    """Format one SSE event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StreamRelay:
+    """Publishes one generating stream so watchers on any worker can attach."""
+
+    def __init__(self, session_id: UUID):
+        self.session_id = str(session_id)
+        self.channel = session_channel(session_id)
+        self.chunks: List[str] = []
+        self.seq = 0
+        self.watched = False
+        self.finished = False
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def _started_message(self) -> Dict[str, Any]:
+        return {"type": "stream_started", "session_id": self.session_id, "origin": WORKER_ID}
+
+    async def start(self) -> None:
+        """Announce the stream, keep announcing it and start answering attach requests."""
+        pubsub.add_listener(self.channel, self._on_message)
+        await pubsub.publish(EVENTS_CHANNEL, self._started_message())
+        self._heartbeat = asyncio.get_running_loop().create_task(self._send_heartbeats())
+
+    async def _send_heartbeats(self) -> None:
+        while True:
+            await asyncio.sleep(settings.STREAM_HEARTBEAT_SECONDS)
+            pubsub.publish_nowait(EVENTS_CHANNEL, self._started_message())
+
+    def content_delta(self, chunk: str) -> None:
+        """Record a streamed chunk; relayed only when someone is watching."""
+        self.chunks.append(chunk)
+        self.seq += 1
+        if self.watched:
+            for part in _split(chunk):
+                pubsub.publish_nowait(self.channel, {
+                    "type": "event", "seq": self.seq, "event": "content_delta", "data": {"chunk": part}
+                })
+
+    def content(self, start: int = 0) -> str:
+        """Text of the chunks recorded so far, from chunk `start` on."""
+        return "".join(self.chunks[start:])
+
+    async def finish(self, event: str, data: Dict[str, Any]) -> str:
+        """Relay the final event, announce the end of the stream and return the event as SSE."""
+        self.finished = True
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        pubsub.remove_listener(self.channel, self._on_message)
+        try:
+            if self.watched:
+                self.seq += 1
+                await pubsub.publish(self.channel, {"type": "event", "seq": self.seq, "event": event, "data": data})
+            await pubsub.publish(EVENTS_CHANNEL, {
+                "type": "stream_ended", "session_id": self.session_id, "origin": WORKER_ID
+            })
+        except Exception as e:
+            logger.warning(f"Failed to publish end of stream: {e}", extra={"session_id": self.session_id})
+        return sse(event, data)
+
+    def _on_message(self, message: Dict[str, Any]) -> None:
+        if message.get("type") != "attach":
+            return
+        self.watched = True
+        parts = _split(self.content())
+        for index, part in enumerate(parts):
+            pubsub.publish_nowait(self.channel, {
+                "type": "snapshot",
+                "request_id": message.get("request_id"),
+                "seq": self.seq,
+                "part": index,
+                "parts": len(parts),
+                "content": part
+            })
+
+
+async def attach_stream(session_id: UUID) -> AsyncGenerator[str, None]:
+    """
+    SSE events of a stream generating on any worker, starting with its content so far.
+
+    Ends after the stream's done/error event, or when nothing arrives for
+    STREAM_ATTACH_IDLE_TIMEOUT seconds.
+    """
+    subscription = pubsub.subscribe(session_channel(session_id))
+    request_id = uuid.uuid4().hex
+    snapshot_parts: List[str] = []
+    snapshot_seq = None
+    pending: List[Dict[str, Any]] = []
+
+    try:
+        await pubsub.publish(session_channel(session_id), {"type": "attach", "request_id": request_id})
+        while True:
+            try:
+                message = await subscription.get(timeout=settings.STREAM_ATTACH_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return
+
+            if message.get("type") == "snapshot":
+                if snapshot_seq is not None or message.get("request_id") != request_id:
+                    continue
+                snapshot_parts.append(message["content"])
+                if message["part"] < message["parts"] - 1:
+                    continue
+                snapshot_seq = message["seq"]
+                content = "".join(snapshot_parts)
+                if content:
+                    yield sse("content_delta", {"chunk": content})
+                events, pending = pending, []
+            elif message.get("type") == "event":
+                if snapshot_seq is None:
+                    pending.append(message)
+                    continue
+                events = [message]
+            else:
+                continue
+
+            for event in events:
+                if event["seq"] <= snapshot_seq:
+                    continue
+                yield sse(event["event"], event["data"])
+                if event["event"] in ("done", "error"):
+                    return
+    finally:
+        subscription.close()
+
+
+def _on_event(message: Dict[str, Any]) -> None:
+    """Track active streams and apply invalidations from other workers."""
+    kind = message.get("type")
+    session_id = message.get("session_id")
+    if kind == "stream_started":
+        active_streams.mark(session_id, message.get("origin"))
+    elif kind == "stream_ended":
+        active_streams.discard(session_id)
+    elif kind == "invalidate" and message.get("origin") != WORKER_ID:
+        context_cache.invalidate(UUID(session_id), broadcast=False)
+
+
+def _broadcast_invalidation(session_id: UUID) -> None:
+    pubsub.publish_nowait(EVENTS_CHANNEL, {
+        "type": "invalidate", "session_id": str(session_id), "origin": WORKER_ID
+    })
+
+
+def setup_stream_relay() -> None:
+    """Register the events-channel listener and the context cache bridge (idempotent)."""
+    global _setup_done
+    if _setup_done:
+        return
+    pubsub.add_listener(EVENTS_CHANNEL, _on_event)
+    context_cache.add_invalidation_hook(_broadcast_invalidation)
+    _setup_done = True
@@ -3,6 +3,8 @@ Text extraction utilities for different file types.
 """
 import fitz  # PyMuPDF
 
+from app.utils.tracing import traced
+
 
 MAX_CHARS = 100_000  # 100K characters per file
 
@@ -90,6 +92,7 @@ def extract_text_from_md(file_content: bytes) -> str:
     return extract_text_from_txt(file_content)
 
 
+@traced("extract_text")
 def extract_text(file_content: bytes, file_type: str) -> str:
     """
     Extract text from file based on type.
@@ -0,0 +1,510 @@
+"""
+Lightweight request tracing with OpenTelemetry-shaped spans.
+
+A trace is a tree of timed spans. TracingMiddleware opens a server span per
+HTTP request (continuing a W3C `traceparent` header when the caller sends
+one) and the code underneath adds children:
+
+    with tracer.start_span("chat.load_context", {"session.id": ...}) as span:
+        ...
+
+    @traced("search_internet")
+    def search_internet(...): ...
+
+The current span lives in a ContextVar, so it follows asyncio tasks and
+threadpool calls; tracer.bind() carries it explicitly into background tasks
+that run after the response is sent. SQLAlchemy cursor executions become
+`db.query` spans under whatever span is current.
+
+Sampling is decided once per trace (TRACING_SAMPLE_RATE, or the caller's
+sampled flag) and inherited by every child. Spans of unsampled traces are a
+shared no-op object, so tracing costs a ContextVar lookup per span when a
+trace is not sampled and an attribute check when tracing is disabled.
+
+Finished spans are written by JsonLinesExporter, on a writer thread, to
+TRACING_EXPORT_PATH in the OTLP/JSON file format (one
+ExportTraceServiceRequest per line), which the OpenTelemetry collector's
+otlpjsonfile receiver reads as is.
+"""
+import asyncio
+import functools
+import logging
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import orjson
+from sqlalchemy import event
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database import engine, replica_engines
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+SERVICE_NAME = "floatplane-zero-agent"
+
+# Longest SQL statement kept on a db.query span
+MAX_STATEMENT_CHARS = 500
+
+_setup_done = False
+
+
+class SpanContext(NamedTuple):
+    """Identity of a span, as carried by traceparent."""
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """SpanContext from a W3C traceparent header, or None if absent or malformed."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation in a sampled trace. Use as a context manager to make it current."""
+
+    __slots__ = ("name", "context", "parent_id", "local_root", "kind", "attributes", "events",
+                 "start_ns", "end_ns", "status", "status_message", "_tracer", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, context: SpanContext, parent_id: Optional[str],
+                 local_root: bool, kind: int, attributes: Optional[Dict[str, Any]]):
+        self._tracer = tracer
+        self._token = None
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        # First span of this trace in this process: finishing it flushes the exporter
+        self.local_root = local_root
+        self.kind = kind
+        self.attributes = dict(attributes) if attributes else {}
+        self.events: List[tuple] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = 0
+        self.status_message = ""
+
+    def is_recording(self) -> bool:
+        return self.end_ns is None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append((time.time_ns(), name, attributes or {}))
+
+    def set_status(self, code: int, message: str = "") -> None:
+        self.status = code
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.set_status(STATUS_ERROR, f"{type(exc).__name__}: {exc}")
+        self.add_event("exception", {"exception.type": type(exc).__name__, "exception.message": str(exc)})
+
+    def end(self) -> None:
+        """Finish the span and hand it to the exporter (only the first call counts)."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self._tracer.export(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None and not isinstance(exc, (GeneratorExit, asyncio.CancelledError)):
+            self.record_exception(exc)
+        self.end()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited from another context (an async generator closed elsewhere)
+            pass
+
+
+class _NonRecordingSpan:
+    """Stands in for spans that are not recorded; unsampled roots carry their context to children."""
+
+    __slots__ = ("context", "_token")
+
+    def __init__(self, context: Optional[SpanContext] = None):
+        self.context = context
+        self._token = None
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+    def set_status(self, code: int, message: str = "") -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self):
+        if self.context is not None:
+            self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                pass
+
+
+# Returned for every span when tracing is off and for children of unsampled traces
+NOOP_SPAN = _NonRecordingSpan()
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def span_to_otlp(span: Span) -> Dict[str, Any]:
+    """OTLP/JSON representation of a finished span."""
+    record = {
+        "traceId": span.context.trace_id,
+        "spanId": span.context.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": span.status, "message": span.status_message} if span.status else {},
+    }
+    if span.parent_id:
+        record["parentSpanId"] = span.parent_id
+    if span.events:
+        record["events"] = [
+            {"timeUnixNano": str(ts), "name": name, "attributes": _attributes(attrs)} for ts, name, attrs in span.events
+        ]
+    return record
+
+
+class JsonLinesExporter:
+    """
+    Appends finished spans to a file, one OTLP ExportTraceServiceRequest per line.
+
+    Spans are buffered and handed to a writer thread when a trace's local
+    root ends or `batch_size` spans have accumulated, so a request costs one
+    write and the event loop never waits on the disk.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256):
+        self.path = path
+        self.batch_size = batch_size
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        # Batches for the writer thread; None stops it
+        self._batches: "queue.Queue[Optional[List[Span]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, span: Span, is_root: bool) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            if not is_root and len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+            self._start_writer()
+        self._batches.put(batch)
+
+    def _start_writer(self) -> None:
+        # Called with self._lock held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._batches.get()
+            try:
+                if batch is None:
+                    return
+                self._write([span_to_otlp(span) for span in batch])
+            except Exception as e:
+                logger.error("Failed to export %d spans: %s", len(batch), e, exc_info=True)
+            finally:
+                self._batches.task_done()
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "app"}, "spans": spans}],
+        }]}
+        try:
+            with open(self.path, "ab") as f:
+                f.write(orjson.dumps(request) + b"\n")
+        except OSError as e:
+            logger.warning(f"Failed to write {len(spans)} spans: {e}", extra={"path": self.path})
+
+    def flush(self) -> None:
+        """Hand over buffered spans and wait until everything queued is written (blocking)."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            if batch:
+                self._start_writer()
+        if batch:
+            self._batches.put(batch)
+        self._batches.join()
+
+    def close(self) -> None:
+        """Flush and stop the writer thread."""
+        self.flush()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._batches.put(None)
+            thread.join()
+
+
+class Tracer:
+    """Creates spans and decides sampling. Disabled until configure() is called."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.exporter: Optional[JsonLinesExporter] = None
+
+    def configure(self, enabled: bool, sample_rate: float = 1.0, exporter: Optional[JsonLinesExporter] = None) -> None:
+        if self.exporter is not None and self.exporter is not exporter:
+            self.exporter.close()
+        self.enabled = enabled and exporter is not None
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def current_span(self):
+        return _current.get() or NOOP_SPAN
+
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        kind: int = KIND_INTERNAL,
+        parent: Optional[SpanContext] = None
+    ):
+        """
+        A new span, child of `parent` or else of the current span.
+
+        Not current until entered with `with`; call end() when not using `with`.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        current = _current.get()
+        local_root = parent is not None or current is None
+        if parent is None and current is not None:
+            parent = current.context
+        if parent is None:
+            context = SpanContext(_new_id(128), _new_id(64), random.random() < self.sample_rate)
+        else:
+            context = SpanContext(parent.trace_id, _new_id(64), parent.sampled)
+        if not context.sampled:
+            # Only the local root needs to carry the decision down
+            return _NonRecordingSpan(context) if local_root else NOOP_SPAN
+        return Span(self, name, context, parent.span_id if parent else None, local_root, kind, attributes)
+
+    def export(self, span: Span) -> None:
+        exporter = self.exporter
+        if exporter is None:
+            return
+        try:
+            exporter.export(span, span.local_root)
+        except Exception as e:
+            logger.warning(f"Failed to export span {span.name}: {e}")
+
+    def bind(self, func: Callable, name: Optional[str] = None) -> Callable:
+        """
+        Wrap a background job so it runs in its own span under the current trace.
+
+        The trace context is captured now and applied when the job runs,
+        whichever task or thread that happens in.
+        """
+        current = _current.get()
+        parent = current.context if self.enabled and current is not None else None
+        if parent is None or not parent.sampled:
+            return func
+        span_name = name or f"background.{func.__name__}"
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def run_async(*args, **kwargs):
+                with self.start_span(span_name, parent=parent):
+                    return await func(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            with self.start_span(span_name, parent=parent):
+                return func(*args, **kwargs)
+        return run
+
+
+# Global tracer instance
+tracer = Tracer()
+
+
+def traced(name: Optional[str] = None, kind: int = KIND_INTERNAL) -> Callable[[Callable], Callable]:
+    """Decorator running each call of a function (sync or async) in a span."""
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with tracer.start_span(span_name, kind=kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.start_span(span_name, kind=kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per HTTP request, streamed body included."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        span = tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            {"http.method": scope["method"], "http.target": scope["path"]},
+            kind=KIND_SERVER,
+            parent=parent
+        )
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.set_status(STATUS_ERROR)
+            await send(message)
+
+        with span:
+            await self.app(scope, receive, send_wrapper)
+
+
+def _instrument_engine(db_engine) -> None:
+    """Record cursor executions as db.query spans under the current span."""
+    dialect = db_engine.dialect.name
+
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # Queries outside any request or job (e.g. startup) would each start a trace
+        if not tracer.enabled or _current.get() is None:
+            return
+        span = tracer.start_span("db.query", {"db.system": dialect, "db.statement": statement[:MAX_STATEMENT_CHARS]},
+                                 kind=KIND_CLIENT)
+        if span.is_recording():
+            conn.info.setdefault("trace_spans", []).append(span)
+
+    def _finish(conn, exc: Optional[BaseException] = None) -> None:
+        spans = conn.info.get("trace_spans")
+        if spans:
+            span = spans.pop()
+            if exc is not None:
+                span.record_exception(exc)
+            span.end()
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn)
+
+    @event.listens_for(db_engine, "handle_error")
+    def _failed(context):
+        if context.connection is not None:
+            _finish(context.connection, context.original_exception)
+
+
+def setup_tracing() -> None:
+    """Configure the tracer from settings and instrument the database engines. Idempotent."""
+    global _setup_done
+    if _setup_done or not settings.TRACING_ENABLED:
+        return
+    _setup_done = True
+    tracer.configure(True, settings.TRACING_SAMPLE_RATE, JsonLinesExporter(settings.TRACING_EXPORT_PATH))
+    _instrument_engine(engine)
+    for replica in replica_engines:
+        _instrument_engine(replica)
+
+
+def shutdown_tracing() -> None:
+    """Write out buffered spans and stop the writer thread."""
+    if tracer.exporter is not None:
+        tracer.exporter.close()
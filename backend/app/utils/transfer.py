@@ -0,0 +1,332 @@
+"""
+Session export and import as NDJSON.
+
+Export streams one JSON object per line, a header first and then each
+session followed by its messages and files:
+    {"type": "header", "version": 1, "exported_at": ...}
+    {"type": "session", "id", "title", "llm_provider", "llm_model", "created_at", "updated_at"}
+    {"type": "message", "id", "session_id", "role", "content", "created_at", "message_metadata"}
+    {"type": "file", "id", "session_id", "filename", "file_path", "file_type", "file_size",
+     "created_at", "extracted_text", "content" (base64, only with include_blobs)}
+
+Memory stays constant however much is exported: sessions are read in keyset
+pages and messages through server-side cursors (yield_per). Every session is
+self-contained, like an archive blob: a clone's inherited history is written
+as its own messages (with new ids) and lineage pointers are dropped, so any
+subset of sessions can be imported anywhere. Archived sessions are read from
+their blob and imported back into the hot tables.
+
+Import inserts rows in multi-row batches and commits whole sessions only,
+so re-running a failed import is safe: sessions that already exist are
+skipped along with their messages and files. Without blobs, files keep
+their storage path, which lines up when uploads/ is copied separately.
+"""
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+from uuid import UUID
+
+import orjson
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import Session as DBSession, undefer
+
+from app.database import SessionLocal, uuid7
+from app.models.session import Session
+from app.models.message import Message
+from app.models.file import File
+from app.utils.archive import read_archive
+from app.utils.lineage import history_query
+from app.utils.read_routing import note_write
+from app.utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_VERSION = 1
+
+# Sessions per keyset page and messages per server-side cursor fetch
+EXPORT_PAGE_SIZE = 500
+EXPORT_YIELD_PER = 1000
+
+# Rows buffered before an import batch is written (flushed at session boundaries)
+IMPORT_BATCH_SIZE = 1000
+
+# Longest import line accepted (a file record embeds its upload, base64-encoded)
+IMPORT_MAX_LINE_BYTES = 64 * 1024 * 1024
+
+
+class TransferFormatError(ValueError):
+    """Malformed import stream; the message names the offending line."""
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _session_record(session: Session) -> Dict[str, Any]:
+    return {
+        "type": "session",
+        "id": str(session.id),
+        "title": session.title,
+        "llm_provider": session.llm_provider,
+        "llm_model": session.llm_model,
+        "created_at": _iso(session.created_at),
+        "updated_at": _iso(session.updated_at),
+    }
+
+
+def _session_contents(db: DBSession, session: Session, include_blobs: bool) -> Iterator[Dict[str, Any]]:
+    """Message and file records of one session."""
+    archived_text: Dict[str, Optional[str]] = {}
+    if session.archived_at is not None:
+        for record in read_archive(session.id):
+            if record["type"] == "message":
+                yield {**record, "session_id": str(session.id)}
+            elif record["type"] == "file":
+                archived_text[record["id"]] = record["extracted_text"]
+    else:
+        rows = history_query(
+            db, session,
+            Message.id, Message.session_id, Message.role, Message.content, Message.created_at, Message.message_metadata
+        ).yield_per(EXPORT_YIELD_PER)
+        for row in rows:
+            yield {
+                "type": "message",
+                "id": str(row.id if row.session_id == session.id else uuid7()),
+                "session_id": str(session.id),
+                "role": row.role,
+                "content": row.content,
+                "created_at": _iso(row.created_at),
+                "message_metadata": row.message_metadata,
+            }
+
+    files = db.query(File).options(undefer(File.extracted_text)).filter(
+        File.session_id == session.id
+    ).order_by(File.created_at)
+    for file in files:
+        record = {
+            "type": "file",
+            "id": str(file.id),
+            "session_id": str(session.id),
+            "filename": file.filename,
+            "file_path": file.file_path,
+            "file_type": file.file_type,
+            "file_size": file.file_size,
+            "created_at": _iso(file.created_at),
+            "extracted_text": archived_text.get(str(file.id), file.extracted_text),
+        }
+        if include_blobs:
+            try:
+                record["content"] = base64.b64encode(storage.read_file(file.file_path)).decode("ascii")
+            except Exception as e:
+                logger.warning(f"Could not read file during export: {e}", extra={"file_path": file.file_path, "file_id": str(file.id)})
+        yield record
+
+
+def export_records(
+    db: DBSession,
+    session_ids: Optional[List[UUID]] = None,
+    updated_since: Optional[datetime] = None,
+    include_blobs: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """Records of the matching sessions, header first, in (created_at, id) order."""
+    yield {"type": "header", "version": TRANSFER_VERSION, "exported_at": _iso(datetime.utcnow())}
+
+    query = db.query(Session).filter(Session.deleted_at.is_(None))
+    if session_ids:
+        query = query.filter(Session.id.in_(session_ids))
+    if updated_since is not None:
+        query = query.filter(Session.updated_at > updated_since)
+
+    last = None
+    while True:
+        page_query = query
+        if last is not None:
+            page_query = page_query.filter(or_(
+                Session.created_at > last.created_at,
+                and_(Session.created_at == last.created_at, Session.id > last.id)
+            ))
+        page = page_query.order_by(Session.created_at, Session.id).limit(EXPORT_PAGE_SIZE).all()
+        if not page:
+            return
+        for session in page:
+            yield _session_record(session)
+            yield from _session_contents(db, session, include_blobs)
+        last = page[-1]
+        db.expunge_all()
+
+
+def export_ndjson(
+    session_ids: Optional[List[UUID]] = None,
+    updated_since: Optional[datetime] = None,
+    include_blobs: bool = False
+) -> Iterator[bytes]:
+    """
+    NDJSON body for StreamingResponse.
+
+    Uses its own database session since it is consumed after the endpoint returns.
+    """
+    with SessionLocal() as db:
+        for record in export_records(db, session_ids, updated_since, include_blobs):
+            yield orjson.dumps(record) + b"\n"
+
+
+def _timestamp(value: Optional[str]) -> datetime:
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+class SessionImporter:
+    """
+    Incremental import of an export stream: feed() lines or feed_chunk()
+    raw body chunks, then finish().
+
+    Rows are buffered and written with one multi-row INSERT per table when
+    IMPORT_BATCH_SIZE rows have accumulated and the next session starts, so
+    each commit covers whole sessions.
+    """
+
+    def __init__(self, db: DBSession):
+        self.db = db
+        self.line_number = 0
+        self.pending = bytearray()
+        self.header_seen = False
+        self.current_session: Optional[UUID] = None
+        self.sessions: List[Dict[str, Any]] = []
+        self.messages: List[Dict[str, Any]] = []
+        self.files: List[Dict[str, Any]] = []
+        self.skipped: Set[UUID] = set()
+        self.counts = {"sessions": 0, "messages": 0, "files": 0, "skipped_sessions": 0}
+
+    def feed_chunk(self, chunk: bytes) -> None:
+        """Handle a piece of the stream; a line split across chunks waits for its end."""
+        # Only the new bytes are searched, so a long line costs linear time however it is split
+        search_from = len(self.pending)
+        self.pending += chunk
+        start = 0
+        while (end := self.pending.find(b"\n", search_from)) != -1:
+            self._check_length(end - start)
+            self.feed(bytes(self.pending[start:end]))
+            start = search_from = end + 1
+        del self.pending[:start]
+        self._check_length(len(self.pending))
+
+    def _check_length(self, size: int) -> None:
+        if size > IMPORT_MAX_LINE_BYTES:
+            raise TransferFormatError(f"Line {self.line_number + 1}: longer than {IMPORT_MAX_LINE_BYTES} bytes")
+
+    def feed(self, line: bytes) -> None:
+        """Handle one NDJSON line (blank lines are ignored)."""
+        self.line_number += 1
+        if not line.strip():
+            return
+        try:
+            record = orjson.loads(line)
+            kind = record["type"]
+        except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+            raise TransferFormatError(f"Line {self.line_number}: invalid record ({e})")
+
+        if not self.header_seen:
+            if kind != "header" or record.get("version") != TRANSFER_VERSION:
+                raise TransferFormatError(f"Line {self.line_number}: expected a version {TRANSFER_VERSION} header")
+            self.header_seen = True
+            return
+
+        handlers = {"session": self._add_session, "message": self._add_message, "file": self._add_file}
+        if kind not in handlers:
+            raise TransferFormatError(f"Line {self.line_number}: unknown record type {kind!r}")
+        if kind == "session" and len(self.sessions) + len(self.messages) + len(self.files) >= IMPORT_BATCH_SIZE:
+            self.flush()
+        try:
+            handlers[kind](record)
+        except (KeyError, TypeError, ValueError) as e:
+            raise TransferFormatError(f"Line {self.line_number}: invalid {kind} record ({e})")
+
+    def _owner(self, record: Dict[str, Any]) -> UUID:
+        """Session id of a message or file record, which must follow its session."""
+        session_id = UUID(record["session_id"])
+        if session_id != self.current_session:
+            raise ValueError(f"session {session_id} is not the preceding session record")
+        return session_id
+
+    def _add_session(self, record: Dict[str, Any]) -> None:
+        self.current_session = UUID(record["id"])
+        self.sessions.append({
+            "id": UUID(record["id"]),
+            "title": record["title"],
+            "llm_provider": record["llm_provider"],
+            "llm_model": record["llm_model"],
+            "created_at": _timestamp(record.get("created_at")),
+            "updated_at": _timestamp(record.get("updated_at")),
+            "revision": 0,
+        })
+
+    def _add_message(self, record: Dict[str, Any]) -> None:
+        self.messages.append({
+            "id": UUID(record["id"]),
+            "session_id": self._owner(record),
+            "role": record["role"],
+            "content": record["content"],
+            "created_at": _timestamp(record.get("created_at")),
+            "message_metadata": record.get("message_metadata"),
+        })
+
+    def _add_file(self, record: Dict[str, Any]) -> None:
+        content = record.get("content")
+        self.files.append({
+            "id": UUID(record["id"]),
+            "session_id": self._owner(record),
+            "filename": record["filename"],
+            "file_path": record["file_path"],
+            "file_type": record["file_type"],
+            "file_size": record["file_size"],
+            "created_at": _timestamp(record.get("created_at")),
+            "extracted_text": record.get("extracted_text"),
+            # Decoded here so bad base64 is reported with its line (binascii.Error is a ValueError)
+            "content": base64.b64decode(content, validate=True) if content is not None else None,
+        })
+
+    def flush(self) -> None:
+        """Write and commit the buffered sessions with their messages and files."""
+        new_sessions = []
+        if self.sessions:
+            ids = [row["id"] for row in self.sessions]
+            existing = {row.id for row in self.db.query(Session.id).filter(Session.id.in_(ids))}
+            self.skipped |= existing
+            new_sessions = [row for row in self.sessions if row["id"] not in existing]
+            if new_sessions:
+                self.db.execute(insert(Session), new_sessions)
+            self.counts["sessions"] += len(new_sessions)
+            self.counts["skipped_sessions"] += len(existing)
+
+        messages = [row for row in self.messages if row["session_id"] not in self.skipped]
+        if messages:
+            self.db.execute(insert(Message), messages)
+        self.counts["messages"] += len(messages)
+
+        files = []
+        for row in self.files:
+            if row["session_id"] in self.skipped:
+                continue
+            content = row.pop("content")
+            if content is not None:
+                row["file_path"] = storage.save_file(row["session_id"], row["id"], row["filename"], content)
+            files.append(row)
+        if files:
+            self.db.execute(insert(File), files)
+        self.counts["files"] += len(files)
+
+        self.db.commit()
+        # Reads of the new sessions go to the primary until replicas have them
+        for row in new_sessions:
+            note_write(row["id"])
+        self.sessions, self.messages, self.files = [], [], []
+
+    def finish(self) -> Dict[str, int]:
+        """Flush the last batch and return the counts of imported and skipped rows."""
+        if self.pending:
+            self.feed(bytes(self.pending))
+            self.pending.clear()
+        if not self.header_seen:
+            raise TransferFormatError("Empty import stream")
+        self.flush()
+        return self.counts
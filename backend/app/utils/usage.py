@@ -0,0 +1,197 @@
+"""
+Token usage and cost accounting for chat turns.
+
+Every LLM round of a turn (the first completion and, when the model called
+tools, the follow-up that re-sends the whole prompt) is stored as a
+MessageUsage row for the assistant message, session, provider and model.
+The assistant message's message_metadata gets the turn's totals under
+"usage".
+
+Streams ask for the provider's usage block (stream_options.include_usage,
+which LiteLLM delivers with the last chunk for every provider);
+non-streaming responses carry it. When a provider reports nothing, tokens
+are estimated from text length and the round is marked estimated.
+
+Costs come from LiteLLM's price table, with cached prompt tokens at the
+cache-read price; models it does not know get no cost.
+
+aggregate() backs GET /api/usage: sums per time bucket, provider and model.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+import litellm
+from sqlalchemy import Integer, cast, func, literal_column
+from sqlalchemy.orm import Session as DBSession
+
+from app.models.usage import MessageUsage
+from app.utils.context_cache import estimate_tokens
+from app.utils.metrics import llm_tokens
+
+# Passed to litellm.acompletion(stream=True) so the last chunk carries usage
+STREAM_OPTIONS = {"include_usage": True}
+
+BUCKETS = ("hour", "day", "week")
+
+# SQLite: bucket start as 'YYYY-MM-DD HH:MM:SS' (weeks start on Monday)
+_SQLITE_BUCKETS = {
+    "hour": lambda column: func.strftime("%Y-%m-%d %H:00:00", column),
+    "day": lambda column: func.strftime("%Y-%m-%d 00:00:00", column),
+    "week": lambda column: func.strftime("%Y-%m-%d 00:00:00", column, "-6 days", "weekday 1"),
+}
+
+
+@dataclass
+class RoundUsage:
+    """Tokens used by one LLM round."""
+    round: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int = 0
+    estimated: bool = False
+    cost: Optional[float] = None
+
+
+def _field(source: Any, name: str) -> Any:
+    if source is None:
+        return None
+    if isinstance(source, dict):
+        return source.get(name)
+    return getattr(source, name, None)
+
+
+def read_usage(source: Any, round_number: int) -> Optional[RoundUsage]:
+    """The usage block of a response or stream chunk, None when it has none."""
+    usage = _field(source, "usage")
+    prompt_tokens = _field(usage, "prompt_tokens")
+    completion_tokens = _field(usage, "completion_tokens")
+    if not isinstance(prompt_tokens, int) or not isinstance(completion_tokens, int):
+        return None
+    # OpenAI-style details; Anthropic reports cache reads separately
+    cached_tokens = _field(_field(usage, "prompt_tokens_details"), "cached_tokens")
+    if not isinstance(cached_tokens, int):
+        cached_tokens = _field(usage, "cache_read_input_tokens")
+    return RoundUsage(round_number, prompt_tokens, completion_tokens,
+                      cached_tokens if isinstance(cached_tokens, int) else 0)
+
+
+def estimate_usage(round_number: int, messages: Sequence[Dict[str, Any]], completion: str) -> RoundUsage:
+    """Usage estimated from text length, for providers that report none."""
+    prompt_tokens = 0
+    for message in messages:
+        prompt_tokens += estimate_tokens(message.get("content") or "")
+        for tool_call in message.get("tool_calls") or ():
+            prompt_tokens += estimate_tokens(tool_call["function"]["arguments"])
+    return RoundUsage(round_number, prompt_tokens, estimate_tokens(completion) if completion else 0, estimated=True)
+
+
+def round_cost(model: str, usage: RoundUsage) -> Optional[float]:
+    """USD cost of a round, None for models without a known price."""
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cache_read_input_tokens=usage.cached_tokens
+        )
+    except Exception:
+        return None
+    return prompt_cost + completion_cost
+
+
+def record_usage(
+    db: DBSession,
+    message_id: UUID,
+    session_id: UUID,
+    provider: str,
+    model: str,
+    rounds: List[RoundUsage]
+) -> Dict[str, Any]:
+    """
+    Price the rounds and add their MessageUsage rows to db (committed by the caller).
+
+    Returns the turn's totals for the assistant message's metadata.
+    """
+    for usage in rounds:
+        usage.cost = round_cost(model, usage)
+        db.add(MessageUsage(
+            message_id=message_id,
+            session_id=session_id,
+            llm_provider=provider,
+            llm_model=model,
+            round=usage.round,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=usage.cached_tokens,
+            cost=usage.cost,
+            estimated=usage.estimated
+        ))
+        llm_tokens.inc(provider, model, "prompt", amount=usage.prompt_tokens)
+        llm_tokens.inc(provider, model, "completion", amount=usage.completion_tokens)
+        if usage.cached_tokens:
+            llm_tokens.inc(provider, model, "cached", amount=usage.cached_tokens)
+
+    costs = [usage.cost for usage in rounds]
+    return {
+        "prompt_tokens": sum(usage.prompt_tokens for usage in rounds),
+        "completion_tokens": sum(usage.completion_tokens for usage in rounds),
+        "cached_tokens": sum(usage.cached_tokens for usage in rounds),
+        "rounds": len(rounds),
+        "cost": sum(costs) if rounds and None not in costs else None,
+        "estimated": any(usage.estimated for usage in rounds),
+    }
+
+
+def _bucket_column(db: DBSession, bucket: str):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(literal_column(f"'{bucket}'"), MessageUsage.created_at)
+    return _SQLITE_BUCKETS[bucket](MessageUsage.created_at)
+
+
+def aggregate(
+    db: DBSession,
+    start: datetime,
+    end: datetime,
+    bucket: str = "day",
+    session_id: Optional[UUID] = None
+) -> List[Dict[str, Any]]:
+    """Usage in [start, end) summed per time bucket, provider and model, oldest bucket first."""
+    bucket_start = _bucket_column(db, bucket).label("bucket")
+    query = db.query(
+        bucket_start,
+        MessageUsage.llm_provider,
+        MessageUsage.llm_model,
+        func.count(func.distinct(MessageUsage.message_id)).label("messages"),
+        func.count().label("rounds"),
+        func.sum(MessageUsage.prompt_tokens).label("prompt_tokens"),
+        func.sum(MessageUsage.completion_tokens).label("completion_tokens"),
+        func.sum(MessageUsage.cached_tokens).label("cached_tokens"),
+        func.sum(MessageUsage.cost).label("cost"),
+        func.count(MessageUsage.cost).label("priced_rounds"),
+        func.sum(cast(MessageUsage.estimated, Integer)).label("estimated_rounds"),
+    ).filter(MessageUsage.created_at >= start, MessageUsage.created_at < end)
+    if session_id is not None:
+        query = query.filter(MessageUsage.session_id == session_id)
+    rows = query.group_by(bucket_start, MessageUsage.llm_provider, MessageUsage.llm_model).order_by(
+        bucket_start, MessageUsage.llm_provider, MessageUsage.llm_model
+    ).all()
+
+    return [
+        {
+            "start": row.bucket if isinstance(row.bucket, datetime) else datetime.fromisoformat(row.bucket),
+            "llm_provider": row.llm_provider,
+            "llm_model": row.llm_model,
+            "messages": row.messages,
+            "rounds": row.rounds,
+            "prompt_tokens": row.prompt_tokens or 0,
+            "completion_tokens": row.completion_tokens or 0,
+            "cached_tokens": row.cached_tokens or 0,
+            # Rounds of unpriced models are left out of cost
+            "cost": row.cost,
+            "priced_rounds": row.priced_rounds,
+            "estimated_rounds": row.estimated_rounds or 0,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,52 @@
+"""
+Move inactive sessions to cold storage.
+
+Archives sessions not updated for ARCHIVE_AFTER_DAYS (or --days): their
+messages and file text are packed into one NDJSON+zstd blob per session under
+uploads/archives/ and removed from the hot tables. Archived sessions stay
+readable and are restored automatically on the next chat turn or clone.
+
+Usage:
+    # From backend directory (run daily, e.g. from cron)
+    python scripts/archive_sessions.py
+    python scripts/archive_sessions.py --days 30 --limit 500
+
+    # Inside Docker
+    docker exec floatplane-backend python scripts/archive_sessions.py
+"""
+import argparse
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+# Add parent directory to path so we can import from app/
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.utils.archive import archive_inactive_sessions  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive inactive sessions to cold storage")
+    parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS, help="Inactivity threshold in days")
+    parser.add_argument("--limit", type=int, default=100, help="Sessions per batch")
+    parser.add_argument("--max-batches", type=int, default=0, help="Stop after this many batches (0 = until done)")
+    args = parser.parse_args()
+
+    total = 0
+    batches = 0
+    with SessionLocal() as db:
+        while True:
+            archived = archive_inactive_sessions(db, timedelta(days=args.days), limit=args.limit)
+            total += archived
+            batches += 1
+            print(f"  batch {batches}: archived {archived} sessions")
+            if archived < args.limit or (args.max_batches and batches >= args.max_batches):
+                break
+    print(f"Done, archived {total} sessions")
+
+
+if __name__ == "__main__":
+    main()
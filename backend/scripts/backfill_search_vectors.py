@@ -0,0 +1,77 @@
+"""
+Index existing messages for full-text search.
+
+Run after the `add full-text search` Alembic migration. Messages inserted
+since then have messages.search_vector set on insert; older rows have it
+NULL and don't show up in GET /api/search until this script has filled it
+in. Content is decompressed here (it is stored compressed, so the database
+can't index it itself) and written back in small keyset-ordered batches, so
+it can run online. Rows already indexed are skipped, so the script can be
+stopped and restarted at any time.
+
+Usage:
+    # From backend directory
+    python scripts/backfill_search_vectors.py
+    python scripts/backfill_search_vectors.py --batch 500
+
+    # Inside Docker
+    docker exec floatplane-backend python scripts/backfill_search_vectors.py
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from app/
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import sqlalchemy as sa  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.models.message import Message  # noqa: E402
+
+
+def backfill(batch: int) -> int:
+    """Fill search_vector for every message missing it. Returns rows indexed."""
+    table = Message.__table__
+    indexed = 0
+    last_key = None
+
+    while True:
+        query = sa.select(table.c.session_id, table.c.id, table.c.content).where(
+            table.c.search_vector.is_(None)
+        ).order_by(table.c.session_id, table.c.id).limit(batch)
+        if last_key is not None:
+            query = query.where(sa.tuple_(table.c.session_id, table.c.id) > sa.tuple_(*last_key))
+
+        with engine.begin() as conn:
+            rows = conn.execute(query).fetchall()
+            if not rows:
+                break
+            last_key = (rows[-1].session_id, rows[-1].id)
+
+            # search_vector's type turns the text into a tsvector on PostgreSQL
+            conn.execute(
+                table.update().where(
+                    table.c.session_id == sa.bindparam("b_session_id"),
+                    table.c.id == sa.bindparam("b_id")
+                ).values(search_vector=sa.bindparam("b_text", type_=table.c.search_vector.type)),
+                [{"b_session_id": row.session_id, "b_id": row.id, "b_text": row.content} for row in rows]
+            )
+            indexed += len(rows)
+
+        print(f"  {indexed} messages indexed so far")
+
+    return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index existing messages for full-text search")
+    parser.add_argument("--batch", type=int, default=1000, help="Rows per batch")
+    args = parser.parse_args()
+
+    indexed = backfill(args.batch)
+    print(f"Done, indexed {indexed} messages")
+
+
+if __name__ == "__main__":
+    main()
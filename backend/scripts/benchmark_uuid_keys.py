@@ -0,0 +1,113 @@
+"""
+Benchmark uuid4 vs UUIDv7 primary keys on PostgreSQL.
+
+Creates two scratch tables shaped like `messages`, inserts the same number of
+rows into each (one keyed by uuid4, one by uuid7), and reports insert
+throughput plus primary key index and total table size.
+
+Usage:
+    # From backend directory (defaults to 3,000,000 rows)
+    python scripts/benchmark_uuid_keys.py
+    python scripts/benchmark_uuid_keys.py --rows 5000000 --batch 20000
+
+    # Inside Docker
+    docker exec floatplane-backend python scripts/benchmark_uuid_keys.py --rows 1000000
+
+Requires a PostgreSQL DATABASE_URL. Scratch tables are dropped afterwards
+unless --keep is given.
+"""
+import argparse
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path so we can import from app/
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from psycopg2.extras import execute_values  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import engine, uuid7  # noqa: E402
+
+
+GENERATORS = {
+    "uuid4": uuid.uuid4,
+    "uuid7": uuid7,
+}
+
+CONTENT = "x" * 200  # Typical short chat message
+
+
+def run(table: str, generate, rows: int, batch: int, cursor) -> float:
+    """Insert rows into table and return elapsed seconds."""
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(
+        f"CREATE TABLE {table} ("
+        "id uuid PRIMARY KEY, session_id uuid NOT NULL, "
+        "content text NOT NULL, created_at timestamp NOT NULL)"
+    )
+    session_ids = [uuid.uuid4() for _ in range(1000)]
+
+    start = time.perf_counter()
+    inserted = 0
+    while inserted < rows:
+        size = min(batch, rows - inserted)
+        now = datetime.utcnow()
+        values = [
+            (str(generate()), str(session_ids[(inserted + i) % len(session_ids)]), CONTENT, now)
+            for i in range(size)
+        ]
+        execute_values(cursor, f"INSERT INTO {table} VALUES %s", values, page_size=size)
+        cursor.connection.commit()
+        inserted += size
+    elapsed = time.perf_counter() - start
+
+    cursor.execute(f"ANALYZE {table}")
+    cursor.connection.commit()
+    return elapsed
+
+
+def sizes(table: str, cursor) -> tuple:
+    """Return (pk index bytes, total relation bytes)."""
+    cursor.execute(
+        "SELECT pg_relation_size(%s), pg_total_relation_size(%s)",
+        (f"{table}_pkey", table)
+    )
+    return cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark uuid4 vs uuid7 primary keys")
+    parser.add_argument("--rows", type=int, default=3_000_000, help="Rows per table")
+    parser.add_argument("--batch", type=int, default=10_000, help="Rows per INSERT batch")
+    parser.add_argument("--keep", action="store_true", help="Keep scratch tables")
+    args = parser.parse_args()
+
+    if not settings.DATABASE_URL.startswith("postgresql"):
+        print("This benchmark needs a PostgreSQL DATABASE_URL")
+        sys.exit(1)
+
+    raw = engine.raw_connection()
+    cursor = raw.cursor()
+    try:
+        print(f"{'keys':<8}{'rows':>12}{'seconds':>10}{'rows/s':>12}{'pk MB':>10}{'total MB':>10}")
+        for name, generate in GENERATORS.items():
+            table = f"bench_pk_{name}"
+            elapsed = run(table, generate, args.rows, args.batch, cursor)
+            index_bytes, total_bytes = sizes(table, cursor)
+            print(
+                f"{name:<8}{args.rows:>12,}{elapsed:>10.1f}{args.rows / elapsed:>12,.0f}"
+                f"{index_bytes / 2**20:>10.1f}{total_bytes / 2**20:>10.1f}"
+            )
+            if not args.keep:
+                cursor.execute(f"DROP TABLE {table}")
+                raw.commit()
+    finally:
+        cursor.close()
+        raw.close()
+
+
+if __name__ == "__main__":
+    main()
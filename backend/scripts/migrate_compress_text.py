@@ -0,0 +1,98 @@
+"""
+Backfill zstd compression for messages.content and files.extracted_text.
+
+Run after the `compress large text columns` Alembic migration. Rows written
+before it are plain UTF-8 bytes; this rewrites every row at or above
+TEXT_COMPRESSION_MIN_BYTES as a zstd frame, in small keyset-ordered batches so
+it can run online while the app is serving traffic. Already-compressed rows
+are skipped, so the script can be stopped and restarted at any time.
+
+Usage:
+    # From backend directory
+    python scripts/migrate_compress_text.py
+    python scripts/migrate_compress_text.py --batch 500 --table messages
+
+    # Inside Docker
+    docker exec floatplane-backend python scripts/migrate_compress_text.py
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from app/
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import sqlalchemy as sa  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import engine, compress_text, ZSTD_MAGIC  # noqa: E402
+
+
+COLUMNS = {
+    "messages": "content",
+    "files": "extracted_text",
+}
+
+
+def backfill(table_name: str, column: str, batch: int) -> tuple:
+    """Compress one column. Returns (rows rewritten, bytes before, bytes after)."""
+    table = sa.table(table_name, sa.column("id"), sa.column(column, sa.LargeBinary))
+    rewritten = before = after = 0
+    last_id = None
+
+    while True:
+        query = sa.select(table.c.id, table.c[column]).where(
+            table.c[column].isnot(None)
+        ).order_by(table.c.id).limit(batch)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+
+        with engine.begin() as conn:
+            rows = conn.execute(query).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for row_id, value in rows:
+                value = bytes(value)
+                if value[:4] == ZSTD_MAGIC or len(value) < settings.TEXT_COMPRESSION_MIN_BYTES:
+                    continue
+                compressed = compress_text(value.decode("utf-8"))
+                if compressed[:4] != ZSTD_MAGIC:
+                    continue
+                updates.append({"row_id": row_id, "value": compressed})
+                before += len(value)
+                after += len(compressed)
+
+            if updates:
+                conn.execute(
+                    table.update().where(table.c.id == sa.bindparam("row_id")).values(
+                        {column: sa.bindparam("value")}
+                    ),
+                    updates
+                )
+                rewritten += len(updates)
+
+        print(f"  {table_name}: {rewritten} rows compressed so far")
+
+    return rewritten, before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress existing large text values")
+    parser.add_argument("--batch", type=int, default=1000, help="Rows per transaction")
+    parser.add_argument("--table", choices=sorted(COLUMNS), help="Only backfill one table")
+    args = parser.parse_args()
+
+    for table_name, column in COLUMNS.items():
+        if args.table and table_name != args.table:
+            continue
+        print(f"Compressing {table_name}.{column}")
+        rewritten, before, after = backfill(table_name, column, args.batch)
+        ratio = (before / after) if after else 0
+        print(f"Done: {rewritten} rows, {before:,} -> {after:,} bytes ({ratio:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
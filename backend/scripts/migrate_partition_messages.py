@@ -0,0 +1,235 @@
+"""
+Move messages into the hash-partitioned table online.
+
+The `partition messages by session` Alembic migration creates
+messages_partitioned and a trigger mirroring every write on messages into it.
+This script then:
+
+1. Backfills existing rows in small id-ordered batches. Each batch locks its
+   source rows FOR SHARE while copying, so a concurrent delete can't leave a
+   stale copy behind. Safe to run while the app is serving, and restartable.
+2. --verify: compares row counts of both tables (full scans).
+3. --swap: in one short transaction, renames messages to
+   messages_unpartitioned and messages_partitioned to messages. A reverse
+   trigger keeps messages_unpartitioned current so the swap can be undone.
+4. --unswap: undoes --swap.
+5. --drop-old: drops messages_unpartitioned once the swap has proven itself.
+
+Usage:
+    # From backend directory
+    python scripts/migrate_partition_messages.py --batch 5000
+    python scripts/migrate_partition_messages.py --verify
+    python scripts/migrate_partition_messages.py --swap
+    python scripts/migrate_partition_messages.py --drop-old
+
+    # Inside Docker
+    docker exec floatplane-backend python scripts/migrate_partition_messages.py
+
+Requires a PostgreSQL DATABASE_URL and the migration applied.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import from app/
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.config import settings  # noqa: E402
+from app.database import engine  # noqa: E402
+
+
+COLUMNS = "id, session_id, role, content, created_at, message_metadata, search_vector"
+
+ZERO_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+def mirror_sql(function: str, source: str, target: str, conflict: str) -> list:
+    """Statements creating a trigger that applies every write on source to target."""
+    return [
+        f"""
+        CREATE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {target} WHERE session_id = OLD.session_id AND id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {target} ({COLUMNS})
+                VALUES (NEW.id, NEW.session_id, NEW.role, NEW.content, NEW.created_at, NEW.message_metadata,
+                        NEW.search_vector)
+                ON CONFLICT ({conflict}) DO UPDATE SET
+                    role = EXCLUDED.role,
+                    content = EXCLUDED.content,
+                    created_at = EXCLUDED.created_at,
+                    message_metadata = EXCLUDED.message_metadata,
+                    search_vector = EXCLUDED.search_vector;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE TRIGGER {function}
+        AFTER INSERT OR UPDATE OR DELETE ON {source}
+        FOR EACH ROW EXECUTE FUNCTION {function}()
+        """,
+    ]
+
+
+def drop_mirror_sql(function: str, source: str) -> list:
+    return [
+        f"DROP TRIGGER IF EXISTS {function} ON {source}",
+        f"DROP FUNCTION IF EXISTS {function}()",
+    ]
+
+
+SWAP = [
+    *drop_mirror_sql("messages_mirror_to_partitioned", "messages"),
+    "ALTER TABLE messages RENAME TO messages_unpartitioned",
+    "ALTER INDEX idx_messages_session_created RENAME TO idx_messages_unpartitioned_session_created",
+    "ALTER INDEX idx_messages_search_vector RENAME TO idx_messages_unpartitioned_search_vector",
+    "ALTER TABLE messages_partitioned RENAME TO messages",
+    "ALTER INDEX idx_messages_partitioned_session_created RENAME TO idx_messages_session_created",
+    "ALTER INDEX idx_messages_partitioned_id RENAME TO idx_messages_id",
+    "ALTER INDEX idx_messages_partitioned_search_vector RENAME TO idx_messages_search_vector",
+    *mirror_sql("messages_mirror_to_unpartitioned", "messages", "messages_unpartitioned", "id"),
+]
+
+UNSWAP = [
+    *drop_mirror_sql("messages_mirror_to_unpartitioned", "messages"),
+    "ALTER INDEX idx_messages_id RENAME TO idx_messages_partitioned_id",
+    "ALTER INDEX idx_messages_session_created RENAME TO idx_messages_partitioned_session_created",
+    "ALTER INDEX idx_messages_search_vector RENAME TO idx_messages_partitioned_search_vector",
+    "ALTER TABLE messages RENAME TO messages_partitioned",
+    "ALTER INDEX idx_messages_unpartitioned_session_created RENAME TO idx_messages_session_created",
+    "ALTER INDEX idx_messages_unpartitioned_search_vector RENAME TO idx_messages_search_vector",
+    "ALTER TABLE messages_unpartitioned RENAME TO messages",
+    *mirror_sql("messages_mirror_to_partitioned", "messages", "messages_partitioned", "session_id, id"),
+]
+
+DROP_OLD = [
+    *drop_mirror_sql("messages_mirror_to_unpartitioned", "messages"),
+    "DROP TABLE messages_unpartitioned",
+]
+
+
+def table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    return cursor.fetchone()[0]
+
+
+def backfill(raw, batch: int, pause: float) -> int:
+    """Copy messages into messages_partitioned in id order. Returns rows copied."""
+    cursor = raw.cursor()
+    last_id = ZERO_UUID
+    copied = 0
+    while True:
+        cursor.execute(
+            "SELECT id FROM messages WHERE id > %s ORDER BY id LIMIT %s FOR SHARE",
+            (last_id, batch)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            raw.commit()
+            break
+
+        cursor.execute(
+            f"INSERT INTO messages_partitioned ({COLUMNS}) "
+            f"SELECT {COLUMNS} FROM messages WHERE id = ANY(%s::uuid[]) "
+            "ON CONFLICT (session_id, id) DO NOTHING",
+            (ids,)
+        )
+        copied += cursor.rowcount
+        raw.commit()
+
+        last_id = ids[-1]
+        print(f"  copied {copied:,} rows (up to id {last_id})")
+        if pause:
+            time.sleep(pause)
+    cursor.close()
+    return copied
+
+
+def run_ddl(raw, statements: list, lock_timeout: str) -> None:
+    """Run statements in one transaction, giving up if the table lock isn't granted quickly."""
+    cursor = raw.cursor()
+    try:
+        cursor.execute(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+        cursor.execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+        for statement in statements:
+            cursor.execute(statement)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill and swap in the partitioned messages table")
+    parser.add_argument("--batch", type=int, default=5000, help="Rows per backfill batch")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument("--lock-timeout", default="5s", help="Give up swapping if the lock takes longer")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--verify", action="store_true", help="Compare row counts")
+    action.add_argument("--swap", action="store_true", help="Make the partitioned table live")
+    action.add_argument("--unswap", action="store_true", help="Undo --swap")
+    action.add_argument("--drop-old", action="store_true", help="Drop messages_unpartitioned after --swap")
+    args = parser.parse_args()
+
+    if not settings.DATABASE_URL.startswith("postgresql"):
+        print("Partitioning needs a PostgreSQL DATABASE_URL")
+        sys.exit(1)
+
+    raw = engine.raw_connection()
+    cursor = raw.cursor()
+    try:
+        swapped = table_exists(cursor, "messages_unpartitioned")
+        if not swapped and not table_exists(cursor, "messages_partitioned"):
+            print("messages_partitioned not found; run `alembic upgrade head` first")
+            sys.exit(1)
+
+        if args.verify:
+            old, new = ("messages_unpartitioned", "messages") if swapped else ("messages", "messages_partitioned")
+            counts = {}
+            for table in (old, new):
+                cursor.execute(f"SELECT count(*) FROM {table}")
+                counts[table] = cursor.fetchone()[0]
+            raw.commit()
+            print(", ".join(f"{table}: {count:,}" for table, count in counts.items()))
+            sys.exit(0 if counts[old] == counts[new] else 2)
+
+        if args.swap:
+            if swapped:
+                print("Already swapped")
+                return
+            run_ddl(raw, SWAP, args.lock_timeout)
+            print("Swapped: messages is now partitioned (old table kept as messages_unpartitioned)")
+        elif args.unswap:
+            if not swapped:
+                print("Not swapped")
+                return
+            run_ddl(raw, UNSWAP, args.lock_timeout)
+            print("Unswapped: messages is the unpartitioned table again")
+        elif args.drop_old:
+            if not swapped:
+                print("Not swapped; nothing to drop")
+                return
+            run_ddl(raw, DROP_OLD, args.lock_timeout)
+            print("Dropped messages_unpartitioned")
+        else:
+            if swapped:
+                print("Already swapped; nothing to backfill")
+                return
+            print(f"Backfilling messages_partitioned in batches of {args.batch}...")
+            copied = backfill(raw, args.batch, args.pause)
+            print(f"Done, copied {copied:,} rows. Check with --verify, then --swap.")
+    finally:
+        cursor.close()
+        raw.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,27 @@ import os
 import tempfile
 import shutil
 from typing import Generator
+from unittest.mock import patch
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+# Tests run in a single process; keep pub/sub off the real database
+os.environ.setdefault("PUBSUB_BACKEND", "memory")
+# Tests reap and reconcile explicitly
+os.environ.setdefault("BACKGROUND_MAINTENANCE", "false")
+
+from app.config import settings
 from app.database import Base, get_db
 from app.main import app
+from app.logging_config import stop_logging
 from app.models.session import Session
 from app.models.message import Message
 from app.models.file import File
 from app.utils.storage import storage
+from app.utils.loop_monitor import loop_monitor
 
 
 # Use in-memory SQLite for tests
@@ -53,12 +62,62 @@ def client(db):
 
     app.dependency_overrides[get_db] = override_get_db
 
-    with TestClient(app) as test_client:
-        yield test_client
+    # The reaper runs after DELETE responses with its own database session
+    with patch("app.utils.reaper.SessionLocal", TestingSessionLocal):
+        with TestClient(app) as test_client:
+            yield test_client
 
     app.dependency_overrides.clear()
 
 
+def pytest_sessionfinish(session, exitstatus):
+    """Write out queued log records while pytest's output capture is still open."""
+    stop_logging()
+
+
+@pytest.fixture(autouse=True)
+def loop_blocking_guard():
+    """Debug mode (LOOP_BLOCK_FAIL_MS > 0): fail tests that blocked the event loop that long."""
+    yield
+    if settings.LOOP_BLOCK_FAIL_MS > 0:
+        violations = loop_monitor.drain_violations()
+        if violations:
+            pytest.fail("\n\n".join(
+                f"Event loop blocked for {v.blocked_ms} ms in {v.route}:\n{v.stack}" for v in violations
+            ))
+
+
+@pytest.fixture(scope="function")
+def pg_db():
+    """A fresh PostgreSQL schema for tests marked postgres (skipped unless TEST_POSTGRES_URL is set)."""
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    pg_engine = create_engine(url)
+    Base.metadata.create_all(bind=pg_engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=pg_engine)()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=pg_engine)
+        pg_engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def sql_statements():
+    """Capture SELECT statements emitted on the test engine."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(engine, "before_cursor_execute", capture)
+
+
 @pytest.fixture(scope="function")
 def temp_storage():
     """Create temporary storage directory for file tests."""
@@ -5,6 +5,7 @@ Critical tests to prevent regression bugs:
 - File metadata stored correctly per message
 - LLM receives session files content
 """
+import json
 import pytest
 from unittest.mock import patch, MagicMock
 from tests.conftest import create_test_session, create_test_file
@@ -201,3 +202,710 @@ class TestLLMReceivesFileContent:
         # Should not have system message
         assert len(llm_messages) == 1
         assert llm_messages[0]["role"] == "user"
+
+    @patch('app.api.chat.litellm.acompletion')
+    async def test_stream_history_projects_role_and_content(self, mock_llm, client, db, temp_storage, sql_statements):
+        """stream_chat loads history as (role, content) rows, not full messages."""
+        session = create_test_session(db)
+        create_test_file(db, session.id, "file1.txt", "Content from file 1")
+
+        mock_response = MagicMock()
+        mock_response.__aiter__ = lambda self: iter([
+            MagicMock(choices=[MagicMock(delta=MagicMock(content="OK"))])
+        ])
+        mock_llm.return_value = mock_response
+        sql_statements.clear()
+
+        client.post("/api/chat/stream", json={
+            "session_id": str(session.id),
+            "message": "Test"
+        })
+
+        history = [s for s in sql_statements if "FROM messages" in s and "ORDER BY messages.created_at" in s]
+        assert history
+        assert all("message_metadata" not in s for s in history)
+
+        file_selects = [s for s in sql_statements if "FROM files" in s]
+        assert file_selects
+        assert all("file_path" not in s for s in file_selects)
+
+
+class TestContextCache:
+    """Per-session prompt context cache."""
+
+    def _mock_stream(self, mock_llm, text="OK"):
+        async def stream():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=text, tool_calls=None))])
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    async def test_second_turn_skips_history_query(self, mock_llm, mock_session_local, client, db, temp_storage, sql_statements):
+        """After the first turn, history comes from the cache, extended incrementally."""
+        from tests.conftest import TestingSessionLocal
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db)
+        create_test_file(db, session.id, "file1.txt", "Content from file 1")
+        self._mock_stream(mock_llm, "First answer")
+
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "One"})
+        sql_statements.clear()
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Two"})
+
+        assert not any("ORDER BY messages.created_at" in s for s in sql_statements)
+        assert not any("FROM files" in s for s in sql_statements)
+
+        llm_messages = mock_llm.call_args[1]["messages"]
+        assert [m["role"] for m in llm_messages] == ["system", "user", "assistant", "user"]
+        assert llm_messages[2]["content"] == "First answer"
+        assert llm_messages[3]["content"] == "Two"
+
+    @patch('app.api.chat.litellm.acompletion')
+    async def test_upload_invalidates_context(self, mock_llm, client, db, temp_storage):
+        """A new file shows up in the next turn's system message."""
+        import io
+        session = create_test_session(db)
+        self._mock_stream(mock_llm)
+
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "One"})
+        client.post(
+            f"/api/sessions/{session.id}/files",
+            files={"file": ("late.txt", io.BytesIO(b"Late content"), "text/plain")}
+        )
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Two"})
+
+        llm_messages = mock_llm.call_args[1]["messages"]
+        assert llm_messages[0]["role"] == "system"
+        assert "Late content" in llm_messages[0]["content"]
+
+    def test_lru_eviction_and_revision_checks(self):
+        """Entries are evicted by size and appends require the previous revision."""
+        from uuid import uuid4
+        from app.utils.context_cache import ContextCache, SessionContext
+
+        cache = ContextCache(max_bytes=3000)
+        first, second = uuid4(), uuid4()
+        cache.put(first, SessionContext(revision=1, messages=[("user", "a" * 1000, 250)], files_block=None))
+        cache.put(second, SessionContext(revision=1, messages=[("user", "b" * 1000, 250)], files_block=None))
+        assert len(cache) == 1  # first evicted
+        assert cache.get(second, 1) is not None
+
+        assert cache.append(second, 3, "assistant", "skipped a revision") is None
+        assert cache.get(second, 1) is None
+
+    def test_invalidation_hooks(self):
+        """Broadcast invalidations reach registered hooks."""
+        from uuid import uuid4
+        from app.utils.context_cache import ContextCache
+
+        cache = ContextCache(max_bytes=1000)
+        received = []
+        cache.add_invalidation_hook(received.append)
+        session_id = uuid4()
+
+        cache.invalidate(session_id)
+        cache.invalidate(session_id, broadcast=False)
+        assert received == [session_id]
+
+
+class TestStreamRelay:
+    """Cross-worker pub/sub and attaching to live streams."""
+
+    async def test_pubsub_delivers_in_publish_order(self):
+        """Awaited and fire-and-forget publishes arrive in the order they were made."""
+        from app.utils.pubsub import InMemoryPubSub
+
+        bus = InMemoryPubSub()
+        await bus.start()
+        subscription = bus.subscribe("test_channel")
+        for n in range(5):
+            bus.publish_nowait("test_channel", {"n": n})
+        await bus.publish("test_channel", {"n": 5})
+
+        received = [(await subscription.get(timeout=1))["n"] for _ in range(6)]
+        assert received == list(range(6))
+        subscription.close()
+        await bus.stop()
+
+    def test_remote_invalidation_drops_cache_entry(self):
+        """Invalidations from other workers drop the local entry; our own echoes are ignored."""
+        from uuid import uuid4
+        from app.utils.context_cache import context_cache, SessionContext
+        from app.utils.pubsub import WORKER_ID
+        from app.utils.stream_relay import _on_event
+
+        session_id = uuid4()
+        context_cache.put(session_id, SessionContext(revision=1, messages=[], files_block=None))
+
+        _on_event({"type": "invalidate", "session_id": str(session_id), "origin": WORKER_ID})
+        assert context_cache.get(session_id, 1) is not None
+
+        _on_event({"type": "invalidate", "session_id": str(session_id), "origin": "other-worker"})
+        assert context_cache.get(session_id, 1) is None
+
+    async def test_attach_gets_snapshot_then_live_events(self):
+        """A watcher first receives the content so far, then each new event once."""
+        from uuid import uuid4
+        from app.utils.pubsub import InMemoryPubSub
+        from app.utils.stream_relay import StreamRelay, attach_stream
+
+        bus = InMemoryPubSub()
+        await bus.start()
+        with patch('app.utils.stream_relay.pubsub', bus):
+            session_id = uuid4()
+            relay = StreamRelay(session_id)
+            await relay.start()
+            relay.content_delta("Hello, ")
+            relay.content_delta("wor")
+
+            watcher = attach_stream(session_id)
+            assert json.loads((await watcher.__anext__()).split("data: ")[1]) == {"chunk": "Hello, wor"}
+
+            relay.content_delta("ld")
+            assert (await watcher.__anext__()).startswith("event: content_delta")
+
+            await relay.finish("done", {"message_id": "m1"})
+            assert (await watcher.__anext__()).startswith("event: done")
+            with pytest.raises(StopAsyncIteration):
+                await watcher.__anext__()
+        await bus.stop()
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_session_deleted_during_stream(self, mock_llm, mock_session_local, client, db, temp_storage):
+        """A reply finished after its session was deleted is discarded and the stream ends with an error."""
+        from datetime import datetime
+        from tests.conftest import TestingSessionLocal
+        from app.models.message import Message
+        from app.models.session import Session
+        from app.models.usage import MessageUsage
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db)
+        session_id = session.id
+
+        async def stream():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Too late", tool_calls=None))])
+            db.query(Session).filter(Session.id == session_id).update({Session.deleted_at: datetime.utcnow()})
+            db.commit()
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+        response = client.post("/api/chat/stream", json={"session_id": str(session_id), "message": "Hello"})
+        last_event = response.text.strip().split("\n\n")[-1]
+        assert last_event.startswith("event: error")
+        assert "was deleted" in last_event
+        db.expire_all()
+        assert [m.role for m in db.query(Message).filter(Message.session_id == session_id)] == ["user"]
+        assert db.query(MessageUsage).count() == 0
+
+    def test_attach_without_active_stream(self, client, db):
+        """Nothing generating: the attach endpoint answers 204."""
+        session = create_test_session(db)
+        response = client.get(f"/api/chat/sessions/{session.id}/stream")
+        assert response.status_code == 204
+
+    def test_active_streams_expire_without_heartbeats(self, monkeypatch):
+        """Workers learn of running streams from heartbeats and forget streams whose worker went quiet."""
+        import time
+        from uuid import uuid4
+        from app.config import settings
+        from app.utils.stream_relay import _on_event, active_streams
+
+        session_id = str(uuid4())
+        _on_event({"type": "stream_started", "session_id": session_id, "origin": "other-worker"})
+        assert session_id in active_streams
+
+        later = time.monotonic() + settings.STREAM_HEARTBEAT_SECONDS * (settings.STREAM_HEARTBEAT_MISSES + 1)
+        monkeypatch.setattr(time, "monotonic", lambda: later)
+        assert session_id not in active_streams
+
+        _on_event({"type": "stream_started", "session_id": session_id, "origin": "other-worker"})
+        assert session_id in active_streams
+        _on_event({"type": "stream_ended", "session_id": session_id, "origin": "other-worker"})
+        assert session_id not in active_streams
+
+    async def test_relay_sends_heartbeats_until_finished(self, monkeypatch):
+        """The generating worker re-announces its stream while it runs."""
+        import asyncio
+        from uuid import uuid4
+        from app.config import settings
+        from app.utils.pubsub import EVENTS_CHANNEL, InMemoryPubSub
+        from app.utils.stream_relay import StreamRelay
+
+        monkeypatch.setattr(settings, "STREAM_HEARTBEAT_SECONDS", 0.01)
+        bus = InMemoryPubSub()
+        await bus.start()
+        events = bus.subscribe(EVENTS_CHANNEL)
+        with patch('app.utils.stream_relay.pubsub', bus):
+            relay = StreamRelay(uuid4())
+            await relay.start()
+            await asyncio.sleep(0.05)
+            await relay.finish("done", {})
+        received = []
+        while not events.queue.empty():
+            received.append(events.queue.get_nowait()["type"])
+        assert received.count("stream_started") > 1
+        assert received[-1] == "stream_ended"
+        events.close()
+        await bus.stop()
+
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_announces_start_and_end(self, mock_llm, client, db, temp_storage):
+        """The generating worker marks the session active only while streaming."""
+        from app.utils.stream_relay import active_streams
+        session = create_test_session(db)
+        seen = []
+
+        async def stream():
+            seen.append(str(session.id) in active_streams)
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Hi", tool_calls=None))])
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Hello"})
+        assert seen == [True]
+        assert str(session.id) not in active_streams
+
+
+class TestMetrics:
+    """GET /metrics exposes streaming, upload and database metrics."""
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_records_ttft_and_duration(self, mock_llm, mock_session_local, client, db, temp_storage):
+        """A streamed turn is counted once in the TTFT, duration and token rate histograms."""
+        from tests.conftest import TestingSessionLocal
+        from app.utils.metrics import chat_stream_duration, chat_ttft
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db, llm_model="metrics-model")
+
+        async def stream():
+            for chunk in ["Hello ", "there, ", "how are you?"]:
+                yield MagicMock(choices=[MagicMock(delta=MagicMock(content=chunk, tool_calls=None))])
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Hello"})
+        assert sum(chat_ttft.values()[("openai", "metrics-model")][:-1]) == 1
+        assert sum(chat_stream_duration.values()[("openai", "metrics-model")][:-1]) == 1
+
+        body = client.get("/metrics").text
+        assert 'chat_ttft_seconds_count{provider="openai",model="metrics-model"} 1' in body
+        assert 'chat_tokens_per_second_count{provider="openai",model="metrics-model"} 1' in body
+        assert "# TYPE db_query_seconds histogram" in body
+        assert 'db_pool_checked_out{pool="primary"}' in body
+
+    def test_pool_checkouts_are_timed(self):
+        """Sessions getting a connection from an instrumented engine are counted per pool."""
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        from app.utils.metrics import _instrument_engine, db_pool_checkouts
+        test_engine = create_engine("sqlite://")
+        _instrument_engine("checkout-test", test_engine)
+
+        with sessionmaker(bind=test_engine)() as session:
+            session.execute(text("SELECT 1"))
+        with test_engine.begin() as conn:
+            conn.execute(text("SELECT 1"))
+        assert sum(db_pool_checkouts.values()[("checkout-test",)][:-1]) == 2
+        test_engine.dispose()
+
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_error_is_counted(self, mock_llm, client, db, temp_storage):
+        """A provider failure before the first token counts as an llm error for that model."""
+        from app.utils.metrics import chat_errors
+        session = create_test_session(db, llm_model="failing-model")
+        mock_llm.side_effect = RuntimeError("provider down")
+
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Hello"})
+        assert chat_errors.values()[("openai", "failing-model", "llm")] == 1
+
+    def test_shards_from_threads_are_summed(self):
+        """Each thread records into its own shard; rendering adds them up."""
+        import threading
+        from app.utils.metrics import MetricsRegistry
+        registry = MetricsRegistry()
+        counter = registry.counter("test_events_total", "Events.", ("kind",))
+        histogram = registry.histogram("test_seconds", "Durations.", buckets=(0.1, 1.0))
+
+        def record():
+            for _ in range(1000):
+                counter.inc("a")
+                histogram.observe(0.5)
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        body = registry.render()
+        assert 'test_events_total{kind="a"} 4000' in body
+        assert 'test_seconds_bucket{le="0.1"} 0' in body
+        assert 'test_seconds_bucket{le="1"} 4000' in body
+        assert 'test_seconds_bucket{le="+Inf"} 4000' in body
+        assert "test_seconds_count 4000" in body
+
+
+class TestTracing:
+    """Request spans exported as OTLP/JSON lines."""
+
+    @pytest.fixture
+    def spans(self, tmp_path):
+        """Trace every request into a temporary file; yields a reader of the exported spans."""
+        from app.utils.tracing import JsonLinesExporter, tracer
+        path = tmp_path / "traces.jsonl"
+        tracer.configure(True, 1.0, JsonLinesExporter(str(path)))
+
+        def read():
+            tracer.exporter.flush()
+            if not path.exists():
+                return []
+            return [
+                span
+                for line in path.read_text().splitlines()
+                for resource in json.loads(line)["resourceSpans"]
+                for scope in resource["scopeSpans"]
+                for span in scope["spans"]
+            ]
+        try:
+            yield read
+        finally:
+            tracer.configure(False)
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_turn_is_one_trace(self, mock_llm, mock_session_local, client, db, temp_storage, spans):
+        """Each stage of a streamed turn is a child of the request span, continuing the caller's trace."""
+        from tests.conftest import TestingSessionLocal
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db)
+
+        async def stream():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Hi", tool_calls=None))])
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        client.post(
+            "/api/chat/stream",
+            json={"session_id": str(session.id), "message": "Hello"},
+            headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}
+        )
+
+        exported = {span["name"]: span for span in spans()}
+        root = exported["POST /api/chat/stream"]
+        assert root["parentSpanId"] == "00f067aa0ba902b7"
+        for name in ["chat.load_session", "chat.save_user_message", "chat.load_context", "llm.completion", "chat.persist"]:
+            assert exported[name]["traceId"] == trace_id
+            assert exported[name]["parentSpanId"] == root["spanId"]
+        assert [event["name"] for event in exported["llm.completion"]["events"]] == ["first_token"]
+
+    def test_spans_are_written_off_the_calling_thread(self, client, db, spans):
+        """The request path only queues finished traces; a writer thread does the file I/O."""
+        import threading
+        from app.utils.tracing import tracer
+        writers = []
+        write = tracer.exporter._write
+        with patch.object(tracer.exporter, "_write", lambda batch: (writers.append(threading.get_ident()), write(batch))):
+            client.get("/api/sessions")
+            assert any(span["name"] == "GET /api/sessions" for span in spans())
+        assert tracer.exporter._thread.name == "trace-writer"
+        assert writers and set(writers) == {tracer.exporter._thread.ident}
+
+    def test_unsampled_requests_export_nothing(self, client, db, spans):
+        """A caller's unsampled flag, or a zero sample rate, records no spans."""
+        from app.utils.tracing import tracer
+        session = create_test_session(db)
+        client.get(f"/api/sessions/{session.id}", headers={
+            "traceparent": "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00"
+        })
+        tracer.sample_rate = 0.0
+        client.get(f"/api/sessions/{session.id}")
+        assert spans() == []
+
+    def test_background_task_joins_request_trace(self, client, db, temp_storage, spans):
+        """The reap scheduled by DELETE runs in a span of the request's trace."""
+        session_id = str(create_test_session(db).id)
+        client.delete(f"/api/sessions/{session_id}")
+
+        exported = {span["name"]: span for span in spans()}
+        root = exported[f"DELETE /api/sessions/{session_id}"]
+        background = exported["background.reap_session_by_id"]
+        assert background["traceId"] == root["traceId"]
+        assert background["parentSpanId"] == root["spanId"]
+        assert exported["storage.delete_session_files"]["parentSpanId"] == background["spanId"]
+
+
+class TestServerTiming:
+    """Per-request latency breakdown for clients."""
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_sends_timing_before_done(self, mock_llm, mock_session_local, client, db, temp_storage):
+        """The last events are a timing breakdown of the turn, then done."""
+        from tests.conftest import TestingSessionLocal
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db)
+
+        async def stream():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Twelve chars", tool_calls=None))])
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+        response = client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Hello"})
+        assert "total;dur=" in response.headers["Server-Timing"]
+
+        events = [
+            (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in response.text.strip().split("\n\n")
+        ]
+        assert [name for name, _ in events][-2:] == ["timing", "done"]
+        timing = events[-2][1]
+        assert timing["completion_tokens"] == 3
+        assert timing["prompt_tokens"] >= 1
+        assert timing["tool_ms"] == 0
+        assert 0 <= timing["queue_ms"] <= timing["ttft_ms"] <= timing["total_ms"]
+
+
+class TestProfiling:
+    """On-demand profiles of single requests."""
+
+    @pytest.fixture
+    def profiling(self, tmp_path):
+        from app.config import settings
+        from app.utils.profiling import _RateLimiter
+        with patch.object(settings, "PROFILING_TOKEN", "secret"), \
+                patch.object(settings, "PROFILING_DIR", str(tmp_path)), \
+                patch("app.utils.profiling._rate_limiter", _RateLimiter()):
+            yield settings
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_profile_covers_the_body(self, mock_llm, mock_session_local, client, db, temp_storage, profiling, tmp_path):
+        """The profile of a streamed turn includes work done while producing the body."""
+        import pstats
+        import time
+        from tests.conftest import TestingSessionLocal
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db)
+
+        async def slow_profiled_stream():
+            time.sleep(0.05)
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Done", tool_calls=None))])
+        mock_llm.side_effect = lambda *args, **kwargs: slow_profiled_stream()
+
+        response = client.post(
+            "/api/chat/stream",
+            json={"session_id": str(session.id), "message": "Hello"},
+            headers={"X-Profile-Token": "secret"}
+        )
+        profile_id = response.headers["X-Profile-Id"]
+
+        metadata = client.get(f"/api/profiles/{profile_id}?format=json", headers={"X-Profile-Token": "secret"}).json()
+        assert metadata["route"] == "POST /api/chat/stream"
+        assert metadata["samples"] > 0
+
+        folded = client.get(f"/api/profiles/{profile_id}", headers={"X-Profile-Token": "secret"}).text
+        assert "slow_profiled_stream" in folded
+
+        raw = client.get(f"/api/profiles/{profile_id}?format=pstats&profile=secret").content
+        (tmp_path / "downloaded.pstats").write_bytes(raw)
+        stats = pstats.Stats(str(tmp_path / "downloaded.pstats"))
+        assert any(name == "slow_profiled_stream" for _, _, name in stats.stats)
+
+    def test_token_is_checked_and_rate_limited(self, client, db, profiling):
+        """Wrong tokens get 403; profiles beyond the per-minute budget get 429."""
+        with patch.object(profiling, "PROFILING_MAX_PER_MINUTE", 1):
+            assert client.get("/api/sessions", headers={"X-Profile-Token": "wrong"}).status_code == 403
+            assert client.get("/api/profiles/" + "0" * 32, headers={"X-Profile-Token": "wrong"}).status_code == 403
+
+            first = client.get("/api/sessions?profile=secret")
+            assert first.status_code == 200
+            assert "X-Profile-Id" in first.headers
+            second = client.get("/api/sessions?profile=secret")
+            assert second.status_code == 429
+            assert client.get("/api/sessions").status_code == 200
+
+        assert client.get("/api/profiles/" + "0" * 32, headers={"X-Profile-Token": "secret"}).status_code == 404
+
+    def test_old_profiles_are_pruned(self, client, db, profiling, tmp_path):
+        """Writing a profile deletes every file of profiles beyond PROFILING_KEEP, oldest first."""
+        import os
+        old = "a" * 32
+        for fmt in ("folded", "pstats", "json"):
+            (tmp_path / f"{old}.{fmt}").write_text("")
+            os.utime(tmp_path / f"{old}.{fmt}", (1, 1))
+        (tmp_path / "notes.txt").write_text("kept")
+
+        with patch.object(profiling, "PROFILING_KEEP", 1):
+            profile_id = client.get("/api/sessions?profile=secret").headers["X-Profile-Id"]
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+            [f"{profile_id}.folded", f"{profile_id}.pstats", f"{profile_id}.json", "notes.txt"]
+        )
+
+
+class TestStreamMemory:
+    """Per-stream memory estimates and admission control."""
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_is_accounted_and_released(self, mock_llm, mock_session_local, client, db, temp_storage):
+        """A stream's estimate covers its context and reply, and is returned when it ends."""
+        from tests.conftest import TestingSessionLocal
+        from app.utils.memory import STREAM_OVERHEAD, stream_memory
+        from app.utils.metrics import chat_stream_memory
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db)
+        create_test_file(db, session.id, content="x" * 10000)
+        peak_count = sum(chat_stream_memory.values().get((), [0])[:-1])
+
+        async def stream():
+            for chunk in ["Hello ", "world"]:
+                yield MagicMock(choices=[MagicMock(delta=MagicMock(content=chunk, tool_calls=None))])
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+        response = client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Hello"})
+        assert response.text.rstrip().split("\n\n")[-1].startswith("event: done")
+        assert (stream_memory.streams, stream_memory.in_flight_bytes) == (0, 0)
+
+        values = chat_stream_memory.values()[()]
+        assert sum(values[:-1]) == peak_count + 1
+        # One stream's peak: overhead, the files twice (cache and system message), the reply twice
+        assert values[-1] >= STREAM_OVERHEAD + 20000 + 2 * len("Hello world")
+
+    @patch('app.api.chat.litellm.acompletion')
+    def test_budget_refuses_new_streams(self, mock_llm, client, db):
+        """While other streams hold the budget, new streams get 503 before anything is saved."""
+        from app.config import settings
+        from app.models.message import Message
+        from app.utils.memory import stream_memory
+        session = create_test_session(db)
+        running = stream_memory.admit(0)
+        running.grow(2 * 1024 * 1024)
+        try:
+            with patch.object(settings, "STREAM_MEMORY_BUDGET_MB", 1):
+                response = client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Hello"})
+        finally:
+            running.release()
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+        assert db.query(Message).filter(Message.session_id == session.id).count() == 0
+        mock_llm.assert_not_called()
+        assert stream_memory.streams == 0
+
+    def test_lone_stream_is_always_admitted(self):
+        """A stream larger than the budget still runs when nothing else does."""
+        from app.utils.memory import StreamMemoryBudget
+        budget = StreamMemoryBudget()
+        first = budget.admit(1)
+        assert first is not None
+        assert budget.admit(1) is None
+        first.release()
+        first.release()
+        assert (budget.streams, budget.in_flight_bytes) == (0, 0)
+
+    def test_tracemalloc_diff(self, client):
+        """The memory endpoint reports allocations that grew since the previous snapshot."""
+        from app.config import settings
+        from app.utils.memory import memory_snapshots
+        headers = {"X-Profile-Token": "secret"}
+        with patch.object(settings, "PROFILING_TOKEN", "secret"):
+            assert client.get("/api/profiles/memory", headers=headers).status_code == 404
+
+            memory_snapshots.start(1)
+            try:
+                retained = [bytearray(1024) for _ in range(1000)]
+                diff = client.get("/api/profiles/memory", headers=headers).json()
+            finally:
+                memory_snapshots.stop()
+
+        assert diff["traced_bytes"] > 0
+        assert any(
+            any("test_chat.py" in location for location in entry["location"]) and entry["size_diff"] >= 1000 * 1024
+            for entry in diff["stats"]
+        )
+        del retained
+
+
+class TestUsage:
+    """Token usage and cost per LLM round, aggregated by GET /api/usage."""
+
+    @staticmethod
+    def _content(text):
+        return MagicMock(choices=[MagicMock(delta=MagicMock(content=text, tool_calls=None))], usage=None)
+
+    @staticmethod
+    def _usage(prompt_tokens, completion_tokens, cached_tokens=0):
+        import litellm
+        return MagicMock(choices=[], usage=litellm.Usage(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details={"cached_tokens": cached_tokens}
+        ))
+
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_stream_stores_reported_usage(self, mock_llm, mock_session_local, client, db, temp_storage):
+        """The provider's usage block is requested, stored per round, priced and summed per model."""
+        from tests.conftest import TestingSessionLocal
+        from app.models.usage import MessageUsage
+        mock_session_local.side_effect = TestingSessionLocal
+        session = create_test_session(db, llm_model="gpt-4o")
+
+        async def stream():
+            yield self._content("Hello")
+            yield self._usage(1000, 100, cached_tokens=500)
+        mock_llm.side_effect = lambda *args, **kwargs: stream()
+
+        response = client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Hello"})
+        assert mock_llm.call_args[1]["stream_options"] == {"include_usage": True}
+        done = json.loads(response.text.strip().split("\n\n")[-1].split("\n")[1][len("data: "):])
+        usage = done["message"]["message_metadata"]["usage"]
+        assert (usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"]) == (1000, 100, 500)
+        assert usage["estimated"] is False
+        # 500 uncached and 500 cached prompt tokens plus 100 completion tokens at gpt-4o prices
+        assert usage["cost"] == pytest.approx(500 * 2.5e-6 + 500 * 1.25e-6 + 100 * 10e-6)
+
+        row = db.query(MessageUsage).one()
+        assert str(row.message_id) == done["message_id"]
+        assert (row.round, row.llm_provider, row.llm_model) == (1, "openai", "gpt-4o")
+
+        buckets = client.get("/api/usage", params={"bucket": "hour"}).json()["buckets"]
+        assert len(buckets) == 1
+        assert buckets[0]["llm_model"] == "gpt-4o"
+        assert (buckets[0]["messages"], buckets[0]["rounds"], buckets[0]["prompt_tokens"]) == (1, 1, 1000)
+        assert buckets[0]["cost"] == pytest.approx(usage["cost"])
+
+    @patch('app.api.chat.search_internet')
+    @patch('app.api.chat.SessionLocal')
+    @patch('app.api.chat.litellm.acompletion')
+    def test_tool_rounds_are_counted_separately(self, mock_llm, mock_session_local, mock_search, client, db, temp_storage):
+        """A turn with tool calls stores both rounds; a round without reported usage is estimated."""
+        from tests.conftest import TestingSessionLocal
+        from app.models.usage import MessageUsage
+        mock_session_local.side_effect = TestingSessionLocal
+        mock_search.return_value = [{"title": "Result", "url": "https://example.com", "snippet": "Found it"}]
+        session = create_test_session(db, llm_model="unpriced-model")
+
+        function = MagicMock(arguments='{"query": "weather"}')
+        function.name = "search_internet"
+        tool_call = MagicMock(index=0, id="call_1", function=function)
+
+        async def tool_round():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=None, tool_calls=[tool_call]))], usage=None)
+            yield self._usage(200, 20)
+
+        async def answer_round():
+            yield self._content("It is sunny")
+        rounds = iter([tool_round(), answer_round()])
+        mock_llm.side_effect = lambda *args, **kwargs: next(rounds)
+
+        client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Weather?"})
+
+        rows = db.query(MessageUsage).order_by(MessageUsage.round).all()
+        assert [(row.round, row.estimated, row.cost) for row in rows] == [(1, False, None), (2, True, None)]
+        assert rows[0].prompt_tokens == 200
+        assert rows[1].prompt_tokens > 0 and rows[1].completion_tokens == 2
+
+        bucket = client.get("/api/usage", params={"session_id": str(session.id)}).json()["buckets"][0]
+        assert (bucket["messages"], bucket["rounds"], bucket["estimated_rounds"], bucket["priced_rounds"]) == (1, 2, 1, 0)
+        assert bucket["cost"] is None
+        assert client.get("/api/usage", params={"start": "2030-01-01T00:00:00Z"}).status_code == 400
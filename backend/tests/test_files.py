@@ -31,6 +31,16 @@ class TestFileUpload:
         assert "id" in data
         assert "session_id" in data
 
+    def test_upload_reports_server_timing(self, client, db, temp_storage):
+        """The upload response breaks its latency down into extraction, storage and total."""
+        session = create_test_session(db)
+        files = {"file": ("test.txt", io.BytesIO(b"Timed content"), "text/plain")}
+
+        response = client.post(f"/api/sessions/{session.id}/files", files=files)
+
+        metrics = [part.strip().split(";")[0] for part in response.headers["Server-Timing"].split(",")]
+        assert metrics == ["extract", "storage", "total"]
+
     def test_upload_pdf_file(self, client, db, temp_storage):
         """Upload a PDF file."""
         session = create_test_session(db)
@@ -192,3 +202,64 @@ class TestFileTextExtraction:
 
         response = client.get(f"/api/sessions/{session.id}/files")
         assert len(response.json()) == 1
+
+
+class TestCompressedText:
+    """Large text columns are compressed transparently."""
+
+    def test_large_extracted_text_is_compressed(self, client, db, temp_storage):
+        """Extracted text round-trips through the ORM but is stored compressed."""
+        from sqlalchemy import text
+        session = create_test_session(db)
+        content = "The quick brown fox jumps over the lazy dog. " * 500
+        file_record = create_test_file(db, session.id, "big.txt", content)
+
+        stored = db.execute(
+            text("SELECT extracted_text FROM files WHERE id = :id"),
+            {"id": str(file_record.id)}
+        ).scalar()
+        assert stored[:4] == b"\x28\xb5\x2f\xfd"
+        assert len(stored) < len(content) // 10
+
+        db.expire_all()
+        assert db.get(type(file_record), file_record.id).extracted_text == content
+
+    def test_small_and_legacy_values_read_back(self, client, db):
+        """Short values stay plain; legacy plain UTF-8 rows decode unchanged."""
+        from app.database import compress_text, decompress_text
+
+        assert compress_text("hi") == b"hi"
+        assert decompress_text("héllo".encode("utf-8")) == "héllo"
+        long_text = "ünïcode " * 1000
+        assert decompress_text(compress_text(long_text)) == long_text
+
+
+class TestColumnProjection:
+    """Read endpoints never select heavy text columns they don't return."""
+
+    def test_list_files_skips_extracted_text(self, client, db, temp_storage, sql_statements):
+        """GET /files selects only FileResponse columns."""
+        session = create_test_session(db)
+        create_test_file(db, session.id, "big.txt", "x" * 5000)
+        sql_statements.clear()
+
+        response = client.get(f"/api/sessions/{session.id}/files")
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+        assert sql_statements
+        assert not any("extracted_text" in s for s in sql_statements)
+
+    def test_file_objects_defer_extracted_text(self, client, db, temp_storage, sql_statements):
+        """Loading File objects doesn't select extracted_text until accessed."""
+        from app.models.file import File
+        session = create_test_session(db)
+        create_test_file(db, session.id)
+        db.expire_all()
+        sql_statements.clear()
+
+        file_record = db.query(File).first()
+        assert "extracted_text" not in sql_statements[-1]
+
+        assert file_record.extracted_text == "Test content"
+        assert "extracted_text" in sql_statements[-1]
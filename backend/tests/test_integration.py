@@ -98,6 +98,85 @@ class TestSessionClone:
         assert len(response.json()) == 1
 
 
+class TestCloneLineage:
+    """
+    Clones share history with their parent through lineage pointers
+    instead of copying every message.
+    """
+
+    def test_clone_does_not_copy_messages(self, client, db):
+        """Clone reads the parent prefix without inserting message rows."""
+        from app.models.message import Message
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Message 1")
+        create_test_message(db, session.id, role="assistant", content="Message 2")
+
+        response = client.post(f"/api/sessions/{session.id}/clone")
+        cloned = response.json()
+
+        assert db.query(Message).count() == 2
+
+        response = client.get(f"/api/chat/sessions/{cloned['id']}/messages")
+        assert [m["content"] for m in response.json()] == ["Message 1", "Message 2"]
+
+    def test_clone_diverges_after_fork(self, client, db):
+        """Messages added after the fork stay in their own branch."""
+        from uuid import UUID
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Shared")
+
+        cloned = client.post(f"/api/sessions/{session.id}/clone").json()
+        create_test_message(db, session.id, content="Original only")
+        create_test_message(db, UUID(cloned["id"]), content="Clone only")
+
+        grandchild = client.post(f"/api/sessions/{cloned['id']}/clone").json()
+        create_test_message(db, UUID(cloned["id"]), content="After second fork")
+
+        response = client.get(f"/api/chat/sessions/{session.id}/messages")
+        assert [m["content"] for m in response.json()] == ["Shared", "Original only"]
+
+        response = client.get(f"/api/chat/sessions/{cloned['id']}/messages")
+        assert [m["content"] for m in response.json()] == ["Shared", "Clone only", "After second fork"]
+
+        response = client.get(f"/api/chat/sessions/{grandchild['id']}/messages")
+        assert [m["content"] for m in response.json()] == ["Shared", "Clone only"]
+
+    def test_delete_middle_of_lineage(self, client, db):
+        """Deleting a parent materializes its clones, including grandchildren."""
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Root")
+
+        child = client.post(f"/api/sessions/{session.id}/clone").json()
+        grandchild = client.post(f"/api/sessions/{child['id']}/clone").json()
+
+        client.delete(f"/api/sessions/{session.id}")
+
+        response = client.get(f"/api/chat/sessions/{child['id']}/messages")
+        assert [m["content"] for m in response.json()] == ["Root"]
+
+        response = client.get(f"/api/chat/sessions/{grandchild['id']}/messages")
+        assert [m["content"] for m in response.json()] == ["Root"]
+
+    def test_materialize_session(self, client, db):
+        """Materializing copies the inherited prefix and drops the parent pointer."""
+        from uuid import UUID
+        from app.models.message import Message
+        from app.models.session import Session
+        from app.utils.lineage import materialize_session
+
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Message 1")
+        create_test_message(db, session.id, content="Message 2")
+        cloned = client.post(f"/api/sessions/{session.id}/clone").json()
+
+        clone = db.query(Session).filter(Session.id == UUID(cloned["id"])).first()
+        assert materialize_session(db, clone, batch_size=1) == 2
+        db.commit()
+
+        assert clone.parent_session_id is None
+        assert db.query(Message).filter(Message.session_id == clone.id).count() == 2
+
+
 class TestCascadeDelete:
     """
     P0 - Regression test for cascade deletion.
@@ -125,6 +204,7 @@ class TestCascadeDelete:
         """Deleting session should cascade delete file records and physical files."""
         from pathlib import Path
         session = create_test_session(db)
+        session_id = str(session.id)
         file1 = create_test_file(db, session.id, "file1.txt", "Content 1")
         file2 = create_test_file(db, session.id, "file2.txt", "Content 2")
 
@@ -137,11 +217,11 @@ class TestCascadeDelete:
         assert file2_path.exists()
 
         # Delete session
-        response = client.delete(f"/api/sessions/{session.id}")
+        response = client.delete(f"/api/sessions/{session_id}")
         assert response.status_code == 204
 
         # File records should be gone
-        response = client.get(f"/api/sessions/{session.id}/files")
+        response = client.get(f"/api/sessions/{session_id}/files")
         assert response.status_code == 404
 
         # Physical files should be deleted
@@ -152,6 +232,7 @@ class TestCascadeDelete:
         """Delete session with messages and files - complete cleanup."""
         from pathlib import Path
         session = create_test_session(db)
+        session_id = str(session.id)
 
         # Add messages with metadata
         create_test_message(
@@ -172,17 +253,17 @@ class TestCascadeDelete:
         ]
 
         # Delete session
-        response = client.delete(f"/api/sessions/{session.id}")
+        response = client.delete(f"/api/sessions/{session_id}")
         assert response.status_code == 204
 
         # Everything should be gone
-        response = client.get(f"/api/sessions/{session.id}")
+        response = client.get(f"/api/sessions/{session_id}")
         assert response.status_code == 404
 
-        response = client.get(f"/api/chat/sessions/{session.id}/messages")
+        response = client.get(f"/api/chat/sessions/{session_id}/messages")
         assert response.status_code == 404
 
-        response = client.get(f"/api/sessions/{session.id}/files")
+        response = client.get(f"/api/sessions/{session_id}/files")
         assert response.status_code == 404
 
         for path in file_paths:
@@ -241,3 +322,287 @@ class TestFileMetadataVsSessionFiles:
 
         # Note: Testing LLM receives both files requires mocking,
         # covered in test_chat.py::test_llm_receives_multiple_files
+
+
+class TestColdStorage:
+    """Inactive sessions move to one compressed blob and come back on demand."""
+
+    def _archive(self, db):
+        from datetime import timedelta
+        from app.utils.archive import archive_inactive_sessions
+        return archive_inactive_sessions(db, timedelta(0))
+
+    def test_archive_removes_hot_rows_and_serves_reads(self, client, db, temp_storage):
+        """Archived history is read from the blob, windowing included."""
+        from app.models.message import Message
+        from app.models.file import File
+        from app.models.archive import SessionArchive
+        session = create_test_session(db)
+        message_ids = [create_test_message(db, session.id, content=f"Message {i}").id for i in range(5)]
+        create_test_file(db, session.id, "notes.txt", "Notes content")
+        before = client.get(f"/api/chat/sessions/{session.id}/messages").json()
+
+        assert self._archive(db) == 1
+        assert db.query(Message).count() == 0
+        assert db.query(File.extracted_text).scalar() is None
+        archive = db.query(SessionArchive).one()
+        assert archive.message_count == 5
+        assert os.path.exists(os.path.join(temp_storage, archive.blob_path))
+
+        assert client.get(f"/api/chat/sessions/{session.id}/messages").json() == before
+        response = client.get(
+            f"/api/chat/sessions/{session.id}/messages",
+            params={"before": str(message_ids[3]), "limit": 2}
+        )
+        assert [m["content"] for m in response.json()] == ["Message 1", "Message 2"]
+        assert response.headers["X-Has-More"] == "true"
+        assert len(client.get(f"/api/sessions/{session.id}/files").json()) == 1
+
+    def test_clone_restores_archived_session(self, client, db, temp_storage):
+        """Cloning brings history and file text back to the hot tables."""
+        from app.models.file import File
+        from app.models.message import Message
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Kept")
+        create_test_file(db, session.id, "notes.txt", "Notes content")
+        self._archive(db)
+
+        cloned = client.post(f"/api/sessions/{session.id}/clone").json()
+
+        db.expire_all()
+        assert db.query(Message).filter(Message.session_id == session.id).count() == 1
+        assert {f.extracted_text for f in db.query(File).all()} == {"Notes content"}
+        response = client.get(f"/api/chat/sessions/{cloned['id']}/messages")
+        assert [m["content"] for m in response.json()] == ["Kept"]
+
+    def test_archive_inherited_history_is_self_contained(self, client, db, temp_storage):
+        """A clone archives its inherited messages; its parent's children are detached first."""
+        from uuid import UUID
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Shared")
+        cloned = client.post(f"/api/sessions/{session.id}/clone").json()
+        create_test_message(db, UUID(cloned["id"]), content="Clone only")
+
+        # The clone's revision changes when it is detached, so it goes in the next run
+        assert self._archive(db) == 1
+        assert self._archive(db) == 1
+
+        response = client.get(f"/api/chat/sessions/{cloned['id']}/messages")
+        assert [m["content"] for m in response.json()] == ["Shared", "Clone only"]
+
+    def test_chat_turn_restores_archived_session(self, client, db, temp_storage):
+        """The first chat turn sends the archived history and file text to the LLM."""
+        from unittest.mock import patch, MagicMock
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Earlier question")
+        create_test_file(db, session.id, "notes.txt", "Notes content")
+        self._archive(db)
+
+        async def stream():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="OK", tool_calls=None))])
+
+        with patch('app.api.chat.litellm.acompletion', side_effect=lambda *args, **kwargs: stream()) as mock_llm:
+            client.post("/api/chat/stream", json={"session_id": str(session.id), "message": "Again"})
+
+        llm_messages = mock_llm.call_args[1]["messages"]
+        assert "Notes content" in llm_messages[0]["content"]
+        assert [m["content"] for m in llm_messages[1:]] == ["Earlier question", "Again"]
+
+    def test_delete_removes_archive_blob(self, client, db, temp_storage):
+        """Deleting an archived session deletes its blob."""
+        from app.models.archive import SessionArchive
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Gone")
+        self._archive(db)
+        blob_path = os.path.join(temp_storage, db.query(SessionArchive).one().blob_path)
+
+        client.delete(f"/api/sessions/{session.id}")
+        assert not os.path.exists(blob_path)
+
+
+class TestAsyncDelete:
+    """Deletes leave a tombstone; the reaper and the orphan reconciler clean up."""
+
+    def test_tombstone_hides_session_until_reaped(self, client, db, temp_storage):
+        """A deleted session disappears from reads before its rows and files are removed."""
+        from unittest.mock import patch
+        from app.models.session import Session
+        from app.models.message import Message
+        from app.utils.reaper import reap_tombstones
+        session = create_test_session(db)
+        session_id = session.id
+        create_test_message(db, session_id, content="Pending removal")
+        file_path = os.path.join(temp_storage, create_test_file(db, session_id).file_path)
+
+        with patch("app.api.sessions.reap_session_by_id"):
+            assert client.delete(f"/api/sessions/{session_id}").status_code == 204
+
+        assert client.get(f"/api/sessions/{session_id}").status_code == 404
+        assert client.get(f"/api/chat/sessions/{session_id}/messages").status_code == 404
+        assert client.get("/api/sessions").json()["total"] == 0
+        assert client.delete(f"/api/sessions/{session_id}").status_code == 404
+        assert os.path.exists(file_path)
+
+        # Fresh tombstones are left to the reap their DELETE scheduled
+        assert reap_tombstones() == 0
+        assert reap_tombstones(grace_seconds=0) == 1
+        db.expire_all()
+        assert db.query(Session).count() == 0
+        assert db.query(Message).count() == 0
+        assert not os.path.exists(file_path)
+
+    def test_reaper_deletes_in_batches_and_keeps_clones(self, client, db, temp_storage):
+        """Messages go in batches; clones get their inherited history first."""
+        from datetime import datetime
+        from app.models.session import Session
+        from app.models.message import Message
+        from app.utils.reaper import reap_session
+        session = create_test_session(db)
+        session_id = session.id
+        for i in range(5):
+            create_test_message(db, session_id, content=f"Message {i}")
+        cloned = client.post(f"/api/sessions/{session_id}/clone").json()
+        session.deleted_at = datetime.utcnow()
+        db.commit()
+
+        assert reap_session(db, session_id, batch_size=2) == 5
+        assert db.query(Session).filter(Session.id == session_id).count() == 0
+        response = client.get(f"/api/chat/sessions/{cloned['id']}/messages")
+        assert [m["content"] for m in response.json()] == [f"Message {i}" for i in range(5)]
+        assert db.query(Message).count() == 5
+
+    @pytest.mark.postgres
+    def test_postgres_reapers_skip_a_claimed_tombstone(self, pg_db, temp_storage):
+        """A tombstone locked by one reaper is left alone by another."""
+        from datetime import datetime
+        from sqlalchemy.orm import sessionmaker
+        from app.models.session import Session
+        from app.utils.reaper import _claim, reap_session
+        session = create_test_session(pg_db)
+        session_id = session.id
+        create_test_message(pg_db, session_id)
+        session.deleted_at = datetime.utcnow()
+        pg_db.commit()
+
+        assert _claim(pg_db, session_id) is not None
+        with sessionmaker(bind=pg_db.get_bind())() as other:
+            assert reap_session(other, session_id) == 0
+        pg_db.rollback()
+
+        assert reap_session(pg_db, session_id) == 1
+        assert pg_db.query(Session).filter(Session.id == session_id).count() == 0
+
+    def test_reconciler_removes_only_old_unreferenced_blobs(self, client, db, temp_storage):
+        """Known files, recent files and anything outside session directories survive."""
+        import time
+        from pathlib import Path
+        from uuid import uuid4
+        from app.utils.reaper import reconcile_orphans
+        from app.utils.storage import storage
+        session = create_test_session(db)
+        known = Path(temp_storage) / create_test_file(db, session.id).file_path
+        orphan = Path(temp_storage) / storage.save_file(session.id, uuid4(), "orphan.txt", b"x")
+        recent = Path(temp_storage) / storage.save_file(session.id, uuid4(), "recent.txt", b"x")
+        abandoned_dir = uuid4()
+        abandoned = Path(temp_storage) / storage.save_file(abandoned_dir, uuid4(), "left.txt", b"x")
+        stale_archive = Path(temp_storage) / storage.save_archive(uuid4(), b"x")
+        unrelated = Path(temp_storage) / "text.zdict"
+        unrelated.write_bytes(b"x")
+
+        old = time.time() - 7200
+        for path in (known, orphan, abandoned, stale_archive, unrelated):
+            os.utime(path, (old, old))
+
+        assert reconcile_orphans(grace_seconds=3600) == 3
+
+        assert known.exists() and recent.exists() and unrelated.exists()
+        assert not orphan.exists() and not abandoned.exists() and not stale_archive.exists()
+        assert not (Path(temp_storage) / str(abandoned_dir)).exists()
+
+
+class TestLoopMonitor:
+    """Event-loop lag monitor and blocking-call watchdog."""
+
+    async def test_watchdog_names_route_and_stack_of_blocking_call(self):
+        """A sync call inside a task spawned by a request is reported with that request's route."""
+        import asyncio
+        import time
+        from app.utils.loop_monitor import LoopMonitor, LoopMonitorMiddleware
+
+        def slow_sync_call():
+            time.sleep(0.2)
+
+        async def blocking_app(scope, receive, send):
+            async def body():
+                slow_sync_call()
+            await asyncio.create_task(body())
+
+        monitor = LoopMonitor()
+        monitor.start(interval=0.01, threshold_ms=1000, fail_ms=50)
+        try:
+            await asyncio.sleep(0.05)
+            await LoopMonitorMiddleware(blocking_app)({"type": "http", "method": "GET", "path": "/slow"}, None, None)
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+        [violation] = monitor.drain_violations()
+        assert violation.route == "GET /slow"
+        assert violation.blocked_ms >= 50
+        assert "slow_sync_call" in violation.stack
+
+
+class TestLogging:
+    """Queued, sampled and structured logging."""
+
+    @pytest.fixture
+    def log_output(self, monkeypatch):
+        """Configure JSON logging into a buffer; restore the app's configuration afterwards."""
+        import io
+        import sys
+        from app.config import settings
+        from app.logging_config import setup_logging
+        output = io.StringIO()
+        monkeypatch.setattr(sys, "stdout", output)
+        setup_logging("INFO", "json", {"tests.sampled": 0.0})
+        yield output
+        monkeypatch.undo()
+        setup_logging(settings.DEBUG and "DEBUG" or "INFO", settings.LOG_FORMAT, settings.LOG_SAMPLE_RATES)
+
+    def test_json_records_carry_request_context(self, log_output):
+        """Records are written by the listener as JSON with ids, extra fields and resolved arguments."""
+        import contextvars
+        import json
+        import logging
+        from uuid import uuid4
+        from app.logging_config import stop_logging
+        from app.utils.request_context import _request_id, bind_session
+        session_id = uuid4()
+
+        def log_in_request():
+            _request_id.set("req-1")
+            bind_session(session_id)
+            logging.getLogger("tests.logging").info("Saved %d messages", 3, extra={"file_count": 2})
+            logging.getLogger("tests.sampled").info("Dropped by sampling")
+            logging.getLogger("tests.sampled").warning("Warnings are always kept")
+            logging.getLogger("tests.logging").debug("Below the level: %s", object())
+
+        contextvars.copy_context().run(log_in_request)
+        stop_logging()
+
+        records = [json.loads(line) for line in log_output.getvalue().splitlines()]
+        messages = [record["message"] for record in records]
+        assert "Dropped by sampling" not in messages
+        assert "Warnings are always kept" in messages
+        assert not any(message.startswith("Below the level") for message in messages)
+        saved = records[messages.index("Saved 3 messages")]
+        assert saved["level"] == "INFO"
+        assert saved["request_id"] == "req-1"
+        assert saved["session_id"] == str(session_id)
+        assert saved["file_count"] == 2
+
+    def test_request_id_header(self, client, db):
+        """Requests get an X-Request-ID, the caller's own when it looks like an id."""
+        assert client.get("/api/sessions", headers={"X-Request-ID": "abc-123"}).headers["X-Request-ID"] == "abc-123"
+        generated = client.get("/api/sessions", headers={"X-Request-ID": "not an id\n"}).headers["X-Request-ID"]
+        assert len(generated) == 32
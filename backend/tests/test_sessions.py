@@ -56,6 +56,42 @@ class TestSessionCRUD:
         titles = {s["title"] for s in data["sessions"]}
         assert titles == {"Session 1", "Session 2", "Session 3"}
 
+    def test_list_sessions_keyset_pagination(self, client, db):
+        """Pages follow next_cursor without repeating or skipping sessions."""
+        for i in range(5):
+            create_test_session(db, title=f"Session {i}")
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2, "include_total": "false"}
+            if cursor:
+                params["cursor"] = cursor
+            data = client.get("/api/sessions", params=params).json()
+            assert data["total"] is None
+            seen.extend(s["title"] for s in data["sessions"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+
+        # Most recently updated first
+        assert seen == [f"Session {i}" for i in reversed(range(5))]
+
+    def test_list_sessions_updated_since(self, client, db):
+        """updated_since returns only sessions changed after the given time."""
+        old = create_test_session(db, title="Old")
+        new = create_test_session(db, title="New")
+
+        response = client.get("/api/sessions", params={"updated_since": old.updated_at.isoformat()})
+        data = response.json()
+        assert data["total"] == 1
+        assert [s["title"] for s in data["sessions"]] == ["New"]
+
+    def test_list_sessions_invalid_cursor(self, client, db):
+        """Malformed cursor returns 400."""
+        response = client.get("/api/sessions", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+
     def test_get_session(self, client, db):
         """Get a specific session by ID."""
         session = create_test_session(db, title="Test Session")
@@ -92,12 +128,13 @@ class TestSessionCRUD:
     def test_delete_session(self, client, db):
         """Delete a session."""
         session = create_test_session(db)
+        session_id = str(session.id)
 
-        response = client.delete(f"/api/sessions/{session.id}")
+        response = client.delete(f"/api/sessions/{session_id}")
         assert response.status_code == 204
 
         # Verify deletion
-        response = client.get(f"/api/sessions/{session.id}")
+        response = client.get(f"/api/sessions/{session_id}")
         assert response.status_code == 404
 
     def test_delete_nonexistent_session(self, client, db):
@@ -173,3 +210,554 @@ class TestMessages:
         fake_id = "00000000-0000-0000-0000-000000000000"
         response = client.get(f"/api/chat/sessions/{fake_id}/messages")
         assert response.status_code == 404
+
+    def test_get_messages_newest_window(self, client, db):
+        """limit alone returns the newest messages, oldest first."""
+        session = create_test_session(db)
+        for i in range(5):
+            create_test_message(db, session.id, content=f"Message {i}")
+
+        response = client.get(f"/api/chat/sessions/{session.id}/messages", params={"limit": 2})
+        assert response.status_code == 200
+        assert [m["content"] for m in response.json()] == ["Message 3", "Message 4"]
+        assert response.headers["X-Has-More"] == "true"
+
+    def test_get_messages_page_backwards(self, client, db):
+        """before walks back through history until the start."""
+        session = create_test_session(db)
+        for i in range(5):
+            create_test_message(db, session.id, content=f"Message {i}")
+
+        pages = []
+        params = {"limit": 2}
+        while True:
+            response = client.get(f"/api/chat/sessions/{session.id}/messages", params=params)
+            page = response.json()
+            pages.insert(0, [m["content"] for m in page])
+            if response.headers["X-Has-More"] == "false":
+                break
+            params = {"limit": 2, "before": page[0]["id"]}
+
+        assert pages == [["Message 0"], ["Message 1", "Message 2"], ["Message 3", "Message 4"]]
+
+    def test_get_messages_since(self, client, db):
+        """since returns only messages appended after a known id."""
+        session = create_test_session(db)
+        first = create_test_message(db, session.id, content="Seen")
+        create_test_message(db, session.id, content="New 1")
+        create_test_message(db, session.id, content="New 2")
+
+        response = client.get(f"/api/chat/sessions/{session.id}/messages", params={"since": str(first.id)})
+        assert [m["content"] for m in response.json()] == ["New 1", "New 2"]
+
+    def test_get_messages_unknown_cursor(self, client, db):
+        """Cursor pointing at a missing message returns 400."""
+        session = create_test_session(db)
+        fake_id = "00000000-0000-0000-0000-000000000000"
+        response = client.get(f"/api/chat/sessions/{session.id}/messages", params={"before": fake_id})
+        assert response.status_code == 400
+
+
+class TestTimeOrderedIds:
+    """New rows get UUIDv7 primary keys."""
+
+    def test_ids_are_uuid7_and_increasing(self, client, db):
+        """Ids carry version 7 and sort in creation order."""
+        from app.database import uuid7, uuid7_timestamp_ms
+        import time
+
+        ids = [uuid7() for _ in range(1000)]
+        assert all(i.version == 7 for i in ids)
+        assert ids == sorted(ids)
+        assert abs(uuid7_timestamp_ms(ids[0]) - time.time() * 1000) < 5000
+
+        session = create_test_session(db)
+        message = create_test_message(db, session.id)
+        assert session.id.version == 7
+        assert message.id > session.id
+
+
+class TestFastSerialization:
+    """List endpoints bypass Pydantic but keep the same wire format and schema."""
+
+    def test_list_matches_response_model(self, client, db):
+        """orjson output equals what SessionResponse would produce."""
+        from app.schemas.session import SessionResponse
+        session = create_test_session(db, title="Serialized")
+
+        data = client.get("/api/sessions").json()
+        expected = SessionResponse.model_validate(session).model_dump(mode="json")
+        assert data["sessions"] == [expected]
+
+    def test_messages_match_response_model(self, client, db):
+        """Message rows serialize like MessageResponse."""
+        from app.schemas.message import MessageResponse
+        session = create_test_session(db)
+        message = create_test_message(db, session.id, metadata={"files": [{"filename": "a.txt", "file_type": "txt"}]})
+
+        data = client.get(f"/api/chat/sessions/{session.id}/messages").json()
+        assert data == [MessageResponse.model_validate(message).model_dump(mode="json")]
+
+    def test_openapi_schema_unchanged(self, client, db):
+        """Response models are still advertised in the OpenAPI schema."""
+        paths = client.get("/openapi.json").json()["paths"]
+        schema = paths["/api/sessions"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert schema["$ref"].endswith("/SessionListResponse")
+
+    def test_large_list_is_compressed(self, client, db):
+        """Bodies above the threshold are gzip-encoded when accepted."""
+        for i in range(30):
+            create_test_session(db, title=f"Session {i}")
+
+        response = client.get("/api/sessions", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["sessions"]) == 30
+
+        response = client.get("/api/sessions", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+
+
+class TestConditionalRequests:
+    """ETag / If-None-Match on session, message, file and list reads."""
+
+    def test_messages_not_modified_skips_rows(self, client, db, sql_statements):
+        """A matching If-None-Match gets 304 without reading messages; a new revision gets 200."""
+        from app.utils.revisions import bump_revision
+        session = create_test_session(db)
+        create_test_message(db, session.id, content="Hello")
+
+        first = client.get(f"/api/chat/sessions/{session.id}/messages")
+        etag = first.headers["etag"]
+        assert first.status_code == 200
+
+        sql_statements.clear()
+        cached = client.get(f"/api/chat/sessions/{session.id}/messages", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert not any("FROM messages" in s for s in sql_statements)
+
+        create_test_message(db, session.id, content="Again")
+        bump_revision(db, session.id)
+        db.commit()
+        fresh = client.get(f"/api/chat/sessions/{session.id}/messages", headers={"If-None-Match": etag})
+        assert fresh.status_code == 200
+        assert len(fresh.json()) == 2
+        assert fresh.headers["etag"] != etag
+
+    def test_session_etag_changes_on_update(self, client, db):
+        """Renaming a session bumps its revision and therefore its ETag."""
+        session = create_test_session(db)
+        etag = client.get(f"/api/sessions/{session.id}").headers["etag"]
+        assert client.get(f"/api/sessions/{session.id}", headers={"If-None-Match": etag}).status_code == 304
+
+        client.patch(f"/api/sessions/{session.id}", json={"title": "Renamed"})
+        response = client.get(f"/api/sessions/{session.id}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["title"] == "Renamed"
+
+    def test_files_etag_changes_on_upload(self, client, db, temp_storage):
+        """Uploading a file invalidates the file list ETag."""
+        import io
+        session = create_test_session(db)
+        etag = client.get(f"/api/sessions/{session.id}/files").headers["etag"]
+        assert client.get(f"/api/sessions/{session.id}/files", headers={"If-None-Match": f'W/{etag}'}).status_code == 304
+
+        client.post(
+            f"/api/sessions/{session.id}/files",
+            files={"file": ("notes.txt", io.BytesIO(b"Notes"), "text/plain")}
+        )
+        response = client.get(f"/api/sessions/{session.id}/files", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+    def test_list_etag(self, client, db):
+        """The session list revalidates cheaply and changes when a session is added or deleted."""
+        session = create_test_session(db, title="One")
+        etag = client.get("/api/sessions").headers["etag"]
+        assert client.get("/api/sessions", headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/api/sessions?limit=1", headers={"If-None-Match": etag}).status_code == 200
+
+        client.delete(f"/api/sessions/{session.id}")
+        assert client.get("/api/sessions", headers={"If-None-Match": etag}).status_code == 200
+
+
+class TestReadReplicaRouting:
+    """GET endpoints read from a replica unless they could miss their own writes."""
+
+    @pytest.fixture
+    def replica(self, monkeypatch):
+        """Route reads to a second sessionmaker on the test engine and record its use."""
+        from app.utils import read_routing
+        from tests.conftest import TestingSessionLocal
+        opened = []
+
+        def replica_factory():
+            opened.append(True)
+            return TestingSessionLocal()
+
+        monkeypatch.setattr(read_routing, "ReplicaSessionLocals", [replica_factory])
+        monkeypatch.setattr(read_routing, "_recent_writes", {})
+        monkeypatch.setattr(read_routing, "_last_write", 0.0)
+        return opened
+
+    def test_reads_go_to_replica(self, client, db, replica):
+        """Sessions nobody wrote recently are read from the replica."""
+        session = create_test_session(db)
+        response = client.get(f"/api/chat/sessions/{session.id}/messages")
+        assert response.status_code == 200
+        assert replica == [True]
+
+    def test_recent_write_reads_primary(self, client, db, replica):
+        """After a write, the session's reads and the list use the primary for the window."""
+        session = create_test_session(db)
+        client.patch(f"/api/sessions/{session.id}", json={"title": "Renamed"})
+
+        assert client.get(f"/api/sessions/{session.id}").json()["title"] == "Renamed"
+        client.get("/api/sessions")
+        assert replica == []
+
+        other = create_test_session(db, title="Untouched")
+        client.get(f"/api/sessions/{other.id}/files")
+        assert replica == [True]
+
+    def test_streaming_session_reads_primary(self, client, db, replica, monkeypatch):
+        """A session with a pending stream is read from the primary."""
+        from app.utils import read_routing
+        session = create_test_session(db)
+        monkeypatch.setattr(read_routing, "active_streams", {str(session.id)})
+
+        client.get(f"/api/chat/sessions/{session.id}/messages")
+        assert replica == []
+
+    def test_writes_shared_between_workers(self, replica):
+        """Write notices from other workers count; our own echoes are ignored."""
+        from uuid import uuid4
+        from app.utils import read_routing
+        session_id = str(uuid4())
+
+        read_routing._on_event({"type": "write", "session_id": session_id, "origin": "other-worker"})
+        assert read_routing.use_primary(session_id)
+        assert not read_routing.use_primary(str(uuid4()))
+
+    def test_imported_sessions_read_primary(self, client, replica):
+        """Sessions created by an import count as recent writes."""
+        import json
+        from app.utils import read_routing
+        session_id = "00000000-0000-0000-0000-0000000000aa"
+        records = [
+            {"type": "header", "version": 1},
+            {"type": "session", "id": session_id, "title": "Imported", "llm_provider": "openai", "llm_model": "gpt-4"},
+        ]
+        assert client.post("/api/sessions/import", content="\n".join(json.dumps(r) for r in records)).json()["sessions"] == 1
+        assert read_routing.use_primary(session_id)
+
+        assert client.get(f"/api/sessions/{session_id}").status_code == 200
+        assert replica == []
+
+    async def test_revision_bump_from_a_thread_is_published(self, db, replica, monkeypatch):
+        """Threadpool code bumping a revision hands its write notice to the loop's outbox."""
+        import asyncio
+        import threading
+        from app.utils import read_routing
+        from app.utils.pubsub import EVENTS_CHANNEL, InMemoryPubSub
+        from app.utils.revisions import bump_revision
+        session = create_test_session(db)
+        bus = InMemoryPubSub()
+        await bus.start()
+        monkeypatch.setattr(read_routing, "pubsub", bus)
+        monkeypatch.setattr("app.utils.revisions._revision_hooks", [read_routing.note_write])
+        events = bus.subscribe(EVENTS_CHANNEL)
+        # asyncio queues are not thread-safe: only the loop thread may add to the outbox
+        queued_on = []
+        put_nowait = bus._outbox.put_nowait
+        monkeypatch.setattr(bus._outbox, "put_nowait", lambda item: (queued_on.append(threading.get_ident()), put_nowait(item)))
+
+        await asyncio.to_thread(bump_revision, db, session.id)
+        message = await events.get(timeout=1)
+        assert queued_on == [threading.get_ident()]
+        assert (message["type"], message["session_id"]) == ("write", str(session.id))
+        assert read_routing.use_primary(str(session.id))
+        events.close()
+        await bus.stop()
+
+    def test_pool_stats_per_replica(self, monkeypatch, tmp_path):
+        """Pool stats list the primary and every replica."""
+        from app import database
+        replica = database._create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+        monkeypatch.setattr(database, "replica_engines", [replica])
+
+        stats = database.pool_stats()
+        assert set(stats) == {"primary", "replica-0"}
+        assert stats["replica-0"]["size"] == 5
+        replica.dispose()
+
+
+class TestMessagePartitioning:
+    """messages is keyed and queried by session so it can be hash-partitioned."""
+
+    def test_postgres_ddl_is_hash_partitioned(self):
+        """PostgreSQL DDL partitions by session_id with session_id leading the primary key."""
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateTable
+        from app.models.message import Message
+
+        ddl = str(CreateTable(Message.__table__).compile(dialect=postgresql.dialect()))
+        assert "PARTITION BY HASH (session_id)" in ddl
+        assert "PRIMARY KEY (session_id, id)" in ddl
+
+    def test_cursor_lookup_scoped_to_session(self, client, db, sql_statements):
+        """Message cursors resolve within the session's own history only."""
+        session = create_test_session(db)
+        other = create_test_session(db, title="Other")
+        own = create_test_message(db, session.id, content="Mine")
+        foreign = create_test_message(db, other.id, content="Not mine")
+
+        sql_statements.clear()
+        response = client.get(f"/api/chat/sessions/{session.id}/messages", params={"after": str(own.id), "limit": 5})
+        assert response.status_code == 200
+        lookups = [s for s in sql_statements if s.startswith("SELECT messages.created_at") and "messages.id =" in s]
+        assert lookups and all("messages.session_id IN" in s for s in lookups)
+
+        response = client.get(f"/api/chat/sessions/{session.id}/messages", params={"after": str(foreign.id), "limit": 5})
+        assert response.status_code == 400
+
+
+class TestBatchOperations:
+    """POST /api/sessions:batchDelete, :batchUpdate and :batchClone."""
+
+    def test_batch_delete(self, client, db, temp_storage):
+        """Found sessions are tombstoned and reaped; unknown ids get 404 results."""
+        from unittest.mock import patch
+        from app.models.session import Session
+        ids = [str(create_test_session(db, title=f"S{i}").id) for i in range(3)]
+        missing = "00000000-0000-0000-0000-000000000000"
+
+        with patch("app.config.settings.BATCH_CHUNK_SIZE", 2):
+            response = client.post("/api/sessions:batchDelete", json={"session_ids": [ids[0], missing, ids[1]]})
+
+        assert response.status_code == 200
+        assert [(r["id"], r["status"]) for r in response.json()["results"]] == [
+            (ids[0], 204), (missing, 404), (ids[1], 204)
+        ]
+        assert [s["id"] for s in client.get("/api/sessions").json()["sessions"]] == [ids[2]]
+        db.expire_all()
+        assert db.query(Session).count() == 1
+
+    def test_batch_update(self, client, db):
+        """Titles are set per item and bump each session's revision."""
+        from app.models.session import Session
+        first = create_test_session(db, title="First")
+        second = create_test_session(db, title="Second")
+        missing = "00000000-0000-0000-0000-000000000000"
+
+        response = client.post("/api/sessions:batchUpdate", json={"items": [
+            {"id": str(first.id), "title": "Renamed first"},
+            {"id": missing, "title": "Nope"},
+            {"id": str(second.id), "title": "Renamed second"},
+        ]})
+
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == [200, 404, 200]
+        assert [results[0]["session"]["title"], results[2]["session"]["title"]] == ["Renamed first", "Renamed second"]
+        db.expire_all()
+        assert {s.title: s.revision for s in db.query(Session)} == {"Renamed first": 1, "Renamed second": 1}
+
+    def test_batch_clone(self, client, db, temp_storage):
+        """Each clone shares its original's history and gets its own copy of the files."""
+        from tests.conftest import create_test_file
+        original = create_test_session(db, title="Original")
+        create_test_message(db, original.id, content="Shared history")
+        create_test_file(db, original.id, "notes.txt", "Notes")
+        empty = create_test_session(db, title="Empty")
+
+        response = client.post("/api/sessions:batchClone", json={
+            "session_ids": [str(original.id), str(empty.id), "00000000-0000-0000-0000-000000000000"]
+        })
+
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == [201, 201, 404]
+        assert [r["session"]["title"] for r in results[:2]] == ["Original (Copy)", "Empty (Copy)"]
+        clone_id = results[0]["session"]["id"]
+        messages = client.get(f"/api/chat/sessions/{clone_id}/messages").json()
+        assert [m["content"] for m in messages] == ["Shared history"]
+        files = client.get(f"/api/sessions/{clone_id}/files").json()
+        assert [f["filename"] for f in files] == ["notes.txt"]
+
+    def test_batch_clone_queries_per_chunk(self, client, db, sql_statements):
+        """Fork points and lineage depths cost the same number of queries for one clone or many."""
+        from app.models.session import Session
+        from app.utils.lineage import last_message_id, lineage_depth
+
+        def clone(count):
+            ids = []
+            for i in range(count):
+                session = create_test_session(db, title=f"S{i}")
+                create_test_message(db, session.id, content=f"Message {i}")
+                ids.append(str(session.id))
+            sql_statements.clear()
+            results = client.post("/api/sessions:batchClone", json={"session_ids": ids}).json()["results"]
+            return len(sql_statements), [r["session"]["id"] for r in results]
+
+        one, _ = clone(1)
+        many, clone_ids = clone(5)
+        assert many == one
+
+        # Cloning the clones: fork points and depths agree with the per-session helpers
+        client.post("/api/sessions:batchClone", json={"session_ids": clone_ids})
+        db.expire_all()
+        for clone_id in clone_ids:
+            cloned = db.query(Session).filter(Session.parent_session_id == clone_id).one()
+            parent = db.query(Session).filter(Session.id == clone_id).one()
+            assert cloned.fork_message_id == last_message_id(db, parent)
+            assert lineage_depth(db, cloned) == 2
+
+
+class TestExportImport:
+    """GET /api/sessions/export streams NDJSON that POST /api/sessions/import ingests."""
+
+    def test_round_trip(self, client, db, temp_storage):
+        """An export imported into an empty database reproduces sessions, history and files."""
+        import json
+        from unittest.mock import patch
+        from app.database import Base
+        from tests.conftest import TestingSessionLocal, create_test_file, engine
+        original = create_test_session(db, title="Original")
+        create_test_message(db, original.id, content="Question")
+        create_test_message(db, original.id, role="assistant", content="Answer", metadata={"files": []})
+        create_test_file(db, original.id, "notes.txt", "Notes")
+        cloned = client.post(f"/api/sessions/{original.id}/clone").json()
+
+        with patch("app.utils.transfer.SessionLocal", TestingSessionLocal):
+            response = client.get("/api/sessions/export", params={"include_blobs": True})
+        assert response.headers["content-type"] == "application/x-ndjson"
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["type"] for r in records] == [
+            "header", "session", "message", "message", "file", "session", "message", "message", "file"
+        ]
+        before = client.get(f"/api/chat/sessions/{cloned['id']}/messages").json()
+
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response = client.post("/api/sessions/import", content=response.content)
+        assert response.json() == {"sessions": 2, "messages": 4, "files": 2, "skipped_sessions": 0}
+
+        after = client.get(f"/api/chat/sessions/{cloned['id']}/messages").json()
+        assert [(m["role"], m["content"]) for m in after] == [(m["role"], m["content"]) for m in before]
+        files = client.get(f"/api/sessions/{cloned['id']}/files").json()
+        assert [f["filename"] for f in files] == ["notes.txt"]
+
+        # Re-running the same import skips what is already there
+        response = client.post("/api/sessions/import", content="\n".join(json.dumps(r) for r in records[:5]))
+        assert response.json()["skipped_sessions"] == 1
+
+    def test_import_rejects_malformed_lines(self, client, db):
+        """Bad input is reported with its line number."""
+        response = client.post("/api/sessions/import", content='{"type": "header", "version": 1}\n{"type": "message"}\n')
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Line 2")
+
+        import json
+        session_id = "00000000-0000-0000-0000-000000000001"
+        records = [
+            {"type": "header", "version": 1},
+            {"type": "session", "id": session_id, "title": "T", "llm_provider": "openai", "llm_model": "gpt-4"},
+            {"type": "file", "id": "00000000-0000-0000-0000-000000000002", "session_id": session_id, "filename": "a.txt",
+             "file_path": "a.txt", "file_type": "text/plain", "file_size": 1, "content": "not base64!"},
+        ]
+        response = client.post("/api/sessions/import", content="\n".join(json.dumps(r) for r in records))
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Line 3")
+
+    def test_import_lines_split_across_chunks(self, db):
+        """Lines are reassembled from arbitrary chunks; overlong lines are refused."""
+        from unittest.mock import patch
+        from app.utils.transfer import SessionImporter, TransferFormatError
+        body = b'{"type": "header", "version": 1}\n\n{"type": "session", "id": "00000000-0000-0000-0000-000000000001", ' \
+               b'"title": "Split", "llm_provider": "openai", "llm_model": "gpt-4"}'
+        importer = SessionImporter(db)
+        for i in range(0, len(body), 7):
+            importer.feed_chunk(body[i:i + 7])
+        assert importer.finish()["sessions"] == 1
+        assert importer.line_number == 3
+
+        with patch("app.utils.transfer.IMPORT_MAX_LINE_BYTES", 16):
+            with pytest.raises(TransferFormatError, match="Line 1"):
+                SessionImporter(db).feed_chunk(b'{"type": "header", "version": 1')
+
+
+class TestFullTextSearch:
+    """GET /api/search over titles and messages (FTS5 on SQLite)."""
+
+    def test_search_messages_and_titles(self, client, db):
+        """Matches in titles and in compressed message content are found with snippets."""
+        planning = create_test_session(db, title="Trip planning")
+        other = create_test_session(db, title="Unrelated")
+        create_test_message(db, planning.id, content="Nothing relevant here")
+        long_text = "filler words " * 100 + "we compared the partitioning strategies for messages"
+        message = create_test_message(db, other.id, role="assistant", content=long_text)
+
+        results = client.get("/api/search", params={"q": "partitioning"}).json()["results"]
+        assert [(r["type"], r["message_id"]) for r in results] == [("message", str(message.id))]
+        start, end = results[0]["highlights"][0]
+        assert results[0]["snippet"][start:end] == "partitioning"
+        assert results[0]["snippet"].startswith("…")
+
+        results = client.get("/api/search", params={"q": "trip"}).json()["results"]
+        assert [(r["type"], r["session_id"], r["snippet"]) for r in results] == [
+            ("session", str(planning.id), "Trip planning")
+        ]
+
+    def test_search_pagination_and_deleted_sessions(self, client, db):
+        """Keyset pages cover every match once; deleted sessions are hidden."""
+        from unittest.mock import patch
+        session = create_test_session(db)
+        for i in range(5):
+            create_test_message(db, session.id, content=f"database question {i}")
+        deleted = create_test_session(db)
+        create_test_message(db, deleted.id, content="database secrets")
+        with patch("app.api.sessions.reap_session_by_id"):
+            client.delete(f"/api/sessions/{deleted.id}")
+
+        seen, cursor = [], None
+        while True:
+            params = {"q": "database", "limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/api/search", params=params).json()
+            seen.extend(r["message_id"] for r in page["results"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert len(seen) == len(set(seen)) == 5
+        assert all(r["session_id"] == str(session.id) for r in client.get("/api/search", params={"q": "database"}).json()["results"])
+
+    def test_candidates_are_the_best_ranked(self, client, db):
+        """The per-kind candidate cap keeps the best matches, not whichever rows come first."""
+        from unittest.mock import patch
+        from app.config import settings
+        session = create_test_session(db)
+        for i in range(4):
+            create_test_message(db, session.id, content=f"database question {i} " + "filler " * 50)
+        best = create_test_message(db, session.id, content="database database database")
+
+        with patch.object(settings, "SEARCH_MAX_CANDIDATES", 1):
+            results = client.get("/api/search", params={"q": "database"}).json()["results"]
+        assert [r["message_id"] for r in results] == [str(best.id)]
+
+    @pytest.mark.postgres
+    def test_postgres_pages_through_tied_ranks(self, pg_db):
+        """Equal ts_rank values survive the cursor round trip, so pages neither repeat nor loop."""
+        from app.utils.pagination import decode_rank_cursor, encode_rank_cursor
+        from app.utils.search import search
+        session = create_test_session(pg_db)
+        expected = {create_test_message(pg_db, session.id, content="identical database question").id for _ in range(5)}
+
+        seen, after = [], None
+        while len(seen) <= len(expected):
+            rows = search(pg_db, "database", 2, after)
+            page = rows[:2]
+            seen.extend(row.id for row in page)
+            if len(rows) <= 2:
+                break
+            after = decode_rank_cursor(encode_rank_cursor(page[-1].rank, page[-1].id))
+        assert len(seen) == len(expected)
+        assert set(seen) == expected
@@ -3,6 +3,9 @@ import type { Session } from '../types/session'
 import { sessionsApi } from '../services/api'
 import floatplaneSide from '../assets/floatplane-side.png';
 
+// Sessions per page; further pages load on demand
+const PAGE_SIZE = 50
+
 interface SessionSidebarProps {
   onSessionSelect?: (session: Session | null) => void
   selectedSessionId?: string | null
@@ -15,15 +18,35 @@ export interface SessionSidebarRef {
 export const SessionSidebar = forwardRef<SessionSidebarRef, SessionSidebarProps>(
   function SessionSidebar({ onSessionSelect, selectedSessionId }, ref) {
   const [sessions, setSessions] = useState<Session[]>([])
+  const [total, setTotal] = useState<number | null>(null)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
 
+  // Refreshes fetch only the first page, so they stay fast however many sessions exist
   const loadSessions = async () => {
     try {
       setLoading(true)
       setError(null)
-      const data = await sessionsApi.list()
+      const data = await sessionsApi.list({ limit: PAGE_SIZE })
       setSessions(data.sessions)
+      setTotal(data.total)
+      setNextCursor(data.next_cursor)
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load sessions')
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  const loadMoreSessions = async () => {
+    if (!nextCursor) return
+    try {
+      setLoading(true)
+      setError(null)
+      const data = await sessionsApi.list({ limit: PAGE_SIZE, cursor: nextCursor, include_total: false })
+      setSessions((prev) => [...prev, ...data.sessions.filter((s) => !prev.some((p) => p.id === s.id))])
+      setNextCursor(data.next_cursor)
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load sessions')
     } finally {
@@ -51,6 +74,7 @@ export const SessionSidebar = forwardRef<SessionSidebarRef, SessionSidebarProps>
     try {
       await sessionsApi.delete(sessionId)
       setSessions(sessions.filter((s) => s.id !== sessionId))
+      setTotal((count) => (count === null ? null : count - 1))
       if (selectedSessionId === sessionId) {
         onSessionSelect?.(sessions[0])
       }
@@ -64,6 +88,7 @@ export const SessionSidebar = forwardRef<SessionSidebarRef, SessionSidebarProps>
     try {
       const clonedSession = await sessionsApi.clone(sessionId)
       setSessions([clonedSession, ...sessions])
+      setTotal((count) => (count === null ? null : count + 1))
       onSessionSelect?.(clonedSession)
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to clone session')
@@ -143,11 +168,20 @@ export const SessionSidebar = forwardRef<SessionSidebarRef, SessionSidebarProps>
             </div>
           ))}
         </div>
+
+        {nextCursor && !loading && (
+          <button
+            onClick={loadMoreSessions}
+            className="w-full py-2 text-xs text-gray-500 hover:text-gray-900 transition-colors"
+          >
+            Load more
+          </button>
+        )}
       </div>
 
       {/* Footer */}
       <div className="px-5 py-4 text-xs text-gray-400">
-        <div>{sessions.length} conversations</div>
+        <div>{total ?? sessions.length} conversations</div>
       </div>
     </div>
   )
@@ -1,5 +1,5 @@
-import type { Session, SessionCreate, SessionListResponse } from '../types/session'
-import type { ChatRequest, ChatResponse, Message } from '../types/message'
+import type { Session, SessionCreate, SessionListParams, SessionListResponse } from '../types/session'
+import type { ChatRequest, ChatResponse, Message, MessageWindowParams } from '../types/message'
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000'
 
@@ -43,6 +43,16 @@ async function handleResponse<T>(response: Response): Promise<T> {
   return response.json()
 }
 
+// Query string for the defined params, with its leading '?' (empty when none are set)
+function buildQuery(params: object): string {
+  const query = new URLSearchParams()
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== undefined) query.set(key, String(value))
+  })
+  const qs = query.toString()
+  return qs ? `?${qs}` : ''
+}
+
 export const modelsApi = {
   async list(): Promise<ModelsResponse> {
     const response = await fetch(`${API_BASE_URL}/api/models`)
@@ -60,8 +70,8 @@ export const sessionsApi = {
     return handleResponse<Session>(response)
   },
 
-  async list(): Promise<SessionListResponse> {
-    const response = await fetch(`${API_BASE_URL}/api/sessions`)
+  async list(params: SessionListParams = {}): Promise<SessionListResponse> {
+    const response = await fetch(`${API_BASE_URL}/api/sessions${buildQuery(params)}`)
     return handleResponse<SessionListResponse>(response)
   },
 
@@ -104,8 +114,8 @@ export const chatApi = {
     return handleResponse<ChatResponse>(response)
   },
 
-  async getSessionMessages(sessionId: string): Promise<Message[]> {
-    const response = await fetch(`${API_BASE_URL}/api/chat/sessions/${sessionId}/messages`)
+  async getSessionMessages(sessionId: string, params: MessageWindowParams = {}): Promise<Message[]> {
+    const response = await fetch(`${API_BASE_URL}/api/chat/sessions/${sessionId}/messages${buildQuery(params)}`)
     return handleResponse<Message[]>(response)
   },
 
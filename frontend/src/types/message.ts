@@ -16,6 +16,13 @@ export interface Message {
   message_metadata?: MessageMetadata | null
 }
 
+export interface MessageWindowParams {
+  before?: string
+  after?: string
+  since?: string
+  limit?: number
+}
+
 export interface ChatRequest {
   session_id: string
   message: string
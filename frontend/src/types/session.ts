@@ -15,5 +15,13 @@ export interface SessionCreate {
 
 export interface SessionListResponse {
   sessions: Session[]
-  total: number
+  total: number | null
+  next_cursor: string | null
+}
+
+export interface SessionListParams {
+  limit?: number
+  cursor?: string
+  updated_since?: string
+  include_total?: boolean
 }